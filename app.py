@@ -1,16 +1,226 @@
-from flask import Flask, request, jsonify, render_template
-import pandas as pd
-from biclustering import MixedTypeBiclustering
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from flask import Flask, Response, request, jsonify, render_template
+from biclustering import ROW_STRATEGIES, MixedTypeBiclustering
 from similarity_matrix_mixed_clustering import OptimizedDualSimilarityMatrix
+from model_cache import LRUCache, content_hash, stream_content_hash
+from dataset_store import DatasetStore, DatasetNotFoundError, UnknownColumnError
+from ingestion import read_csv_chunked
+from encoded_table import table_cache
+from jobs import JobManager, JobNotFoundError, clustering_job
+from prewarm import warm_up_in_background
+import instrumentation
+from instrumentation import instrumented, stage
+from scratch import release_scratch
+from wire_format import BLOCKS_MIME, block_key, encode_blocks
 
 app = Flask(__name__)
 
+# Stage timings (INSTRUMENTATION=1, see instrumentation.configure) are logged
+# as JSON lines, sent as Server-Timing headers and aggregated at /metrics
+if instrumentation.is_enabled():
+    stage_logger = logging.getLogger(instrumentation.__name__)
+    stage_logger.addHandler(logging.StreamHandler())
+    stage_logger.setLevel(logging.INFO)
+
+
+@app.before_request
+def begin_stage_timings():
+    instrumentation.begin_request()
+
+
+@app.after_request
+def add_server_timing(response):
+    server_timing = instrumentation.end_request()
+    if server_timing:
+        response.headers['Server-Timing'] = server_timing
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-stage duration and memory histograms and CPU totals, in the Prometheus text format"""
+    return Response(instrumentation.registry.exposition(), mimetype='text/plain; version=0.0.4')
+
+# Fitted biclustering models keyed by (content hash of the upload, row strategy),
+# so that changing the number of clusters only re-cuts the stored linkages
+model_cache = LRUCache(max_bytes=int(os.environ.get('MODEL_CACHE_BYTES', 512 * 2**20)),
+                       on_evict=lambda key, entry: release_scratch(entry))
+
+# When set, distance and similarity matrices are memory-mapped files in this directory
+# instead of RAM (see scratch.scratch_array); they are deleted on cache eviction
+scratch_dir = os.environ.get('DISTANCE_SCRATCH_DIR')
+
+# Threads per model: above 1, the row and column halves of a fit or VSM run concurrently
+model_threads = int(os.environ.get('MODEL_THREADS', 1))
+
+# Preprocessed tables, shared by the biclustering and the VSM of the same data
+table_cache.max_bytes = int(os.environ.get('TABLE_CACHE_BYTES', table_cache.max_bytes))
+
+# Parsed uploads, so that clustering and VSM requests can reference a dataset ID
+dataset_store = DatasetStore(root_dir=os.environ.get('DATASET_STORE_DIR'),
+                             ttl_seconds=float(os.environ.get('DATASET_TTL_SECONDS', 3600)),
+                             max_bytes=int(os.environ.get('DATASET_STORE_BYTES', 2 * 2**30)))
+
+# Clustering jobs run in at most JOB_WORKERS processes (one per CPU by default)
+job_manager = JobManager(max_workers=int(os.environ.get('JOB_WORKERS', 0)) or None,
+                         ttl_seconds=float(os.environ.get('JOB_TTL_SECONDS', 600)))
+
+# The numba kernels are compiled, or loaded from their on-disk cache, at boot rather
+# than in the first request (WARM_UP=0 skips it): on a background thread, or before
+# serving when numba's threading layer cannot run kernels from two threads at once
+if os.environ.get('WARM_UP', '1') not in ('', '0', 'false'):
+    warm_up_in_background(scratch_dir)
+
+
+def request_dataset():
+    """
+    Resolve the dataset a request refers to
+
+    Either a multipart ``file`` upload, or a ``dataset_id`` from /datasets with
+    optional ``rows`` (positional indices) and ``columns`` JSON lists selecting
+    a subset of it.
+
+    Returns:
+    --------
+    Tuple of (cache token identifying the data, function loading the DataFrame)
+
+    Raises:
+    -------
+    ValueError
+        If the request carries neither a file nor a dataset ID
+
+    The loader raises DatasetNotFoundError if the dataset ID is unknown or
+    has been evicted, and UnknownColumnError (a ValueError) if a requested
+    column is not in the dataset.
+    """
+    dataset_id = request.form.get('dataset_id')
+    if dataset_id:
+        rows = json.loads(request.form['rows']) if request.form.get('rows') else None
+        columns = json.loads(request.form['columns']) if request.form.get('columns') else None
+        token = dataset_id if rows is None and columns is None else \
+            content_hash(json.dumps([dataset_id, rows, columns]).encode())
+
+        def load_data():
+            data = dataset_store.get(dataset_id, columns)
+            if rows is not None:
+                data = data.iloc[rows].reset_index(drop=True)
+            return data
+
+        return token, load_data
+
+    if 'file' not in request.files:
+        raise ValueError('No file part')
+
+    file = request.files['file']
+    if file.filename == '':
+        raise ValueError('No selected file')
+
+    # Hash and parse the spooled upload in chunks rather than reading it into memory
+    token = stream_content_hash(file.stream)
+
+    def load_data():
+        file.stream.seek(0)
+        return read_csv_chunked(file.stream).data
+
+    return token, load_data
+
+
+def request_row_strategy():
+    """
+    Row strategy of a clustering request, checked before any fitting
+
+    Raises:
+    -------
+    ValueError
+        If the ``rowStrategy`` field is not one of ROW_STRATEGIES
+    """
+    row_strategy = request.form.get('rowStrategy', 'full')
+    if row_strategy not in ROW_STRATEGIES:
+        raise ValueError(f"Unknown row_strategy {row_strategy!r}, expected one of {ROW_STRATEGIES}")
+    return row_strategy
+
+
+def cluster_blocks(entry, row_clusters, col_clusters):
+    """Cut a cached model at the requested cluster counts and return its sorted blocks"""
+    # Models are shared between requests, so cutting and reading the labels is serialized
+    with entry['lock']:
+        biclustering = entry['model'].recut(row_clusters, col_clusters)
+
+        # Separate mixed-type blocks
+        separated_blocks = biclustering.separate_mixed_type_blocks(entry['data'])
+        return biclustering.sort_blocks_globally(separated_blocks)
+
+
+def cluster_layout(entry, row_clusters, col_clusters):
+    """Cut a cached model at the requested cluster counts and return its sorted block layout"""
+    with entry['lock']:
+        biclustering = entry['model'].recut(row_clusters, col_clusters)
+        return biclustering.sorted_block_layout(entry['data'])
+
+
+@instrumented('serialize')
+def layout_response(layout, data, dataset_key):
+    """
+    Serialize a block layout, the client cuts the blocks out of its own copy of the data
+
+    Rows are referenced by position and columns by name.
+    """
+    return jsonify({
+        'layout': {
+            'n_rows': len(data),
+            'row_order': layout['row_order'].tolist(),
+            'row_offsets': layout['row_offsets'].tolist(),
+            'row_clusters': layout['row_clusters'].tolist(),
+            'col_order': data.columns[layout['col_order']].astype(str).tolist(),
+            'col_offsets': layout['col_offsets'].tolist(),
+            'col_segments': [[int(col_cluster), block_type] for col_cluster, block_type in layout['col_segments']],
+            'blocks': [[block_key(key), i, j] for key, i, j in layout['blocks']],
+        },
+        'dataset_key': dataset_key,
+    })
+
+
+def clusters_response(entry, row_clusters, col_clusters, dataset_key, mode):
+    """Answer a clustering request with either the blocks themselves or, for mode 'indices', their layout"""
+    if mode == 'indices':
+        return layout_response(cluster_layout(entry, row_clusters, col_clusters), entry['data'], dataset_key)
+    return blocks_response(cluster_blocks(entry, row_clusters, col_clusters), dataset_key)
+
+
+@instrumented('serialize')
+def blocks_response(blocks, dataset_key):
+    """
+    Serialize blocks in the format negotiated through the Accept header
+
+    Clients preferring BLOCKS_MIME over JSON get the binary payload of
+    wire_format.encode_blocks(), everyone else the JSON one.
+    """
+    accept = request.accept_mimetypes
+    if accept[BLOCKS_MIME] > accept['application/json']:
+        return Response(encode_blocks(blocks, dataset_key), mimetype=BLOCKS_MIME)
+
+    # Convert separated blocks to a serializable format with column information
+    blocks_serializable = {
+        block_key(key): {
+            'data': block.values.tolist(),
+            'columns': block.columns.tolist()
+        }
+        for key, block in blocks.items()
+    }
+    return jsonify({'blocks': blocks_serializable, 'dataset_key': dataset_key})
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/get_clusters', methods=['POST'])
-def get_clusters():
+@app.route('/datasets', methods=['POST'])
+def upload_dataset():
+    """Store an uploaded CSV file once and return the ID later requests reference it by"""
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
 
@@ -18,63 +228,303 @@ def get_clusters():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
+    try:
+        dataset_id = dataset_store.put(file.stream)
+        return jsonify({'dataset_id': dataset_id})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/get_clusters', methods=['POST'])
+def get_clusters():
+    try:
+        row_strategy = request_row_strategy()
+        cache_token, load_data = request_dataset()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         row_clusters = int(request.form.get('rowClusters', 5))
         col_clusters = int(request.form.get('colClusters', 5))
 
-        # Read the CSV file
-        data = pd.read_csv(file)
+        cache_key = (cache_token, row_strategy)
+        entry = model_cache.get(cache_key)
 
-        # Create a MixedTypeBiclustering instance and fit the data
-        biclustering = MixedTypeBiclustering(n_row_clusters=row_clusters, n_col_clusters=col_clusters)
-        biclustering.fit(data)
+        if entry is None:
+            # Read the CSV file
+            data = load_data()
 
-        # Separate mixed-type blocks
-        separated_blocks = biclustering.separate_mixed_type_blocks(data)
-        final_sorted_blocks = biclustering.sort_blocks_globally(separated_blocks)
-
-        # Convert separated blocks to a serializable format with column information
-        blocks_serializable = {
-            f"{row_cluster},{col_cluster},{block_id},{block_type}": {
-                'data': block.values.tolist(),
-                'columns': block.columns.tolist()
-            }
-            for (row_cluster, col_cluster, block_id, block_type), block in final_sorted_blocks.items()
-        }
+            # Create a MixedTypeBiclustering instance and fit the data
+            biclustering = MixedTypeBiclustering(n_row_clusters=row_clusters, n_col_clusters=col_clusters,
+                                                 row_strategy=row_strategy, ordering='hierarchical',
+                                                 n_jobs=model_threads, scratch_dir=scratch_dir)
+            biclustering.fit(data)
+
+            entry = {'data': data, 'model': biclustering, 'lock': threading.Lock()}
+            model_cache.put(cache_key, entry)
 
-        return jsonify({'blocks': blocks_serializable})
+        return clusters_response(entry, row_clusters, col_clusters, cache_key[0], request.form.get('mode', 'blocks'))
+    except DatasetNotFoundError:
+        return jsonify({'error': 'Unknown dataset'}), 404
+    except UnknownColumnError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/recut_clusters', methods=['POST'])
+def recut_clusters():
+    """Re-cut a previously fitted dataset at new cluster counts, without re-uploading it"""
+    params = request.get_json(silent=True) or request.form
+    try:
+        row_clusters = int(params.get('rowClusters', 5))
+        col_clusters = int(params.get('colClusters', 5))
+        cache_key = (params.get('datasetKey'), params.get('rowStrategy', 'full'))
+
+        entry = model_cache.get(cache_key)
+        if entry is None:
+            # Evicted or never fitted: the client falls back to /get_clusters
+            return jsonify({'error': 'Unknown dataset key'}), 404
+
+        return clusters_response(entry, row_clusters, col_clusters, cache_key[0], params.get('mode', 'blocks'))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
 
+def job_source():
+    """
+    Data of a job request, in a form that can be handed to a worker process
+
+    Like request_dataset(), but an uploaded file is spooled to a temporary
+    file that the worker parses, since the upload stream is closed once the
+    request returns.
+
+    Returns:
+    --------
+    Tuple of (cache token, DataFrame or path of the spooled CSV file)
+    """
+    if request.form.get('dataset_id'):
+        cache_token, load_data = request_dataset()
+        return cache_token, load_data()
+
+    cache_token, _ = request_dataset()
+    file = request.files['file']
+    fd, path = tempfile.mkstemp(prefix='upload-', suffix='.csv')
+    with os.fdopen(fd, 'wb') as spooled:
+        shutil.copyfileobj(file.stream, spooled)
+    return cache_token, path
+
+
+@app.route('/jobs/clusters', methods=['POST'])
+def submit_clustering_job():
+    """
+    Start fitting, cutting and sorting a biclustering in a worker process
+
+    Takes the fields of /get_clusters and answers at once with the job's
+    state, including its ``job_id``. A previous job of the same ``session``
+    field (or, without one, of the same dataset) still queued or running is
+    cancelled. Progress is read from /jobs/<job_id> or streamed from
+    /jobs/<job_id>/events, the outcome from /jobs/<job_id>/result.
+    """
+    try:
+        row_strategy = request_row_strategy()
+        cache_token, source = job_source()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except DatasetNotFoundError:
+        return jsonify({'error': 'Unknown dataset'}), 404
+
+    try:
+        row_clusters = int(request.form.get('rowClusters', 5))
+        col_clusters = int(request.form.get('colClusters', 5))
+        mode = request.form.get('mode', 'blocks')
+        cache_key = (cache_token, row_strategy)
+
+        entry = model_cache.get(cache_key)
+        model = None
+        if entry is not None:
+            # Only the cut and the sorting are left to do
+            if isinstance(source, str):
+                os.remove(source)
+            source, model = entry['data'], entry['model']
+        model_params = {'row_strategy': row_strategy, 'ordering': 'hierarchical', 'n_jobs': model_threads,
+                        'scratch_dir': scratch_dir}
+
+        def store_model(job):
+            data, fitted, result = job.result
+            data = source if data is None else data
+            if model is None:
+                model_cache.put(cache_key, {'data': data, 'model': fitted, 'lock': threading.Lock()})
+            job.result = (data, result)
+
+        def remove_upload(job):
+            if isinstance(source, str) and os.path.exists(source):
+                os.remove(source)
+
+        job = job_manager.submit(clustering_job, source, model, model_params, row_clusters, col_clusters, mode,
+                                 group=request.form.get('session') or cache_token,
+                                 meta={'dataset_key': cache_token, 'mode': mode},
+                                 on_done=store_model, on_finish=remove_upload)
+        return jsonify(job.snapshot()), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Current state of a job: status, stage and progress fraction"""
+    try:
+        return jsonify(job_manager.get(job_id).snapshot())
+    except JobNotFoundError:
+        return jsonify({'error': 'Unknown job'}), 404
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    try:
+        return jsonify(job_manager.cancel(job_id).snapshot())
+    except JobNotFoundError:
+        return jsonify({'error': 'Unknown job'}), 404
+
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events with the state of a job after every change, until it finishes"""
+    try:
+        job = job_manager.get(job_id)
+    except JobNotFoundError:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def events():
+        version = -1
+        while True:
+            if not job_manager.wait(job, version, timeout=15):
+                # Keeps proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+                continue
+            version = job.version
+            yield f'data: {json.dumps(job.snapshot())}\n\n'
+            if job.finished:
+                return
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Outcome of a finished clustering job, serialized as /get_clusters would"""
+    try:
+        job = job_manager.get(job_id)
+    except JobNotFoundError:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status != 'done':
+        return jsonify(job.snapshot()), 409
+
+    data, result = job.result
+    if job.meta['mode'] == 'indices':
+        return layout_response(result, data, job.meta['dataset_key'])
+    return blocks_response(result, job.meta['dataset_key'])
+
+
 # Add this new route to your app.py file
 
+@instrumented('serialize')
+def vsm_level_json(level):
+    """Serializable form of a coarsened VSM level, similarities rounded to 4 decimals"""
+    # float64 before rounding, float32 values would print with their full binary expansion
+    return {
+        'mean': level['mean'].astype(float).round(4).tolist(),
+        'min': level['min'].astype(float).round(4).tolist(),
+        'max': level['max'].astype(float).round(4).tolist(),
+        'row_edges': level['row_edges'].tolist(),
+        'col_edges': level['col_edges'].tolist(),
+        'size': len(level['order'])
+    }
+
+
 @app.route('/get_vsm', methods=['POST'])
 def get_vsm():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
+    """
+    Row and column similarity matrices
 
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    Without ``resolution`` the full matrices are returned, unordered unless
+    ``ordered`` is set, in which case they come in leaf order with the
+    permutations (``row_order``, ``column_order``) and average linkages
+    (``row_linkage``, ``column_linkage``). With ``resolution``, both
+    leaf-ordered matrices are aggregated into grids of at most
+    resolution x resolution cells (see
+    OptimizedDualSimilarityMatrix.coarsened_matrix), each with its ``order``
+    and ``linkage``; ``axis`` and a ``region`` JSON list
+    [row_start, row_stop, col_start, col_stop] of leaf-order positions
+    request a zoomed view of one of them.
+
+    ``seriation`` picks how rows and columns are ordered (see
+    seriation.seriate): 'linkage' (default), 'refined', 'optimal' or
+    'spectral', the last one without linkages.
 
+    The instance, with its similarities, linkages and orders, is cached per
+    dataset and seriation, so none of them is recomputed by later requests.
+    """
     try:
-        # Read the CSV file
-        data = pd.read_csv(file)
-        
-        # Create VSM instance
-        vsm = OptimizedDualSimilarityMatrix(data)
-        
-        # Get similarity matrices
-        row_similarity, col_similarity = vsm.get_similarity_matrices()
-        
-        # Convert numpy arrays to lists for JSON serialization
-        response_data = {
-            'row_similarity': row_similarity.tolist(),
-            'column_similarity': col_similarity.tolist()
-        }
-        
-        return jsonify(response_data)
+        cache_token, load_data = request_dataset()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # The instance is kept so that zoom requests reuse its similarities and orderings
+        seriation = request.form.get('seriation', 'linkage')
+        cache_key = (cache_token, 'vsm', seriation)
+        entry = model_cache.get(cache_key)
+        if entry is None:
+            vsm = OptimizedDualSimilarityMatrix(load_data(), scratch_dir=scratch_dir, seriation=seriation,
+                                                n_jobs=model_threads)
+            entry = {'vsm': vsm, 'lock': threading.Lock()}
+            model_cache.put(cache_key, entry)
+
+        with entry['lock']:
+            vsm = entry['vsm']
+            if 'resolution' not in request.form and request.form.get('ordered', 'false') not in ('false', '0'):
+                response_data = {}
+                for axis, prefix in (('rows', 'row'), ('columns', 'column')):
+                    axis_linkage = vsm.get_linkage(axis)
+                    response_data.update({
+                        f'{prefix}_similarity': vsm.get_ordered_matrix(axis).tolist(),
+                        f'{prefix}_order': vsm.get_order(axis).tolist(),
+                        f'{prefix}_linkage': axis_linkage.tolist() if axis_linkage is not None else []
+                    })
+            elif 'resolution' not in request.form:
+                # Get similarity matrices
+                row_similarity, col_similarity = vsm.get_similarity_matrices()
+                
+                # Convert numpy arrays to lists for JSON serialization
+                response_data = {
+                    'row_similarity': row_similarity.tolist(),
+                    'column_similarity': col_similarity.tolist()
+                }
+            else:
+                resolution = int(request.form['resolution'])
+                region = json.loads(request.form['region']) if request.form.get('region') else None
+                axes = [request.form['axis']] if request.form.get('axis') else ['rows', 'columns']
+                response_data = {}
+                for axis in axes:
+                    level = vsm.coarsened_matrix(axis, resolution, region)
+                    level_data = vsm_level_json(level)
+                    if region is None:
+                        # Zooms keep the order and linkage of the whole matrix
+                        axis_linkage = vsm.get_linkage(axis)
+                        level_data['order'] = level['order'].tolist()
+                        level_data['linkage'] = axis_linkage.tolist() if axis_linkage is not None else []
+                    response_data['row_similarity' if axis == 'rows' else 'column_similarity'] = level_data
+
+        # Size the cache entry again now that it holds the similarities
+        model_cache.put(cache_key, entry)
+        with stage('serialize'):
+            return jsonify(response_data)
+    except DatasetNotFoundError:
+        return jsonify({'error': 'Unknown dataset'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
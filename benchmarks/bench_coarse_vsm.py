@@ -0,0 +1,56 @@
+"""
+Payload and time of the full and the coarsened row similarity matrix
+
+Usage: python benchmarks/bench_coarse_vsm.py [n_rows ...]
+
+Compares what /get_vsm used to send (the n x n matrix as a JSON list) with a
+512 x 512 coarsened level and a zoom into 1% of the rows, after the shared
+condensed similarities and leaf order have been computed.
+"""
+import json
+import sys
+import time
+import warnings
+
+from datasets import load_scaled
+from similarity_matrix_mixed_clustering import OptimizedDualSimilarityMatrix
+
+RESOLUTION = 512
+# Largest size on which the full matrix is serialized
+FULL_MAX_ROWS = 5000
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def level_json(level):
+    # As app.vsm_level_json() serializes it
+    grids = {key: level[key].astype(float).round(4).tolist() for key in ('mean', 'min', 'max')}
+    return json.dumps({**grids, 'row_edges': level['row_edges'].tolist(), 'col_edges': level['col_edges'].tolist()})
+
+
+def main(sizes):
+    warnings.simplefilter('ignore', RuntimeWarning)
+    print(f"{'rows':>7}{'order (s)':>11}{'full (s)':>10}{'full (MB)':>11}"
+          f"{'coarse (s)':>12}{'coarse (MB)':>13}{'zoom (s)':>10}")
+    for n_rows in sizes:
+        vsm = OptimizedDualSimilarityMatrix(load_scaled('health_metrics', n_rows))
+        _, order_time = timed(lambda: vsm.get_order('rows'))
+
+        full_time, full_size = float('nan'), float('nan')
+        if n_rows <= FULL_MAX_ROWS:
+            payload, full_time = timed(lambda: json.dumps(vsm.get_similarity_matrices()[0].tolist()))
+            full_size = len(payload) / 1e6
+
+        payload, coarse_time = timed(lambda: level_json(vsm.coarsened_matrix('rows', RESOLUTION)))
+        stop = max(n_rows // 100, 2)
+        _, zoom_time = timed(lambda: level_json(vsm.coarsened_matrix('rows', RESOLUTION, (0, stop, 0, stop))))
+        print(f"{n_rows:>7}{order_time:>11.2f}{full_time:>10.2f}{full_size:>11.1f}"
+              f"{coarse_time:>12.2f}{len(payload) / 1e6:>13.1f}{zoom_time:>10.3f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [2000, 5000, 10000])
@@ -0,0 +1,48 @@
+"""
+Time and memory of the column similarities
+
+Usage: python benchmarks/bench_column_similarity.py [n_rows ...]
+
+Compares the mixed distance over the transposed matrix (every column one
+n_rows-long sample, as fit() and get_similarity_matrices() computed it) with
+column_similarity.column_association(), which streams the rows once through
+Gram products and contingency tables. The encoded table is built beforehand
+and not measured.
+"""
+import sys
+import time
+import tracemalloc
+import warnings
+
+from datasets import load_scaled
+from column_similarity import column_association
+from encoded_table import EncodedTable
+from mixed_distance import condensed_mixed_distance
+
+
+def measured(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main(sizes):
+    warnings.simplefilter('ignore', RuntimeWarning)
+    # Compile the numba kernels outside of the timings
+    column_association(EncodedTable.from_frame(load_scaled('health_metrics', 100)))
+
+    print(f"{'rows':>9}{'transposed (s)':>16}{'peak (MiB)':>12}{'association (s)':>17}{'peak (MiB)':>12}")
+    for n_rows in sizes:
+        table = EncodedTable.from_frame(load_scaled('health_metrics', n_rows))
+        transposed_time, transposed_peak = measured(lambda: condensed_mixed_distance(table.matrix().T))
+        association_time, association_peak = measured(lambda: column_association(table))
+        print(f"{n_rows:>9}{transposed_time:>16.2f}{transposed_peak:>12.1f}"
+              f"{association_time:>17.2f}{association_peak:>12.1f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100000, 1000000])
@@ -0,0 +1,68 @@
+"""
+Wall-clock time of the row and column halves run one after the other and concurrently
+
+Usage: python benchmarks/bench_concurrent_halves.py [n_rows ...]
+
+Times MixedTypeBiclustering.fit() and the OptimizedDualSimilarityMatrix
+similarities and orders with n_jobs=1 and n_jobs=2, for both column
+metrics, and checks that the linkages are identical. The gain is bounded by
+the shorter half: with the 'association' column metric the column half is
+small next to the O(n^2) row half, with 'mixed_distance' it is a full
+distance pass over the rows. It needs at least two cores; on one core both
+timings are the same.
+"""
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from datasets import load_scaled
+from biclustering import MixedTypeBiclustering
+from column_similarity import COLUMN_METRICS
+from similarity_matrix_mixed_clustering import OptimizedDualSimilarityMatrix
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def fit(data, column_metric, n_jobs):
+    model = MixedTypeBiclustering(5, 5, column_metric=column_metric, n_jobs=n_jobs).fit(data)
+    return model._row_clustering_result['linkage'], model._column_clustering_result['linkage']
+
+
+def vsm(data, column_metric, n_jobs):
+    matrices = OptimizedDualSimilarityMatrix(data, column_metric=column_metric, n_jobs=n_jobs)
+    matrices.get_reordered_matrices()
+    return matrices.get_linkage('rows'), matrices.get_linkage('columns')
+
+
+RUNS = {
+    'biclustering fit': fit,
+    'VSM orders': vsm,
+}
+
+
+def main(sizes):
+    warnings.simplefilter('ignore', RuntimeWarning)
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'rows':>7}{'computation':>18}{'columns':>16}{'n_jobs=1 (s)':>14}{'n_jobs=2 (s)':>14}")
+    # Compile the numba kernels outside of the timings
+    for run in RUNS.values():
+        run(load_scaled('health_metrics', 100), 'association', 2)
+    for n_rows in sizes:
+        data = load_scaled('health_metrics', n_rows)
+        for name, run in RUNS.items():
+            for column_metric in COLUMN_METRICS:
+                sequential, sequential_time = timed(lambda: run(data, column_metric, 1))
+                concurrent, concurrent_time = timed(lambda: run(data, column_metric, 2))
+                assert all(np.array_equal(a, b) for a, b in zip(sequential, concurrent))
+                print(f"{n_rows:>7}{name:>18}{column_metric:>16}{sequential_time:>14.2f}{concurrent_time:>14.2f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [5000, 10000])
@@ -0,0 +1,64 @@
+"""
+Peak memory of the dense-square similarity pipeline versus the condensed one
+
+Usage: python benchmarks/bench_condensed_memory.py [n_rows]
+
+Both pipelines compute row distances, turn them into similarities, run the
+average linkage and materialize the reordered similarity matrix, which is the
+only square the condensed pipeline builds.
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from scipy.cluster.hierarchy import linkage, leaves_list
+from scipy.spatial.distance import squareform
+
+from datasets import load_scaled
+from similarity_matrix_mixed_clustering import OptimizedDualSimilarityMatrix
+
+
+def dense_pipeline(vsm: OptimizedDualSimilarityMatrix) -> np.ndarray:
+    """Previous data flow: square distances, square similarities, squareform round trip"""
+    distances = squareform(vsm._mixed_distance(vsm._table))
+    distances = (distances + distances.T) / 2
+    similarity = 1 - (distances / np.max(distances))
+    order = leaves_list(linkage(squareform(1 - similarity, checks=False), method='average'))
+    return similarity[np.ix_(order, order)]
+
+
+def condensed_pipeline(vsm: OptimizedDualSimilarityMatrix) -> np.ndarray:
+    vsm._row_similarity = vsm._col_similarity = None
+    return vsm.get_reordered_matrices()[0]
+
+
+def measure(func, vsm):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(vsm)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main(n_rows: int):
+    for dtype in (np.float64, np.float32):
+        vsm = OptimizedDualSimilarityMatrix(load_scaled('health_metrics', n_rows), dtype=dtype)
+        vsm._preprocess_data()
+        # Compile the kernel outside of the measurements
+        vsm._mixed_distance(vsm._table.take(np.arange(10)))
+
+        dense, dense_time, dense_peak = measure(dense_pipeline, vsm)
+        condensed, condensed_time, condensed_peak = measure(condensed_pipeline, vsm)
+
+        print(f"{n_rows} rows, {np.dtype(dtype).name}:")
+        print(f"  dense     peak {dense_peak:9.1f} MiB  {dense_time:7.2f}s")
+        print(f"  condensed peak {condensed_peak:9.1f} MiB  {condensed_time:7.2f}s"
+              f"  ({condensed_peak / dense_peak:.0%} of dense)")
+        print(f"  max |diff| of reordered matrices: {np.abs(dense - condensed).max():.2e}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
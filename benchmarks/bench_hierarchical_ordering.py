@@ -0,0 +1,57 @@
+"""
+Time and memory of the global and hierarchical sort_blocks_globally orderings
+
+Usage: python benchmarks/bench_hierarchical_ordering.py [n_rows ...]
+
+The global ordering allocates an n x n row matrix, the hierarchical one a
+matrix per row cluster, of at most sample_size rows as the model is fitted
+with row_strategy='sample'. Reports the tracemalloc peak of each.
+"""
+import sys
+import time
+import tracemalloc
+import warnings
+
+from datasets import load_scaled
+from biclustering import MixedTypeBiclustering
+
+# Largest size on which the n x n global ordering is run
+GLOBAL_MAX_ROWS = 10000
+N_JOBS = 4
+
+
+def timed_sort(model, blocks):
+    tracemalloc.start()
+    start = time.perf_counter()
+    model.sort_blocks_globally(blocks)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main(sizes):
+    warnings.simplefilter('ignore', RuntimeWarning)
+    print(f"{'rows':>9}{'largest cluster':>17}{'hier. (s)':>11}{f'n_jobs={N_JOBS} (s)':>14}{'peak (MiB)':>12}"
+          f"{'global (s)':>12}{'peak (MiB)':>12}")
+    for n_rows in sizes:
+        data = load_scaled('health_metrics', n_rows)
+        model = MixedTypeBiclustering(n_row_clusters=5, n_col_clusters=5, row_strategy='sample',
+                                      ordering='hierarchical').fit(data)
+        blocks = model.separate_mixed_type_blocks(data)
+        largest = max(len(block) for block in blocks.values())
+
+        hierarchical_time, hierarchical_peak = timed_sort(model, blocks)
+        model.n_jobs = N_JOBS
+        parallel_time, _ = timed_sort(model, blocks)
+        line = f"{n_rows:>9}{largest:>17}{hierarchical_time:>11.2f}{parallel_time:>14.2f}{hierarchical_peak:>12.1f}"
+
+        if n_rows <= GLOBAL_MAX_ROWS:
+            model.ordering = 'global'
+            global_time, global_peak = timed_sort(model, blocks)
+            line += f"{global_time:>12.2f}{global_peak:>12.1f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [2000, 5000, 10000, 20000])
@@ -0,0 +1,89 @@
+"""
+Peak memory and time of parsing a CSV upload
+
+Usage: python benchmarks/bench_ingestion.py [n_rows [n_cols]]
+
+Writes a mixed-type CSV (default 1M x 20, a quarter of the columns
+categorical, 2% missing) to a temporary file and parses it with
+pd.read_csv and with ingestion.read_csv_chunked (also with compact=True),
+each in a fresh interpreter so that the peak resident set sizes do not mix.
+The size of the encoded frame is printed for comparison.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_SHARE = 0.25
+MISSING_RATE = 0.02
+CARDINALITY = 50
+
+PARSERS = {
+    'pd.read_csv': 'pd.read_csv(path)',
+    'read_csv_chunked': 'read_csv_chunked(path).data',
+    'compact': 'read_csv_chunked(path, compact=True).data',
+}
+
+
+def write_csv(path, n_rows, n_cols, seed=0):
+    rng = np.random.default_rng(seed)
+    n_categorical = int(n_cols * CATEGORICAL_SHARE)
+    # Written in slices so that generating the file does not dominate the benchmark
+    for start in range(0, n_rows, 100000):
+        size = min(100000, n_rows - start)
+        columns = {}
+        for i in range(n_cols):
+            if i < n_categorical:
+                values = pd.Series(rng.integers(CARDINALITY, size=size)).map('level_{}'.format)
+            else:
+                values = pd.Series(rng.normal(size=size).round(4))
+            columns[f'c{i}'] = values.mask(rng.random(size) < MISSING_RATE)
+        pd.DataFrame(columns).to_csv(path, mode='a', header=start == 0, index=False)
+
+
+def measure(parser, path):
+    """Run one parser in a child interpreter, returns (seconds, peak RSS MiB, frame MiB)"""
+    code = f"""
+import resource, time
+import pandas as pd
+import datasets
+from ingestion import read_csv_chunked
+path = {path!r}
+start = time.perf_counter()
+data = {PARSERS[parser]}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, data.memory_usage(deep=True).sum())
+"""
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    elapsed, peak_kib, frame_bytes = output.split()
+    return float(elapsed), int(peak_kib) / 2**10, int(frame_bytes) / 2**20
+
+
+def main(n_rows, n_cols):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        start = time.perf_counter()
+        write_csv(path, n_rows, n_cols)
+        print(f"{n_rows} x {n_cols}, {os.path.getsize(path) / 2**20:.0f} MiB of CSV "
+              f"(written in {time.perf_counter() - start:.1f} s)")
+
+        # Peak RSS of the interpreter and libraries alone, the parsers add to it
+        baseline = subprocess.run([sys.executable, '-c', 'import resource, pandas, sklearn; '
+                                   'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'],
+                                  capture_output=True, text=True, check=True).stdout
+        print(f"imports alone: {int(baseline) / 2**10:.0f} MiB peak RSS")
+
+        print(f"{'parser':>18}{'time (s)':>10}{'peak RSS (MiB)':>16}{'frame (MiB)':>13}")
+        for parser in PARSERS:
+            elapsed, peak, frame = measure(parser, path)
+            print(f"{parser:>18}{elapsed:>10.2f}{peak:>16.0f}{frame:>13.0f}")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [1000000, 20][len(args):]))
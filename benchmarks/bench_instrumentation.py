@@ -0,0 +1,63 @@
+"""
+Overhead of the stage instrumentation
+
+Usage: python benchmarks/bench_instrumentation.py [n_rows ...]
+
+Times an empty instrumented() function disabled and enabled (per call), then
+fits MixedTypeBiclustering on the scaled health_metrics data with
+instrumentation off and on, and prints the stages recorded by the last fit.
+"""
+import logging
+import sys
+import time
+import warnings
+
+from datasets import load_scaled
+import instrumentation
+from biclustering import MixedTypeBiclustering
+
+CALLS = 200000
+
+
+def per_call(func) -> float:
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        func()
+    return (time.perf_counter() - start) / CALLS * 1e9
+
+
+def fit_time(data) -> float:
+    start = time.perf_counter()
+    MixedTypeBiclustering().fit(data)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    warnings.simplefilter('ignore', RuntimeWarning)
+    logging.getLogger(instrumentation.__name__).setLevel(logging.WARNING)
+
+    def plain():
+        pass
+
+    hooked = instrumentation.instrumented('empty')(plain)
+    instrumentation.configure(False)
+    print(f"plain call {per_call(plain):.0f} ns, disabled hook {per_call(hooked):.0f} ns", end='')
+    instrumentation.configure(True)
+    print(f", enabled hook {per_call(hooked):.0f} ns")
+
+    # Compile the numba kernels outside of the timings
+    MixedTypeBiclustering().fit(load_scaled('health_metrics', 100))
+    print(f"{'rows':>7}{'off (s)':>10}{'on (s)':>10}")
+    for n_rows in sizes:
+        data = load_scaled('health_metrics', n_rows)
+        instrumentation.configure(False)
+        off = fit_time(data)
+        instrumentation.configure(True)
+        instrumentation.begin_request()
+        on = fit_time(data)
+        print(f"{n_rows:>7}{off:>10.2f}{on:>10.2f}")
+    print(instrumentation.end_request())
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 5000])
@@ -0,0 +1,46 @@
+"""
+Thread-scaling benchmark for the parallel numba distance kernel
+
+Usage: python benchmarks/bench_numba_scaling.py [n_rows]
+
+Thread counts above NUMBA_NUM_THREADS (defaults to the number of cores) are
+skipped; set the environment variable to oversubscribe.
+"""
+import sys
+import time
+
+import numba
+import numpy as np
+
+from datasets import load_scaled
+from mixed_distance import MixedDistanceEngine
+from similarity_matrix_mixed_clustering import OptimizedDualSimilarityMatrix
+
+THREAD_COUNTS = (1, 2, 4, 8)
+
+
+def main(n_rows: int):
+    table = OptimizedDualSimilarityMatrix(load_scaled('health_metrics', n_rows))._preprocess_data()
+
+    for dtype in (np.float64, np.float32):
+        engine = MixedDistanceEngine.from_table(table, backend='numba', dtype=dtype)
+
+        start = time.perf_counter()
+        engine.condensed()
+        print(f"{np.dtype(dtype).name}: first call (compile or cache load) {time.perf_counter() - start:.3f}s")
+
+        baseline = None
+        for n_threads in THREAD_COUNTS:
+            if n_threads > numba.config.NUMBA_NUM_THREADS:
+                print(f"  {n_threads} threads: skipped (NUMBA_NUM_THREADS={numba.config.NUMBA_NUM_THREADS})")
+                continue
+            numba.set_num_threads(n_threads)
+            start = time.perf_counter()
+            engine.condensed()
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"  {n_threads} threads: {elapsed:.3f}s  ({baseline / elapsed:.2f}x)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,77 @@
+"""
+Cost of missing-pattern awareness in the mixed distance
+
+Usage: python benchmarks/bench_pattern_distance.py [n_rows ...]
+
+Times MixedDistanceEngine with and without pattern_ids on both backends, on
+numeric data with NaNs injected along a few shared patterns. On the smallest
+size the previous per-pair Python closures (kept below, with the pdist input
+made 2-D so that they run at all) serve as the reference: all results must
+agree.
+"""
+import sys
+import time
+
+import numpy as np
+from scipy.spatial.distance import pdist
+
+from bench_missing_patterns import make_frame
+from enhanced_biclustering import ComprehensiveMixedBiclustering
+from mixed_distance import MixedDistanceEngine
+
+N_COLS = 30
+# Largest size on which the per-pair closures are run
+LEGACY_MAX_ROWS = 400
+
+
+def legacy_pattern_distance(X, pattern_ids):
+    def mixed_metric(u, v):
+        distances = []
+        for i in range(len(u)):
+            if np.isnan(u[i]) or np.isnan(v[i]):
+                distances.append(1.0)
+            else:
+                distances.append((float(u[i]) - float(v[i]))**2)
+        return np.sqrt(np.sum(distances))
+
+    def pattern_adjusted_metric(u, v, idx1, idx2):
+        base_dist = mixed_metric(u, v)
+        pattern_factor = 0.5 if pattern_ids[idx1] == pattern_ids[idx2] else 2.0
+        return base_dist * pattern_factor
+
+    n = X.shape[0]
+    return pdist(np.arange(n)[:, None], metric=lambda i, j: pattern_adjusted_metric(
+        X[int(i[0])], X[int(j[0])], int(i[0]), int(j[0])))
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'rows':>7}{'backend':>9}{'plain (s)':>11}{'patterns (s)':>14}{'ratio':>7}")
+    for n_rows in sizes:
+        data = make_frame(n_rows, N_COLS)
+        X = data.to_numpy()
+        pattern_ids = ComprehensiveMixedBiclustering()._identify_missing_patterns(data)
+
+        results = {}
+        for backend in ('numpy', 'numba'):
+            # Warm up the compiled kernel outside the timing
+            MixedDistanceEngine(X[:10], backend=backend, pattern_ids=pattern_ids[:10]).condensed()
+            plain, plain_time = timed(lambda: MixedDistanceEngine(X, backend=backend).condensed())
+            results[backend], pattern_time = timed(
+                lambda: MixedDistanceEngine(X, backend=backend, pattern_ids=pattern_ids).condensed())
+            print(f"{n_rows:>7}{backend:>9}{plain_time:>11.3f}{pattern_time:>14.3f}{pattern_time / plain_time:>7.2f}")
+
+        assert np.allclose(results['numpy'], results['numba'])
+        if n_rows <= LEGACY_MAX_ROWS:
+            legacy, legacy_time = timed(lambda: legacy_pattern_distance(X, pattern_ids))
+            assert np.allclose(legacy, results['numba'])
+            print(f"{n_rows:>7}{'closures':>9}{'':>11}{legacy_time:>14.3f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [400, 2000, 10000])
@@ -0,0 +1,69 @@
+"""
+Time and memory of the shared EncodedTable preprocessing
+
+Usage: python benchmarks/bench_preprocessing.py [n_rows]
+
+Compares the per-class preprocessing that MixedTypeBiclustering and
+OptimizedDualSimilarityMatrix each ran before (copy, StandardScaler, a
+LabelEncoder over every categorical column cast to str, then .values; kept
+below) against EncodedTable.from_frame(), and against encode_table() when the
+same frame has already been encoded. The label codes must be identical.
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from datasets import load_scaled
+from encoded_table import EncodedTable, encode_table
+
+
+def legacy_preprocess(data):
+    numeric_cols = data.select_dtypes(include=[np.number]).columns
+    categorical_cols = data.select_dtypes(include=['object', 'category']).columns
+
+    processed_data = data.copy()
+
+    if len(numeric_cols) > 0:
+        scaler = StandardScaler()
+        processed_data[numeric_cols] = scaler.fit_transform(processed_data[numeric_cols])
+
+    for col in categorical_cols:
+        le = LabelEncoder()
+        processed_data[col] = le.fit_transform(processed_data[col].astype(str))
+
+    return processed_data.values, processed_data.columns.isin(numeric_cols)
+
+
+def measured(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main(n_rows):
+    data = load_scaled('health_metrics', n_rows)
+
+    (X, column_types), legacy_time, legacy_peak = measured(lambda: legacy_preprocess(data))
+    table, table_time, table_peak = measured(lambda: EncodedTable.from_frame(data))
+    encode_table(data)
+    _, cached_time, _ = measured(lambda: encode_table(data))
+
+    assert (X[:, ~column_types].astype(np.int32) == table.codes).all()
+    assert np.allclose(X[:, column_types].astype(np.float64), table.numeric, atol=1e-5, equal_nan=True)
+
+    print(f"{n_rows} rows x {data.shape[1]} columns")
+    print(f"{'':>22}{'time (s)':>10}{'peak (MiB)':>12}")
+    print(f"{'per-class (x2 before)':>22}{legacy_time:>10.2f}{legacy_peak:>12.1f}")
+    print(f"{'EncodedTable':>22}{table_time:>10.2f}{table_peak:>12.1f}")
+    print(f"{'encode_table (cached)':>22}{cached_time:>10.2f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
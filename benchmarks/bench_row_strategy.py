@@ -0,0 +1,47 @@
+"""
+Scaling of MixedTypeBiclustering.fit with row_strategy='sample'
+
+Usage: python benchmarks/bench_row_strategy.py [n_rows ...]
+
+Reports fit time and tracemalloc peak per size, and the adjusted Rand index
+between the sampled and the full strategy where the full one is affordable.
+"""
+import sys
+import time
+import tracemalloc
+
+from sklearn.metrics import adjusted_rand_score
+
+from datasets import load_scaled
+from biclustering import MixedTypeBiclustering
+
+# Largest size on which the O(n^2) full strategy is run for comparison
+FULL_STRATEGY_MAX_ROWS = 10000
+
+
+def timed_fit(data, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    model = MixedTypeBiclustering(n_row_clusters=5, n_col_clusters=5, **kwargs).fit(data)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return model, elapsed, peak / 2**20
+
+
+def main(sizes):
+    print(f"{'rows':>9}{'sample fit (s)':>16}{'peak (MiB)':>12}{'full fit (s)':>14}{'peak (MiB)':>12}{'ARI':>7}")
+    for n_rows in sizes:
+        data = load_scaled('health_metrics', n_rows)
+        sampled, sample_time, sample_peak = timed_fit(data, row_strategy='sample')
+        line = f"{n_rows:>9}{sample_time:>16.2f}{sample_peak:>12.1f}"
+
+        if n_rows <= FULL_STRATEGY_MAX_ROWS:
+            full, full_time, full_peak = timed_fit(data, row_strategy='full')
+            ari = adjusted_rand_score(full._row_clusters, sampled._row_clusters)
+            line += f"{full_time:>14.2f}{full_peak:>12.1f}{ari:>7.2f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [5000, 10000, 100000, 1000000])
@@ -0,0 +1,51 @@
+"""
+Runtime and quality of the seriation methods
+
+Usage: python benchmarks/bench_seriation.py [n_rows ...]
+
+Orders the rows of the OptimizedDualSimilarityMatrix with every
+seriation.SERIATION_METHODS entry, from the same condensed similarities
+(their computation is not timed; the linkage is, for the methods built on
+it). Quality is the mean similarity of adjacent rows (higher is better) and
+the anti-Robinson event rate within 20 positions (lower is better); a random
+permutation is given as the baseline.
+"""
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from datasets import load_scaled
+from seriation import SERIATION_METHODS, adjacent_similarity, anti_robinson_score, seriate
+from similarity_matrix_mixed_clustering import OptimizedDualSimilarityMatrix
+
+# Largest size on which the optimal leaf ordering is run
+OPTIMAL_MAX_ROWS = 2000
+
+
+def main(sizes):
+    warnings.simplefilter('ignore', RuntimeWarning)
+    # Compile the numba kernels outside of the timings
+    warm_up = OptimizedDualSimilarityMatrix(load_scaled('health_metrics', 50))._condensed_similarities()[0]
+    for method in SERIATION_METHODS:
+        anti_robinson_score(warm_up, seriate(warm_up, method))
+
+    print(f"{'rows':>7}{'method':>10}{'time (s)':>10}{'adjacent':>10}{'anti-Robinson':>15}")
+    for n_rows in sizes:
+        similarity = OptimizedDualSimilarityMatrix(load_scaled('health_metrics', n_rows))._condensed_similarities()[0]
+        order = np.random.default_rng(0).permutation(n_rows)
+        print(f"{n_rows:>7}{'random':>10}{'':>10}{adjacent_similarity(similarity, order):>10.4f}"
+              f"{anti_robinson_score(similarity, order):>15.4f}")
+        for method in SERIATION_METHODS:
+            if method == 'optimal' and n_rows > OPTIMAL_MAX_ROWS:
+                continue
+            start = time.perf_counter()
+            order = seriate(similarity, method)
+            elapsed = time.perf_counter() - start
+            print(f"{n_rows:>7}{method:>10}{elapsed:>10.2f}{adjacent_similarity(similarity, order):>10.4f}"
+                  f"{anti_robinson_score(similarity, order):>15.4f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 2000, 5000, 10000])
@@ -0,0 +1,131 @@
+"""
+Orderings and timing of MixedTypeBiclustering.sort_blocks_globally
+
+Usage: python benchmarks/bench_sort_blocks.py [n_rows ...]
+
+Compares the vectorized accumulation against the previous implementation,
+kept below verbatim with its per-pair Python loops: both must produce the
+same row and column orderings.
+"""
+import sys
+import time
+import warnings
+
+import numpy as np
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import pdist, squareform
+
+from datasets import load_scaled
+from biclustering import MixedTypeBiclustering
+
+# Largest size on which the per-pair loops are run
+LEGACY_MAX_ROWS = 5000
+
+
+def legacy_orderings(blocks):
+    # Create global indices
+    all_rows = list(set().union(*(block.index for block in blocks.values())))
+    all_cols = list(set().union(*(block.columns for block in blocks.values())))
+    
+    # Initialize distance matrices with zeros
+    n_rows = len(all_rows)
+    n_cols = len(all_cols)
+    row_dist_matrix = np.zeros((n_rows, n_rows))
+    col_dist_matrix = np.zeros((n_cols, n_cols))
+    
+    # Create row and column index mappings for faster lookup
+    row_to_idx = {row: idx for idx, row in enumerate(all_rows)}
+    col_to_idx = {col: idx for idx, col in enumerate(all_cols)}
+    
+    # Process blocks more efficiently
+    for (row_cluster, col_cluster, block_id, dtype), block in blocks.items():
+        if dtype == 'numerical':
+            # Process numerical blocks
+            block_values = block.values
+            
+            # Update row distances using vectorized operations
+            if block_values.shape[1] > 0:  # Only if block has columns
+                block_row_dists = pdist(block_values)
+                block_row_indices = [row_to_idx[idx] for idx in block.index]
+                
+                # Convert condensed distance matrix to square form
+                block_row_dists_square = squareform(block_row_dists)
+                
+                # Update global distance matrix for these indices
+                for i, row_i in enumerate(block_row_indices):
+                    for j, row_j in enumerate(block_row_indices):
+                        if i < j:
+                            row_dist_matrix[row_i, row_j] += block_row_dists_square[i, j]
+                            row_dist_matrix[row_j, row_i] += block_row_dists_square[i, j]
+            
+            # Update column distances using correlation
+            if block_values.shape[0] > 1:  # Need at least 2 rows for correlation
+                corr = np.corrcoef(block_values.T)
+                corr = np.nan_to_num(corr, nan=0.0)  # Handle NaN values
+                block_col_indices = [col_to_idx[col] for col in block.columns]
+                
+                # Update global distance matrix for columns
+                for i, col_i in enumerate(block_col_indices):
+                    for j, col_j in enumerate(block_col_indices):
+                        if i < j:
+                            dist = 1 - abs(corr[i, j])
+                            col_dist_matrix[col_i, col_j] += dist
+                            col_dist_matrix[col_j, col_i] += dist
+                
+        else:  # categorical
+            # Process categorical blocks more efficiently
+            block_values = block.values
+            block_row_indices = [row_to_idx[idx] for idx in block.index]
+            block_col_indices = [col_to_idx[col] for col in block.columns]
+            
+            # Update row distances using vectorized operations
+            for i, row_i in enumerate(block_row_indices):
+                mismatches = (block_values[i:i+1] != block_values).sum(axis=1)
+                for j, row_j in enumerate(block_row_indices[i+1:], i+1):
+                    row_dist_matrix[row_i, row_j] += mismatches[j]
+                    row_dist_matrix[row_j, row_i] += mismatches[j]
+            
+            # Update column distances using vectorized operations
+            if block_values.shape[0] > 0:  # Only if block has rows
+                for i, col_i in enumerate(block_col_indices):
+                    col1_values = block_values[:, i]
+                    for j, col_j in enumerate(block_col_indices[i+1:], i+1):
+                        col2_values = block_values[:, j]
+                        # Compare distributions using numpy operations
+                        unique_vals = np.unique(np.concatenate([col1_values, col2_values]))
+                        dist1 = np.array([(col1_values == val).sum() for val in unique_vals]) / len(col1_values)
+                        dist2 = np.array([(col2_values == val).sum() for val in unique_vals]) / len(col2_values)
+                        dist = np.sum(np.abs(dist1 - dist2))
+                        col_dist_matrix[col_i, col_j] += dist
+                        col_dist_matrix[col_j, col_i] += dist
+    
+    # Get optimal orderings using condensed distance matrices
+    row_order = leaves_list(linkage(squareform(row_dist_matrix), method='ward'))
+    col_order = leaves_list(linkage(squareform(col_dist_matrix), method='ward'))
+    
+    return [all_rows[i] for i in row_order], [all_cols[i] for i in col_order]
+
+
+def main(sizes):
+    warnings.simplefilter('ignore', RuntimeWarning)
+    print(f"{'rows':>9}{'vectorized (s)':>16}{'loops (s)':>11}{'speedup':>9}{'identical':>11}")
+    for n_rows in sizes:
+        data = load_scaled('health_metrics', n_rows)
+        model = MixedTypeBiclustering(n_row_clusters=5, n_col_clusters=5, row_strategy='sample').fit(data)
+        blocks = model.separate_mixed_type_blocks(data)
+
+        start = time.perf_counter()
+        orderings = model._global_orderings(blocks)
+        vectorized_time = time.perf_counter() - start
+        line = f"{n_rows:>9}{vectorized_time:>16.2f}"
+
+        if n_rows <= LEGACY_MAX_ROWS:
+            start = time.perf_counter()
+            legacy = legacy_orderings(blocks)
+            legacy_time = time.perf_counter() - start
+            line += f"{legacy_time:>11.2f}{legacy_time / vectorized_time:>9.1f}{str(orderings == legacy):>11}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 2000, 5000, 10000])
@@ -0,0 +1,84 @@
+"""
+Cold start of a web worker: import time and first-request latency
+
+Usage: python benchmarks/bench_startup.py [repeats]
+
+Imports app in fresh interpreters under ``python -X importtime`` (with
+WARM_UP=0, so that only the imports are measured) and reports the median
+total and the modules with the largest cumulative import times, and whether
+the plotting libraries were loaded. Then times, in fresh processes, the
+first /get_vsm request of a small upload without and after
+prewarm.warm_up(), and the warm-up itself. numba's on-disk cache is
+populated by a first run beforehand, as it is on a deployed server.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from datasets import REPO_ROOT
+
+TOP_MODULES = 10
+PLOTTING_MODULES = ('matplotlib', 'seaborn')
+
+FIRST_REQUEST = """
+import io, json, sys, time, warnings
+warnings.simplefilter('ignore')
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+import prewarm
+warm_up = prewarm.warm_up() if sys.argv[1] == '1' else 0.0
+from datasets import synthetic_mixed
+upload = synthetic_mixed(500)[0].to_csv(index=False).encode()
+start = time.perf_counter()
+response = app.app.test_client().post('/get_vsm', data={'file': (io.BytesIO(upload), 'data.csv'), 'resolution': '64'},
+                                      content_type='multipart/form-data')
+assert response.status_code == 200, response.data
+print(json.dumps({'import': imported, 'warm_up': warm_up, 'first_request': time.perf_counter() - start}))
+"""
+
+
+def import_times() -> dict:
+    """Cumulative import time in seconds of every module imported by ``import app``"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=REPO_ROOT,
+                               env={**os.environ, 'WARM_UP': '0'}, capture_output=True, text=True, check=True)
+    times = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def first_request(warm_up: bool) -> dict:
+    completed = subprocess.run([sys.executable, '-c', FIRST_REQUEST, '1' if warm_up else '0'], cwd=REPO_ROOT,
+                               env={**os.environ, 'WARM_UP': '0',
+                                    'PYTHONPATH': os.pathsep.join([REPO_ROOT, os.path.dirname(__file__)])},
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(repeats: int):
+    runs = [import_times() for _ in range(repeats)]
+    print(f"import app: {statistics.median(run['app'] for run in runs):.2f} s (median of {repeats})")
+    loaded = [name for name in PLOTTING_MODULES if name in runs[-1]]
+    print(f"plotting modules loaded: {', '.join(loaded) or 'none'}")
+    print(f"{'module':>40}{'cumulative (s)':>16}")
+    for name, seconds in sorted(runs[-1].items(), key=lambda item: -item[1])[1:TOP_MODULES + 1]:
+        print(f"{name:>40}{seconds:>16.3f}")
+
+    # Populates numba's cache for the argument types of the request paths
+    first_request(warm_up=True)
+    print(f"{'':>12}{'import (s)':>12}{'warm-up (s)':>13}{'first request (s)':>19}")
+    for warm_up in (False, True):
+        timing = first_request(warm_up)
+        print(f"{'warmed' if warm_up else 'cold':>12}{timing['import']:>12.2f}{timing['warm_up']:>13.2f}"
+              f"{timing['first_request']:>19.2f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if sys.argv[1:] else 5)
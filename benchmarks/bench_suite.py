@@ -0,0 +1,222 @@
+"""
+Time, memory and cluster recovery of the clustering classes on synthetic data
+
+Usage: python benchmarks/bench_suite.py [--tiers 1000 10000 100000] [--cases NAME ...]
+                                        [--output results.json] [--baseline results.json]
+
+Every case runs on a CSV from datasets.synthetic_csv() with planted
+biclusters (see --n-cols, --cardinality, --missing-rate), in a process of its
+own so that its peak RSS is its own. The numba kernels are compiled (or
+loaded from their cache) on a small frame before the measurement, which
+covers parsing the CSV and the run itself; memory is the growth of the peak
+RSS over that warm-up. Stage times come from the instrumentation module, and
+the adjusted Rand index of the row and column clusters against the planted
+ones is reported for the biclustering cases.
+
+Cases stop at the largest tier they can handle on a single machine (the
+O(n^2) ones at 10k rows); cases whose optional dependencies are missing are
+skipped. --output writes the results as JSON, and --baseline compares them
+with an earlier file: a case slower or larger than the baseline by more than
+--tolerance, or recovering the planted clusters worse by more than
+ARI_TOLERANCE, is reported and makes the exit status 1.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+from datasets import REPO_ROOT, synthetic_csv, synthetic_mixed
+
+TIERS = (1000, 10000, 100000)
+N_ROW_CLUSTERS = 3
+N_COL_CLUSTERS = 3
+WARM_UP_ROWS = 200
+ARI_TOLERANCE = 0.1
+
+
+def _biclustering(data, layout=False, **kwargs):
+    from biclustering import MixedTypeBiclustering
+    model = MixedTypeBiclustering(n_row_clusters=N_ROW_CLUSTERS, n_col_clusters=N_COL_CLUSTERS, **kwargs).fit(data)
+    if layout:
+        # What /get_clusters answers in the 'indices' mode
+        model.sorted_block_layout(data)
+    else:
+        model.sort_blocks_globally(model.separate_mixed_type_blocks(data))
+    return model._row_clusters, model._col_clusters
+
+
+def _comprehensive(data):
+    from enhanced_biclustering import ComprehensiveMixedBiclustering
+    model = ComprehensiveMixedBiclustering(n_row_clusters=N_ROW_CLUSTERS, n_col_clusters=N_COL_CLUSTERS).fit(data)
+    model.sort_blocks_globally(model.separate_mixed_type_blocks(data))
+    return model._row_clusters, model._col_clusters
+
+
+def _dual_similarity(data):
+    from similarity_matrix_mixed_clustering import OptimizedDualSimilarityMatrix
+    # What /get_vsm computes for a large dataset: both orders and the coarse overview levels
+    vsm = OptimizedDualSimilarityMatrix(data, dtype=np.float32)
+    for axis in ('rows', 'columns'):
+        vsm.coarsened_matrix(axis)
+    return None
+
+
+def _gower_similarity(data):
+    from similarityMatrix import SimilarityMatrix
+    SimilarityMatrix(data).reorderMatrix()
+    return None
+
+
+# Name -> (function of the data returning the row and column labels or None, largest tier)
+CASES = {
+    'biclustering': (_biclustering, 10000),
+    # As /get_clusters runs it: sampled linkage, then the hierarchical ordering around anchor rows
+    'biclustering_sample': (lambda data: _biclustering(data, layout=True, row_strategy='sample',
+                                                       ordering='hierarchical'), 100000),
+    'comprehensive': (_comprehensive, 10000),
+    'dual_similarity': (_dual_similarity, 10000),
+    'gower_similarity': (_gower_similarity, 1000),
+}
+
+
+def _peak_rss() -> int:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_case(case: str, csv_path: str, labels_path: str) -> dict:
+    """Measure one case on one CSV file, in the current process"""
+    import instrumentation
+    from ingestion import read_csv_chunked
+    from sklearn.metrics import adjusted_rand_score
+
+    warnings.simplefilter('ignore')
+    logging.getLogger(instrumentation.__name__).setLevel(logging.WARNING)
+    func, _ = CASES[case]
+    func(synthetic_mixed(WARM_UP_ROWS)[0])
+
+    instrumentation.configure(True)
+    base_rss = _peak_rss()
+    start = time.perf_counter()
+    labels = func(read_csv_chunked(csv_path).data)
+    elapsed = time.perf_counter() - start
+    result = {
+        'seconds': round(elapsed, 3),
+        'memory_mib': round((_peak_rss() - base_rss) / 2**20, 1),
+        'stages': {name: round(histogram.sum, 3) for name, histogram in
+                   sorted(instrumentation.registry.durations.items())},
+    }
+    if labels is not None:
+        planted = np.load(labels_path)
+        result['row_ari'] = round(adjusted_rand_score(planted['rows'], labels[0]), 3)
+        result['col_ari'] = round(adjusted_rand_score(planted['columns'], labels[1]), 3)
+    return result
+
+
+def measure(case: str, csv_path: str, labels_path: str) -> dict:
+    """Run a case in a child process; failures and missing dependencies are returned as 'error'"""
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', case, csv_path, labels_path],
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        return {'error': lines[-1] if lines else f'exit code {completed.returncode}'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def environment() -> dict:
+    """Machine and code version the results were recorded with"""
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True)
+    return {
+        'commit': commit.stdout.strip() or None,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def regressions(results: list, baseline: list, tolerance: float) -> list:
+    """Descriptions of the cases that got slower, larger or recover the planted clusters worse than the baseline"""
+    previous = {(entry['case'], entry['rows']): entry for entry in baseline if 'error' not in entry}
+    found = []
+    for entry in results:
+        before = previous.get((entry['case'], entry['rows']))
+        if before is None or 'error' in entry:
+            continue
+        name = f"{entry['case']} at {entry['rows']} rows"
+        for key, unit in (('seconds', 's'), ('memory_mib', 'MiB')):
+            # Differences below a tenth of a second or 10 MiB are noise
+            floor = 0.1 if key == 'seconds' else 10
+            if entry[key] > max(before[key] * (1 + tolerance), before[key] + floor):
+                found.append(f"{name}: {key} {before[key]}{unit} -> {entry[key]}{unit}")
+        for key in ('row_ari', 'col_ari'):
+            if key in before and key in entry and entry[key] < before[key] - ARI_TOLERANCE:
+                found.append(f"{name}: {key} {before[key]} -> {entry[key]}")
+    return found
+
+
+def main(args):
+    results = []
+    print(f"{'case':>20}{'rows':>8}{'time (s)':>10}{'memory (MiB)':>14}{'row ARI':>9}{'col ARI':>9}")
+    with tempfile.TemporaryDirectory(prefix='bench-') as directory:
+        for n_rows in args.tiers:
+            csv_path = os.path.join(directory, f'synthetic-{n_rows}.csv')
+            labels_path = os.path.join(directory, f'synthetic-{n_rows}.npz')
+            rows, columns = synthetic_csv(csv_path, n_rows, n_cols=args.n_cols, cardinality=args.cardinality,
+                                          missing_rate=args.missing_rate, n_row_clusters=N_ROW_CLUSTERS,
+                                          n_col_clusters=N_COL_CLUSTERS, seed=args.seed)
+            np.savez(labels_path, rows=rows, columns=columns)
+
+            for case in args.cases:
+                if n_rows > CASES[case][1]:
+                    continue
+                entry = {'case': case, 'rows': n_rows, **measure(case, csv_path, labels_path)}
+                results.append(entry)
+                if 'error' in entry:
+                    print(f"{case:>20}{n_rows:>8}  skipped: {entry['error']}")
+                    continue
+                print(f"{case:>20}{n_rows:>8}{entry['seconds']:>10.2f}{entry['memory_mib']:>14.1f}"
+                      f"{entry.get('row_ari', float('nan')):>9.3f}{entry.get('col_ari', float('nan')):>9.3f}")
+
+    if args.output:
+        generator = {'n_cols': args.n_cols, 'cardinality': args.cardinality, 'missing_rate': args.missing_rate,
+                     'seed': args.seed}
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'generator': generator, 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f)['results'], args.tolerance)
+        for description in found:
+            print(f"Regression: {description}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        print(json.dumps(run_case(*sys.argv[2:5])))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tiers', type=int, nargs='+', default=list(TIERS), help='Row counts')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--n-cols', type=int, default=20)
+    parser.add_argument('--cardinality', type=int, default=5, help='Categories per categorical column')
+    parser.add_argument('--missing-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Relative growth of time or memory over the baseline reported as a regression')
+    main(parser.parse_args())
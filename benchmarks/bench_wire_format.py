@@ -0,0 +1,75 @@
+"""
+Payload size and latency of the JSON and binary /get_clusters responses
+
+Usage: python benchmarks/bench_wire_format.py [n_rows ...]
+
+Fits each size once through the Flask test client, then reports for both
+response formats the payload size, the time to serialize and parse the
+blocks alone, and the end-to-end /recut_clusters latency (request,
+re-cutting and block sorting, serialization, parsing the body as the client
+would). Decoding uses the Python mirror of the browser decoder, so parse
+times are indicative only.
+"""
+import gzip
+import io
+import json
+import sys
+import time
+
+from datasets import load_scaled
+from app import app, block_key, cluster_blocks, model_cache
+from wire_format import BLOCKS_MIME, decode_blocks, encode_blocks
+
+REPEATS = 3
+
+
+def best_time(func):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def json_round_trip(blocks):
+    payload = json.dumps({'blocks': {block_key(key): {'data': block.values.tolist(),
+                                                      'columns': block.columns.tolist()}
+                                     for key, block in blocks.items()}}).encode()
+    json.loads(payload)
+    return payload
+
+
+def binary_round_trip(blocks):
+    payload = encode_blocks(blocks)
+    decode_blocks(payload)
+    return payload
+
+
+def main(sizes):
+    client = app.test_client()
+    print(f"{'rows':>9}{'format':>8}{'size (MiB)':>12}{'gzip (MiB)':>12}{'serialize+parse (s)':>21}"
+          f"{'end-to-end (s)':>16}")
+    for n_rows in sizes:
+        csv = load_scaled('health_metrics', n_rows).to_csv(index=False).encode()
+        fitted = client.post('/get_clusters', data={'file': (io.BytesIO(csv), 'data.csv'), 'rowStrategy': 'sample'})
+        dataset_key = fitted.get_json()['dataset_key']
+        blocks = cluster_blocks(model_cache.get((dataset_key, 'sample')), 5, 5)
+
+        for name, accept, round_trip, decode in [('json', 'application/json', json_round_trip, json.loads),
+                                                 ('binary', BLOCKS_MIME, binary_round_trip, decode_blocks)]:
+            payload, serialize_time = best_time(lambda: round_trip(blocks))
+
+            start = time.perf_counter()
+            response = client.post('/recut_clusters', json={'datasetKey': dataset_key, 'rowStrategy': 'sample',
+                                                            'rowClusters': 5, 'colClusters': 5},
+                                   headers={'Accept': accept})
+            decode(response.data)
+            latency = time.perf_counter() - start
+
+            print(f"{n_rows:>9}{name:>8}{len(payload) / 2**20:>12.2f}{len(gzip.compress(payload)) / 2**20:>12.2f}"
+                  f"{serialize_time:>21.3f}{latency:>16.2f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [2000, 10000])
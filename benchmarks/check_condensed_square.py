@@ -0,0 +1,47 @@
+"""
+Regression check: square_from_condensed() and condensed_from_square() agree with scipy's squareform
+
+Usage: python benchmarks/check_condensed_square.py
+
+For sizes from a single item (an empty condensed vector) up to several row
+blocks, in float64 and float32, with and without a permutation and with a
+preallocated output, the square built from a condensed vector must equal
+squareform() with the diagonal set and the permutation applied, and
+condensed_from_square() must give the condensed vector back.
+"""
+import os
+import sys
+
+import numpy as np
+from scipy.spatial.distance import squareform
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mixed_distance import condensed_from_square, square_from_condensed
+
+SIZES = (1, 2, 3, 64, 65, 200)
+DIAGONAL = 1.0
+
+
+def check(n: int, dtype: type, rng: np.random.Generator):
+    condensed = rng.random(n * (n - 1) // 2).astype(dtype)
+    expected = squareform(condensed, checks=False).astype(dtype)
+    np.fill_diagonal(expected, DIAGONAL)
+    order = rng.permutation(n)
+
+    square = square_from_condensed(condensed, diagonal=DIAGONAL)
+    assert square.shape == (n, n) and square.dtype == dtype, f"n={n}: {square.shape} {square.dtype}"
+    assert np.array_equal(square, expected), f"n={n} {np.dtype(dtype).name}: square differs from squareform"
+    assert np.array_equal(square_from_condensed(condensed, order, diagonal=DIAGONAL), expected[np.ix_(order, order)]), \
+        f"n={n} {np.dtype(dtype).name}: reordered square differs"
+    out = np.empty((n, n), dtype=dtype)
+    assert square_from_condensed(condensed, diagonal=DIAGONAL, out=out) is out and np.array_equal(out, expected), \
+        f"n={n} {np.dtype(dtype).name}: preallocated output differs"
+    assert np.array_equal(condensed_from_square(square), condensed), f"n={n}: round trip differs"
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    for dtype in (np.float64, np.float32):
+        for n in SIZES:
+            check(n, dtype, rng)
+    print(f"square_from_condensed matches squareform for n in {SIZES}, float64 and float32")
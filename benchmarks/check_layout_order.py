@@ -0,0 +1,49 @@
+"""
+Regression check: the 'indices' and 'blocks' modes of /get_clusters order rows and columns alike
+
+Usage: python benchmarks/check_layout_order.py [n_rows]
+
+For every ordering and row strategy, cuts a fitted MixedTypeBiclustering and
+compares each block of sort_blocks_globally() with the same block cut out of
+the data through sorted_block_layout(): the rows and the columns must come
+in the same order. Runs on resampled health_metrics and on synthetic data
+with missing values.
+"""
+import sys
+import warnings
+
+from datasets import load_scaled, synthetic_mixed
+from biclustering import ORDERINGS, ROW_STRATEGIES, MixedTypeBiclustering
+
+
+def layout_blocks(layout, data):
+    """Blocks cut out of the data through a block layout, by block key"""
+    row_order, row_offsets = layout['row_order'], layout['row_offsets']
+    col_order, col_offsets = layout['col_order'], layout['col_offsets']
+    return {
+        key: data.iloc[row_order[row_offsets[i]:row_offsets[i + 1]], col_order[col_offsets[j]:col_offsets[j + 1]]]
+        for key, i, j in layout['blocks']
+    }
+
+
+def check(name, data, n_rows):
+    for ordering in ORDERINGS:
+        for row_strategy in ROW_STRATEGIES:
+            # A sample smaller than the data, so that large clusters are ordered around anchors
+            model = MixedTypeBiclustering(n_row_clusters=4, n_col_clusters=3, ordering=ordering,
+                                          row_strategy=row_strategy, sample_size=n_rows // 4).fit(data)
+            sorted_blocks = model.sort_blocks_globally(model.separate_mixed_type_blocks(data))
+            cut_blocks = layout_blocks(model.sorted_block_layout(data), data)
+
+            assert list(sorted_blocks) == list(cut_blocks), f"{name}: block keys differ"
+            for key, block in sorted_blocks.items():
+                assert block.index.equals(cut_blocks[key].index), f"{name} {ordering}/{row_strategy}: rows of {key}"
+                assert block.columns.equals(cut_blocks[key].columns), f"{name} {ordering}/{row_strategy}: columns of {key}"
+            print(f"{name}: {ordering}/{row_strategy} orders {len(sorted_blocks)} blocks alike")
+
+
+if __name__ == '__main__':
+    warnings.simplefilter('ignore', RuntimeWarning)
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    check('health_metrics', load_scaled('health_metrics', n_rows), n_rows)
+    check('synthetic', synthetic_mixed(n_rows, missing_rate=0.05)[0], n_rows)
@@ -0,0 +1,68 @@
+"""
+Regression check: cached models hold a fixed set of scratch files, deleted on eviction
+
+Usage: python benchmarks/check_scratch_eviction.py [n_rows]
+
+Runs the app with a scratch directory. Repeated /get_vsm requests on one
+upload, answered from the cached instance, must not add scratch files. Then,
+with a model cache that holds one instance but not two, the VSM of several
+resampled health_metrics uploads is requested in turn. Every request must
+succeed, each one evicts the previous instance, and the scratch directory
+must only hold the files of the instance still cached. A /get_clusters
+request evicting that instance must succeed as well.
+"""
+import io
+import os
+import sys
+import tempfile
+import warnings
+
+from datasets import load_scaled
+
+N_UPLOADS = 3
+REPEATS = 3
+
+
+def upload(n_rows: int, seed: int) -> dict:
+    csv = load_scaled('health_metrics', n_rows, seed=seed).to_csv(index=False).encode()
+    return {'file': (io.BytesIO(csv), f'upload-{seed}.csv')}
+
+
+def main(n_rows: int):
+    warnings.simplefilter('ignore')
+    with tempfile.TemporaryDirectory(prefix='scratch-check-') as directory:
+        os.environ.update({'DISTANCE_SCRATCH_DIR': directory, 'WARM_UP': '0'})
+        import app
+        client = app.app.test_client()
+
+        counts = []
+        for _ in range(REPEATS):
+            response = client.post('/get_vsm', data=upload(n_rows, 0), content_type='multipart/form-data')
+            assert response.status_code == 200, response.get_json()
+            counts.append(len(os.listdir(directory)))
+        assert len(set(counts)) == 1, f"scratch files grew over repeated requests: {counts}"
+        print(f"{REPEATS} requests on one upload: {counts[0]} scratch files throughout")
+
+        for seed in range(N_UPLOADS):
+            response = client.post('/get_vsm', data=upload(n_rows, seed), content_type='multipart/form-data')
+            assert response.status_code == 200, response.get_json()
+            if seed == 0:
+                # Room for one instance: every later upload evicts the previous one
+                app.model_cache.max_bytes = int(app.model_cache.total_bytes * 1.5)
+            assert len(app.model_cache) == 1, f"{len(app.model_cache)} entries cached"
+            (entry,) = app.model_cache._entries.values()
+            kept = {os.path.basename(array.filename) for array in entry['vsm']._scratch}
+            files = set(os.listdir(directory))
+            assert files == kept, f"upload {seed}: {len(files)} scratch files, {len(kept)} held by the cached VSM"
+            print(f"upload {seed}: 200, {len(files)} scratch files, all held by the cached VSM")
+
+        response = client.post('/get_clusters', data={**upload(n_rows, N_UPLOADS), 'mode': 'indices'},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_json()
+        remaining = os.listdir(directory)
+        assert not remaining, f"{len(remaining)} scratch files left after evicting the VSM"
+        print("get_clusters: 200, the evicted VSM's scratch files are deleted")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
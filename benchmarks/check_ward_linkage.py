@@ -0,0 +1,68 @@
+"""
+Regression check and timing for the Ward linkage input of MixedTypeBiclustering.fit
+
+Usage: python benchmarks/check_ward_linkage.py [n_rows ...]
+
+1. On Data/health_metrics.csv, fit() must produce the same partition as Ward
+   run on the explicit Euclidean embedding of the mixed metric, and the same
+   cluster sizes as recorded below.
+2. The previous input (the square matrix, which scipy reads as n observations
+   with n features and re-embeds in O(n^3)) is timed against the condensed
+   vector on resampled data.
+"""
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+
+from datasets import DATASETS, load_scaled
+from biclustering import MixedTypeBiclustering
+from mixed_distance import MixedDistanceEngine
+
+EXPECTED_ROW_CLUSTER_SIZES = [201, 123, 78, 23, 75]
+
+
+def same_partition(a: np.ndarray, b: np.ndarray) -> bool:
+    pairs = set(zip(a, b))
+    return len(pairs) == len(set(a)) == len(set(b))
+
+
+def check_health_metrics():
+    data = pd.read_csv(DATASETS['health_metrics'])
+    model = MixedTypeBiclustering(n_row_clusters=5, n_col_clusters=5).fit(data)
+
+    engine = MixedDistanceEngine.from_table(model._preprocess_data(data))
+    embedded = fcluster(linkage(engine.embedding(), method='ward'), t=5, criterion='maxclust')
+
+    sizes = np.bincount(model._row_clusters)[1:].tolist()
+    assert same_partition(model._row_clusters, embedded), "fit() differs from Ward on the embedding"
+    assert sizes == EXPECTED_ROW_CLUSTER_SIZES, f"row cluster sizes changed: {sizes}"
+    print(f"health_metrics: partition matches Ward on the embedding, sizes {sizes}")
+
+
+def time_linkage_inputs(sizes):
+    model = MixedTypeBiclustering()
+    print(f"{'rows':>8}{'square input (s)':>18}{'condensed input (s)':>21}")
+    for n_rows in sizes:
+        distances = model._mixed_distance(model._preprocess_data(load_scaled('health_metrics', n_rows)))
+
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            # scipy rightly warns that the square looks like a distance matrix
+            warnings.simplefilter('ignore')
+            linkage(squareform(distances), method='ward')
+        square_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        linkage(distances, method='ward')
+        condensed_time = time.perf_counter() - start
+        print(f"{n_rows:>8}{square_time:>18.2f}{condensed_time:>21.2f}")
+
+
+if __name__ == '__main__':
+    check_health_metrics()
+    time_linkage_inputs([int(arg) for arg in sys.argv[1:]] or [1000, 2000, 4000])
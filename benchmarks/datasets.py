@@ -0,0 +1,113 @@
+"""Helpers for loading the bundled Data/ files at benchmark scale and generating synthetic data"""
+import os
+import sys
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, 'Data')
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+DATASETS = {
+    'health_metrics': os.path.join(DATA_DIR, 'health_metrics.csv'),
+    'wdbc': os.path.join(DATA_DIR, 'breast+cancer+wisconsin+diagnostic', 'wdbc_withHeaders.csv'),
+}
+
+
+def load_scaled(name: str, n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Load a bundled dataset and resample it to ``n_rows`` rows
+
+    Numeric columns get a small multiplicative jitter so that resampled rows
+    are not exact duplicates of each other.
+
+    Parameters:
+    -----------
+    name : str
+        Key into DATASETS
+    n_rows : int
+        Number of rows of the returned frame
+    seed : int, default 0
+        Random seed
+
+    Returns:
+    --------
+    pd.DataFrame
+    """
+    data = pd.read_csv(DATASETS[name])
+    rng = np.random.default_rng(seed)
+    scaled = data.iloc[rng.integers(0, len(data), size=n_rows)].reset_index(drop=True)
+
+    numeric_cols = scaled.select_dtypes(include=[np.number]).columns
+    jitter = 1 + 0.01 * rng.standard_normal((n_rows, len(numeric_cols)))
+    scaled[numeric_cols] = scaled[numeric_cols].to_numpy(dtype=float) * jitter
+    return scaled
+
+
+def synthetic_mixed(n_rows: int, n_cols: int = 20, numeric_fraction: float = 0.5, cardinality: int = 5,
+                    missing_rate: float = 0.05, n_row_clusters: int = 3, n_col_clusters: int = 3,
+                    signal: float = 0.7, seed: int = 0) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Mixed numeric/categorical data with planted biclusters
+
+    Rows and columns are assigned to clusters uniformly at random. In the
+    block of row cluster r and column cluster c, numeric values are drawn
+    around a mean of that block (standard deviation 1, block means 3 apart
+    on average) and categorical values are the block's dominant category
+    with probability ``signal``, any category otherwise. Values are then
+    removed completely at random at ``missing_rate``.
+
+    Parameters:
+    -----------
+    n_rows : int
+        Number of rows
+    n_cols : int, default 20
+        Number of columns
+    numeric_fraction : float, default 0.5
+        Share of numeric columns
+    cardinality : int, default 5
+        Categories per categorical column, labelled 'k0', 'k1', ...
+    missing_rate : float, default 0.05
+        Share of missing cells
+    n_row_clusters, n_col_clusters : int, default 3
+        Number of planted row and column clusters
+    signal : float, default 0.7
+        Probability of a categorical cell taking its block's dominant category
+    seed : int, default 0
+        Random seed
+
+    Returns:
+    --------
+    Tuple of (the data, planted row cluster labels, planted column cluster labels)
+    """
+    rng = np.random.default_rng(seed)
+    row_labels = rng.integers(0, n_row_clusters, size=n_rows)
+    col_labels = rng.integers(0, n_col_clusters, size=n_cols)
+    numeric = np.zeros(n_cols, dtype=bool)
+    numeric[rng.permutation(n_cols)[:round(numeric_fraction * n_cols)]] = True
+
+    means = rng.normal(0, 3, size=(n_row_clusters, n_col_clusters))
+    dominant = rng.integers(0, cardinality, size=(n_row_clusters, n_col_clusters))
+    columns = {}
+    for j in range(n_cols):
+        block = (row_labels, col_labels[j])
+        if numeric[j]:
+            values = means[block] + rng.standard_normal(n_rows)
+        else:
+            codes = np.where(rng.random(n_rows) < signal, dominant[block], rng.integers(0, cardinality, size=n_rows))
+            values = np.array([f'k{k}' for k in range(cardinality)], dtype=object)[codes]
+        if missing_rate > 0:
+            values = pd.Series(values).mask(rng.random(n_rows) < missing_rate).to_numpy()
+        columns[f"{'num' if numeric[j] else 'cat'}_{j}"] = values
+    return pd.DataFrame(columns), row_labels, col_labels
+
+
+def synthetic_csv(path: str, n_rows: int, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
+    """Write synthetic_mixed() data to a CSV file and return its planted row and column labels"""
+    data, row_labels, col_labels = synthetic_mixed(n_rows, **kwargs)
+    data.to_csv(path, index=False)
+    return row_labels, col_labels
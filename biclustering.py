@@ -1,18 +1,36 @@
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from scipy.spatial.distance import pdist, squareform
+from typing import List, Dict, Any, Optional, Union
+from scipy import sparse
+from scipy.spatial.distance import cdist, pdist, squareform
 from scipy.cluster.hierarchy import linkage, fcluster, leaves_list
-import matplotlib.pyplot as plt
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from column_similarity import COLUMN_METRICS, condensed_column_distances
+from encoded_table import EncodedTable, encode_table
+from instrumentation import instrumented, stage
+from mixed_distance import (MixedDistanceEngine, condensed_from_square, condensed_mixed_distance,
+                            concurrent_kernels_supported, nan_euclidean_square, nearest_prototypes)
+from scratch import release_scratch, scratch_array
 # import seaborn as sns
 
+ROW_STRATEGIES = ('full', 'sample')
+ORDERINGS = ('global', 'hierarchical')
+
 class MixedTypeBiclustering:
     def __init__(self, 
                  n_row_clusters: int = 3, 
                  n_col_clusters: int = 3, 
-                 distance_metric: str = 'mixed'):
+                 distance_metric: str = 'mixed',
+                 dtype: type = np.float64,
+                 row_strategy: str = 'full',
+                 sample_size: int = 2000,
+                 chunk_size: int = 65536,
+                 random_state: Optional[int] = 0,
+                 ordering: str = 'global',
+                 n_jobs: int = 1,
+                 scratch_dir: Optional[str] = None,
+                 column_metric: str = 'association'):
         """
         Initialize the Mixed-Type Biclustering algorithm
         
@@ -24,48 +42,90 @@ class MixedTypeBiclustering:
             Number of column clusters to create
         distance_metric : str, default 'mixed'
             Distance metric to use for clustering
+        dtype : type, default np.float64
+            Dtype of the condensed distance vectors, np.float32 halves their size
+        row_strategy : str, default 'full'
+            'full' runs Ward linkage over all rows (O(n^2) memory). 'sample'
+            runs it over a stratified sample of ``sample_size`` rows and assigns
+            every other row to the nearest cluster prototype, which is linear
+            in the number of rows
+        sample_size : int, default 2000
+            Number of rows clustered when row_strategy='sample'
+        chunk_size : int, default 65536
+            Number of rows assigned per step when row_strategy='sample'
+        random_state : int, optional, default 0
+            Seed for the row sample
+        ordering : str, default 'global'
+            How sort_blocks_globally() orders rows. 'global' runs one Ward
+            linkage over an n x n row matrix. 'hierarchical' orders the rows of
+            each row cluster separately and the clusters by centroid distance,
+            needing only one matrix per cluster. With row_strategy='sample'
+            that matrix covers at most ``sample_size`` rows of a cluster
+        n_jobs : int, default 1
+            Number of threads. Above 1, fit() computes the row and the column
+            linkage concurrently, and ordering='hierarchical' orders that many
+            row clusters at a time
+        scratch_dir : str, optional
+            Directory for memory-mapped distance matrices. When given, the
+            condensed distances of fit() and the square matrices of
+            sort_blocks_globally() are written to files there tile by tile
+            instead of RAM, and deleted once their linkage is computed
+        column_metric : str, default 'association'
+            How columns are compared. 'association' clusters them on pairwise
+            statistics gathered in one pass over the rows (see
+            column_similarity.column_association); 'mixed_distance' treats
+            every column as one n_rows-long sample of the row distance
         """
+        if row_strategy not in ROW_STRATEGIES:
+            raise ValueError(f"Unknown row_strategy {row_strategy!r}, expected one of {ROW_STRATEGIES}")
+        if ordering not in ORDERINGS:
+            raise ValueError(f"Unknown ordering {ordering!r}, expected one of {ORDERINGS}")
+        if column_metric not in COLUMN_METRICS:
+            raise ValueError(f"Unknown column_metric {column_metric!r}, expected one of {COLUMN_METRICS}")
         self.n_row_clusters = n_row_clusters
         self.n_col_clusters = n_col_clusters
+        self.dtype = dtype
+        self.row_strategy = row_strategy
+        self.sample_size = sample_size
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+        self.ordering = ordering
+        self.n_jobs = n_jobs
+        self.scratch_dir = scratch_dir
+        self.column_metric = column_metric
         self._row_clusters = None
         self._col_clusters = None
         self._row_cluster_labels = None
         self._col_cluster_labels = None
+        self._row_clustering_result = None
         self._column_clustering_result = None
         
-    def _mixed_distance(self, X: np.ndarray) -> np.ndarray:
+    @instrumented('mixed_distance')
+    def _mixed_distance(self, X: Union[np.ndarray, EncodedTable], column_types: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Compute a custom distance matrix for mixed-type data
         
         Parameters:
         -----------
-        X : np.ndarray
-            Input data matrix
+        X : np.ndarray or EncodedTable
+            Input data matrix, or an encoded table carrying its own column types
+        column_types : np.ndarray, optional
+            Boolean mask, True for numeric columns. Numeric columns contribute
+            squared differences, the others contribute 0/1 mismatches.
+            All columns are treated as numeric when omitted.
         
         Returns:
         --------
         np.ndarray
-            Distance matrix
-        """
-        def mixed_pairwise_distance(x1: np.ndarray, x2: np.ndarray) -> float:
-            """
-            Compute distance between two data points with mixed types
-            """
-            distances = []
-            for i in range(len(x1)):
-                # Numeric type handling
-                if np.issubdtype(x1[i].dtype, np.number):
-                    distances.append((x1[i] - x2[i])**2)
-                # Categorical type handling
-                else:
-                    distances.append(0 if x1[i] == x2[i] else 1)
-            return np.sqrt(np.sum(distances))
-        
-        return squareform(pdist(X, metric=mixed_pairwise_distance))
+            Condensed distance vector
+        """
+        n = X.n_rows if isinstance(X, EncodedTable) else X.shape[0]
+        out = scratch_array(n * (n - 1) // 2, self.dtype, self.scratch_dir) if self.scratch_dir else None
+        return condensed_mixed_distance(X, column_types, dtype=self.dtype, out=out)
     
-    def _preprocess_data(self, data: pd.DataFrame) -> Dict[str, Any]:
+    def _preprocess_data(self, data: pd.DataFrame) -> EncodedTable:
         """
-        Preprocess the input data by separating and encoding different types
+        Standardize the numeric columns and label encode the categorical ones
         
         Parameters:
         -----------
@@ -74,74 +134,174 @@ class MixedTypeBiclustering:
         
         Returns:
         --------
-        Dict containing processed data and type information
-        """
-        # Identify column types
-        numeric_cols = data.select_dtypes(include=[np.number]).columns
-        categorical_cols = data.select_dtypes(include=['object', 'category']).columns
-        
-        # Prepare processed data
-        processed_data = data.copy()
-        type_encodings = {}
-        
-        # Handle numeric columns - standardize
-        if len(numeric_cols) > 0:
-            scaler = StandardScaler()
-            processed_data[numeric_cols] = scaler.fit_transform(processed_data[numeric_cols])
-        
-        # Handle categorical columns - label encode
-        for col in categorical_cols:
-            le = LabelEncoder()
-            processed_data[col] = le.fit_transform(processed_data[col].astype(str))
-            type_encodings[col] = {
-                'encoder': le,
-                'original_categories': le.classes_
-            }
-        
-        return {
-            'processed_data': processed_data,
-            'type_encodings': type_encodings,
-            'numeric_cols': list(numeric_cols),
-            'categorical_cols': list(categorical_cols)
-        }
+        EncodedTable
+            Shared with other models preprocessing the same data (see encode_table)
+        """
+        return encode_table(data)
     
-    def fit(self, data: pd.DataFrame):
+    def _stratified_sample(self, n_rows: int) -> np.ndarray:
         """
-        Perform biclustering on the input data
+        Draw one row from each of ``sample_size`` equal-width strata of the file
         
         Parameters:
         -----------
-        data : pd.DataFrame
-            Input data to cluster
-        """
-        # Preprocess the data
-        prep_data = self._preprocess_data(data)
-        processed_df = prep_data['processed_data']
+        n_rows : int
+            Number of rows in the data
         
-        # Compute distance matrices for rows and columns
-        row_dist_matrix = self._mixed_distance(processed_df.values)
-        col_dist_matrix = self._mixed_distance(processed_df.values.T)
+        Returns:
+        --------
+        np.ndarray
+            Sorted positional indices of the sampled rows
+        """
+        rng = np.random.default_rng(self.random_state)
+        bounds = np.linspace(0, n_rows, self.sample_size + 1).astype(np.int64)
+        return bounds[:-1] + (rng.random(self.sample_size) * np.diff(bounds)).astype(np.int64)
+    
+    def _assign_rows_to_prototypes(self, sample_clusters: np.ndarray) -> np.ndarray:
+        """
+        Assign every row outside the sample to the nearest prototype of the
+        sampled clusters, streaming the rows in chunks
         
-        # Perform hierarchical clustering on rows
-        row_linkage = linkage(row_dist_matrix, method='ward')
-        row_clusters = fcluster(row_linkage, t=self.n_row_clusters, criterion='maxclust')
+        Parameters:
+        -----------
+        sample_clusters : np.ndarray
+            Cluster labels of the sampled rows
         
-        # Perform hierarchical clustering on columns
-        col_linkage = linkage(col_dist_matrix, method='ward')
-        col_clusters = fcluster(col_linkage, t=self.n_col_clusters, criterion='maxclust')
+        Returns:
+        --------
+        np.ndarray
+            Cluster labels of all rows
+        """
+        sample = self._row_clustering_result['sample']
+        numeric = self._row_clustering_result['numeric']
+        categorical = self._row_clustering_result['categorical']
+        
+        # Prototypes: numeric means and categorical modes of each sampled cluster
+        cluster_ids = np.unique(sample_clusters)
+        centers = np.empty((len(cluster_ids), numeric.shape[1]))
+        modes = np.full((len(cluster_ids), categorical.shape[1]), -1, dtype=np.int64)
+        for i, cluster in enumerate(cluster_ids):
+            members = sample[sample_clusters == cluster]
+            centers[i] = np.nanmean(numeric[members], axis=0)
+            for k in range(categorical.shape[1]):
+                codes = categorical[members, k]
+                codes = codes[codes >= 0]
+                if len(codes) > 0:
+                    modes[i, k] = np.bincount(codes).argmax()
+        
+        row_clusters = cluster_ids[nearest_prototypes(numeric, categorical, centers, modes, self.chunk_size)]
+        row_clusters[sample] = sample_clusters
+        return row_clusters
+    
+    def _cut(self):
+        """Cut the stored row and column linkages at the current cluster counts"""
+        row_clusters = fcluster(self._row_clustering_result['linkage'], t=self.n_row_clusters, criterion='maxclust')
+        if self._row_clustering_result['sample'] is not None:
+            row_clusters = self._assign_rows_to_prototypes(row_clusters)
+        col_clusters = fcluster(self._column_clustering_result['linkage'], t=self.n_col_clusters, criterion='maxclust')
         
         # Store cluster information
         self._row_clusters = row_clusters
         self._col_clusters = col_clusters
         self._row_cluster_labels = row_clusters
         self._col_cluster_labels = col_clusters
+        self._row_clustering_result['clusters'] = row_clusters
+        self._column_clustering_result['clusters'] = col_clusters
+    
+    def _fit_rows(self, table: EncodedTable) -> np.ndarray:
+        """Ward linkage of the rows (or of a row sample); returns the condensed distances used"""
+        if self.row_strategy == 'sample' and table.n_rows > self.sample_size:
+            # Ward linkage over a row sample only; the other rows are assigned to
+            # prototypes at cut time, so the encoded blocks are kept for re-cuts
+            sample = self._stratified_sample(table.n_rows)
+            row_distances = self._mixed_distance(table.take(sample))
+            with stage('linkage'):
+                row_linkage = linkage(row_distances, method='ward')
+            self._row_clustering_result = {
+                'linkage': row_linkage,
+                'sample': sample,
+                'numeric': table.numeric,
+                'categorical': table.codes
+            }
+        else:
+            # Perform hierarchical clustering on rows. The mixed distance is Euclidean
+            # in a one-hot embedding (see MixedDistanceEngine.embedding), so Ward's
+            # update formula applied to the condensed vector is exact without missing values
+            row_distances = self._mixed_distance(table)
+            with stage('linkage'):
+                row_linkage = linkage(row_distances, method='ward')
+            self._row_clustering_result = {
+                'linkage': row_linkage,
+                'sample': None
+            }
+        return row_distances
+
+    def _fit_columns(self, table: EncodedTable) -> np.ndarray:
+        """Ward linkage of the columns; returns the condensed distances used"""
+        if self.column_metric == 'association':
+            col_distances = condensed_column_distances(table, dtype=self.dtype)
+        else:
+            col_distances = self._mixed_distance(table.matrix().T)
         
         # Store column clustering details for later analysis
-        self._column_clustering_result = {
-            'linkage': col_linkage,
-            'clusters': col_clusters
-        }
+        with stage('linkage'):
+            self._column_clustering_result = {
+                'linkage': linkage(col_distances, method='ward')
+            }
+        return col_distances
+    
+    @instrumented('fit')
+    def fit(self, data: pd.DataFrame):
+        """
+        Perform biclustering on the input data
+
+        With n_jobs > 1 the row and the column pipelines run on two threads:
+        the distance kernels and scipy's linkage release the GIL.
         
+        Parameters:
+        -----------
+        data : pd.DataFrame
+            Input data to cluster
+        """
+        # Preprocess the data
+        table = self._preprocess_data(data)
+        
+        if self.n_jobs > 1 and concurrent_kernels_supported():
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                columns = executor.submit(self._fit_columns, table)
+                row_distances = self._fit_rows(table)
+                col_distances = columns.result()
+        else:
+            row_distances = self._fit_rows(table)
+            col_distances = self._fit_columns(table)
+        release_scratch([row_distances, col_distances])
+        
+        self._cut()
+        return self
+    
+    def recut(self, n_row_clusters: Optional[int] = None, n_col_clusters: Optional[int] = None):
+        """
+        Change the number of clusters without re-fitting
+        
+        Only the stored linkages are cut again (plus a linear prototype
+        assignment with row_strategy='sample'), no distances are recomputed.
+        
+        Parameters:
+        -----------
+        n_row_clusters : int, optional
+            New number of row clusters, unchanged when omitted
+        n_col_clusters : int, optional
+            New number of column clusters, unchanged when omitted
+        """
+        if self._column_clustering_result is None:
+            raise ValueError("Must call fit() first")
+        
+        if n_row_clusters is not None:
+            self.n_row_clusters = n_row_clusters
+        if n_col_clusters is not None:
+            self.n_col_clusters = n_col_clusters
+        
+        self._cut()
         return self
     
     def get_column_clusters(self, original_data: pd.DataFrame) -> Dict[int, List[str]]:
@@ -183,6 +343,7 @@ class MixedTypeBiclustering:
         if self._column_clustering_result is None:
             raise ValueError("Must call fit() first")
         
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(10, 6))
         plt.title('Column Clustering Dendrogram')
         
@@ -237,6 +398,7 @@ class MixedTypeBiclustering:
         
         return blocks
     
+    @instrumented('separate_blocks')
     def separate_mixed_type_blocks(self, original_data: pd.DataFrame) -> Dict[tuple, pd.DataFrame]:
         """
         Separate mixed-type blocks into unique numerical and categorical blocks
@@ -285,9 +447,390 @@ class MixedTypeBiclustering:
                     categorical_block = block[categorical_cols]
                     separated_blocks[(row_cluster, col_cluster, block_counter, 'categorical')] = categorical_block
                     block_counter += 1
-        
+
         return separated_blocks
 
+    @instrumented('block_layout')
+    def block_layout(self,
+                     original_data: pd.DataFrame,
+                     row_order: Optional[np.ndarray] = None,
+                     col_order: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        Describe the separated blocks as permutations instead of copies
+
+        Rows are grouped by row cluster. Columns are grouped numerical first,
+        then categorical, each by column cluster, so that every block of
+        separate_mixed_type_blocks() is a rectangle of the reordered data.
+
+        Parameters:
+        -----------
+        original_data : pd.DataFrame
+            Original input data
+        row_order : np.ndarray, optional
+            Preferred order of the row positions within each cluster,
+            original order when omitted
+        col_order : np.ndarray, optional
+            Preferred order of the column positions within each segment,
+            original order when omitted
+
+        Returns:
+        --------
+        Dict with
+            'row_order': row positions grouped by cluster
+            'row_offsets': row_order[row_offsets[i]:row_offsets[i + 1]] are the rows of row_clusters[i]
+            'row_clusters': row cluster of every row segment
+            'col_order': column positions grouped by type and cluster
+            'col_offsets': boundaries of the column segments in col_order
+            'col_segments': (column cluster, block type) of every column segment
+            'n_numeric_columns': number of leading numerical columns in col_order
+            'blocks': (block key, row segment, column segment) per block, with the
+                      keys of separate_mixed_type_blocks()
+        """
+        if self._row_clusters is None or self._col_clusters is None:
+            raise ValueError("Must call fit() first")
+
+        n_rows, n_cols = original_data.shape
+        row_order = np.arange(n_rows) if row_order is None else np.asarray(row_order)
+        col_order = np.arange(n_cols) if col_order is None else np.asarray(col_order)
+
+        # Stable sort keeps the preferred order within each cluster
+        rows = row_order[np.argsort(self._row_clusters[row_order], kind='stable')]
+        row_clusters, row_offsets = np.unique(self._row_clusters[rows], return_index=True)
+        row_offsets = np.append(row_offsets, n_rows)
+
+        type_masks = (
+            ('numerical', original_data.columns.isin(original_data.select_dtypes(include=[np.number]).columns)),
+            ('categorical', original_data.columns.isin(original_data.select_dtypes(include=['object', 'category']).columns)),
+        )
+        unique_col_clusters = np.unique(self._col_clusters)
+        segments = []
+        col_segments = []
+        for block_type, mask in type_masks:
+            for col_cluster in unique_col_clusters:
+                segment = col_order[(self._col_clusters[col_order] == col_cluster) & mask[col_order]]
+                if len(segment) > 0:
+                    segments.append(segment)
+                    col_segments.append((col_cluster, block_type))
+        col_offsets = np.concatenate([[0], np.cumsum([len(segment) for segment in segments])]).astype(int)
+
+        # Same block numbering as separate_mixed_type_blocks()
+        segment_index = {segment: i for i, segment in enumerate(col_segments)}
+        blocks = []
+        for i, row_cluster in enumerate(row_clusters):
+            for col_cluster in unique_col_clusters:
+                for block_type in ('numerical', 'categorical'):
+                    j = segment_index.get((col_cluster, block_type))
+                    if j is not None:
+                        blocks.append(((row_cluster, col_cluster, len(blocks), block_type), i, j))
+
+        return {
+            'row_order': rows,
+            'row_offsets': row_offsets,
+            'row_clusters': row_clusters,
+            'col_order': np.concatenate(segments) if segments else np.array([], dtype=int),
+            'col_offsets': col_offsets,
+            'col_segments': col_segments,
+            'n_numeric_columns': int(type_masks[0][1].sum()),
+            'blocks': blocks,
+        }
+
+    def block_views(self, original_data: pd.DataFrame, layout: Optional[Dict[str, Any]] = None) -> Dict[tuple, np.ndarray]:
+        """
+        Separated blocks as views over the reordered data
+
+        The data is reordered once into a float array of the numerical columns
+        and an object array of the categorical ones; every block is a slice
+        of one of them, without further copies.
+
+        Parameters:
+        -----------
+        original_data : pd.DataFrame
+            Original input data
+        layout : Dict, optional
+            Result of block_layout(), computed when omitted
+
+        Returns:
+        --------
+        Dict[tuple, np.ndarray]
+            Block values keyed as in separate_mixed_type_blocks()
+        """
+        if layout is None:
+            layout = self.block_layout(original_data)
+
+        n_numeric = layout['n_numeric_columns']
+        row_order, col_order = layout['row_order'], layout['col_order']
+        arrays = {
+            'numerical': original_data.iloc[row_order, col_order[:n_numeric]].to_numpy(dtype=float, na_value=np.nan),
+            'categorical': original_data.iloc[row_order, col_order[n_numeric:]].to_numpy(dtype=object),
+        }
+        # Column offsets of the categorical array start after the numerical columns
+        starts = {'numerical': 0, 'categorical': n_numeric}
+
+        views = {}
+        row_offsets, col_offsets = layout['row_offsets'], layout['col_offsets']
+        for key, i, j in layout['blocks']:
+            block_type = key[3]
+            views[key] = arrays[block_type][row_offsets[i]:row_offsets[i + 1],
+                                            col_offsets[j] - starts[block_type]:col_offsets[j + 1] - starts[block_type]]
+        return views
+
+    @staticmethod
+    def _block_distances(dtype: str, block_values: np.ndarray, rows: bool = True, columns: bool = True) -> tuple:
+        """
+        Square row and column distance matrices of one separated block
+
+        Rows: Euclidean distances within numerical blocks, mismatch counts
+        within categorical blocks. Columns: 1 - |correlation| within numerical
+        blocks, L1 distance between value distributions within categorical
+        blocks.
+
+        Returns:
+        --------
+        Tuple of (row distances, column distances), None where not requested
+        or undefined (correlation needs at least 2 rows)
+        """
+        n_block_rows, n_block_cols = block_values.shape
+        row_dists = col_dists = None
+
+        if dtype == 'numerical':
+            if rows:
+                if np.isnan(block_values).any():
+                    row_dists = nan_euclidean_square(block_values)
+                else:
+                    row_dists = squareform(pdist(block_values))
+            if columns and n_block_rows > 1:
+                # corrcoef of a single column is a scalar
+                correlation = np.atleast_2d(np.corrcoef(block_values.T))
+                col_dists = np.triu(1 - np.abs(np.nan_to_num(correlation)), 1)
+                # Mirror the upper triangle, corrcoef is not exactly symmetric in floating point
+                col_dists += col_dists.T
+
+        elif n_block_rows > 0:
+            # Values coded jointly over the block, missing values are -1 and match nothing
+            codes, uniques = pd.factorize(block_values.ravel())
+            codes = codes.reshape(n_block_rows, n_block_cols)
+            n_values = len(uniques)
+            observed = codes >= 0
+            rows_observed, cols_observed = np.nonzero(observed)
+            one_hot_columns = cols_observed * n_values + codes[observed]
+
+            if rows:
+                # Mismatches: columns minus matches, matches from the one-hot Gram matrix
+                one_hot = sparse.csr_matrix(
+                    (np.ones(len(one_hot_columns)), (rows_observed, one_hot_columns)),
+                    shape=(n_block_rows, n_block_cols * n_values))
+                row_dists = n_block_cols - (one_hot @ one_hot.T).toarray()
+                np.fill_diagonal(row_dists, 0)
+            if columns:
+                distributions = np.bincount(one_hot_columns, minlength=n_block_cols * n_values)
+                distributions = distributions.reshape(n_block_cols, n_values) / n_block_rows
+                col_dists = cdist(distributions, distributions, 'cityblock')
+
+        return row_dists, col_dists
+
+    def _distance_matrices(self, blocks: Dict[tuple, pd.DataFrame], rows: bool = True, columns: bool = True) -> tuple:
+        """
+        Accumulate block-wise distances into square row and column matrices
+
+        Each block is scattered into the matrices in one step.
+
+        Parameters:
+        -----------
+        blocks : Dict[tuple, pd.DataFrame]
+            Separated blocks, or a subset of them
+        rows, columns : bool, default True
+            Which of the two matrices to compute
+
+        Returns:
+        --------
+        Tuple of (row labels, row distance matrix, column names, column distance
+        matrix), the matrices None where not requested
+        """
+        all_rows = list(set().union(*(block.index for block in blocks.values())))
+        all_cols = list(set().union(*(block.columns for block in blocks.values())))
+        row_positions = pd.Index(all_rows)
+        col_positions = pd.Index(all_cols)
+
+        row_dist_matrix = scratch_array((len(all_rows), len(all_rows)), scratch_dir=self.scratch_dir) if rows else None
+        col_dist_matrix = scratch_array((len(all_cols), len(all_cols)), scratch_dir=self.scratch_dir) if columns else None
+
+        for (row_cluster, col_cluster, block_id, dtype), block in blocks.items():
+            row_dists, col_dists = self._block_distances(dtype, block.values, rows, columns)
+            if row_dists is not None:
+                np.add.at(row_dist_matrix, np.ix_(*[row_positions.get_indexer(block.index)] * 2), row_dists)
+            if col_dists is not None:
+                np.add.at(col_dist_matrix, np.ix_(*[col_positions.get_indexer(block.columns)] * 2), col_dists)
+
+        return all_rows, row_dist_matrix, all_cols, col_dist_matrix
+
+    def _leaf_order(self, labels: list, dist_matrix: np.ndarray) -> list:
+        """
+        Labels in the leaf order of a Ward linkage over a square distance matrix
+
+        The matrix (and its condensed copy) are released afterwards if they
+        are memory-mapped.
+        """
+        if len(labels) < 2:
+            release_scratch(dist_matrix)
+            return list(labels)
+        n = len(labels)
+        out = scratch_array(n * (n - 1) // 2, dist_matrix.dtype, self.scratch_dir) if self.scratch_dir else None
+        condensed = condensed_from_square(dist_matrix, out)
+        order = leaves_list(linkage(condensed, method='ward'))
+        release_scratch([dist_matrix, condensed])
+        return [labels[i] for i in order]
+
+    def _global_orderings(self, blocks: Dict[tuple, pd.DataFrame]) -> tuple:
+        """
+        Order rows and columns by Ward linkage over the whole n x n row matrix
+
+        Parameters:
+        -----------
+        blocks : Dict[tuple, pd.DataFrame]
+            Dictionary of separated blocks from separate_mixed_type_blocks()
+
+        Returns:
+        --------
+        Tuple of (ordered row labels, ordered column names)
+        """
+        all_rows, row_dist_matrix, all_cols, col_dist_matrix = self._distance_matrices(blocks)
+        return self._leaf_order(all_rows, row_dist_matrix), self._leaf_order(all_cols, col_dist_matrix)
+
+    def _anchored_order(self, positions: np.ndarray, blocks: Dict[tuple, pd.DataFrame]) -> list:
+        """
+        Order the rows of a large row cluster around a linkage-ordered sample of them
+
+        A stratified sample of ``sample_size`` rows (the anchors) is ordered
+        like a small cluster. Every other row follows its nearest anchor under
+        the mixed metric of fit(), closest first, so memory is the anchors'
+        square matrix plus one tile of anchor distances.
+
+        Parameters:
+        -----------
+        positions : np.ndarray
+            Positions of the cluster's rows in the fitted data
+        blocks : Dict[tuple, pd.DataFrame]
+            The cluster's blocks from separate_mixed_type_blocks(), whose rows
+            are the same, in the same order
+
+        Returns:
+        --------
+        list
+            Ordered row labels
+        """
+        labels = next(iter(blocks.values())).index
+        anchors = self._stratified_sample(len(positions))
+        anchor_rows, row_dist_matrix, _, _ = self._distance_matrices(
+            {key: block.iloc[anchors] for key, block in blocks.items()}, columns=False)
+        anchor_rank = pd.Index(self._leaf_order(anchor_rows, row_dist_matrix)).get_indexer(labels[anchors])
+
+        # Anchors first, then all rows of the cluster, so that tiles pair the two
+        members = np.concatenate([positions[anchors], positions])
+        engine = MixedDistanceEngine(self._row_clustering_result['numeric'][members],
+                                     self._row_clustering_result['categorical'][members])
+        n_anchors = len(anchors)
+        nearest = np.empty(len(positions), dtype=np.int64)
+        distance = np.empty(len(positions))
+        for start in range(0, len(positions), engine.block_size):
+            stop = min(start + engine.block_size, len(positions))
+            tile = engine.tile(slice(0, n_anchors), slice(n_anchors + start, n_anchors + stop))
+            nearest[start:stop] = tile.argmin(axis=0)
+            distance[start:stop] = tile[nearest[start:stop], np.arange(stop - start)]
+        # An anchor leads the rows that follow it, even if it duplicates another anchor
+        nearest[anchors] = np.arange(n_anchors)
+        distance[anchors] = -1
+
+        return labels[np.lexsort((distance, anchor_rank[nearest]))].tolist()
+
+    def _hierarchical_orderings(self, blocks: Dict[tuple, pd.DataFrame]) -> tuple:
+        """
+        Order rows within each row cluster, then the clusters by centroid distance
+
+        Row distances only accumulate within the blocks of a row cluster, so
+        every cluster gets its own matrix and linkage (memory is the sum of the
+        squared cluster sizes), ordered on ``n_jobs`` threads. With
+        row_strategy='sample', clusters larger than ``sample_size`` are
+        ordered around a sample of their rows instead (see _anchored_order).
+        Clusters are ordered by average linkage over their standardized
+        profiles: numerical column means and categorical value frequencies.
+
+        Parameters:
+        -----------
+        blocks : Dict[tuple, pd.DataFrame]
+            Dictionary of separated blocks from separate_mixed_type_blocks()
+
+        Returns:
+        --------
+        Tuple of (ordered row labels, ordered column names)
+        """
+        cluster_blocks = defaultdict(dict)
+        for key, block in blocks.items():
+            cluster_blocks[key[0]][key] = block
+        clusters = list(cluster_blocks)
+
+        def order_cluster(cluster):
+            if self._row_clustering_result['sample'] is not None:
+                positions = np.flatnonzero(self._row_clusters == cluster)
+                if len(positions) > self.sample_size:
+                    return self._anchored_order(positions, cluster_blocks[cluster])
+            cluster_rows, row_dist_matrix, _, _ = self._distance_matrices(cluster_blocks[cluster], columns=False)
+            return self._leaf_order(cluster_rows, row_dist_matrix)
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            cluster_orders = dict(zip(clusters, executor.map(order_cluster, clusters)))
+
+        if len(clusters) > 1:
+            profiles = []
+            for cluster in clusters:
+                profile = {}
+                for key, block in cluster_blocks[cluster].items():
+                    if key[3] == 'numerical':
+                        profile.update({str(col): value for col, value in block.mean().items()})
+                    else:
+                        for col in block.columns:
+                            frequencies = block[col].value_counts(normalize=True)
+                            profile.update({f'{col}={value}': value_frequency
+                                            for value, value_frequency in frequencies.items()})
+                profiles.append(profile)
+            profiles = pd.DataFrame(profiles).fillna(0)
+            spread = profiles.std(ddof=0).replace(0, 1)
+            centroids = ((profiles - profiles.mean()) / spread).to_numpy()
+            clusters = [clusters[i] for i in leaves_list(linkage(centroids, method='average'))]
+
+        _, _, all_cols, col_dist_matrix = self._distance_matrices(blocks, rows=False)
+        ordered_rows = [row for cluster in clusters for row in cluster_orders[cluster]]
+        return ordered_rows, self._leaf_order(all_cols, col_dist_matrix)
+
+    def _orderings(self, blocks: Dict[tuple, pd.DataFrame]) -> tuple:
+        """Row labels and column names in the order set by the ``ordering`` parameter"""
+        if self.ordering == 'hierarchical':
+            return self._hierarchical_orderings(blocks)
+        return self._global_orderings(blocks)
+
+    def sorted_block_layout(self, original_data: pd.DataFrame) -> Dict[str, Any]:
+        """
+        block_layout() in the row and column order of sort_blocks_globally()
+
+        The rows of every block come out in the same order as in the sorted
+        blocks, without the sorted copies being built.
+
+        Parameters:
+        -----------
+        original_data : pd.DataFrame
+            Original input data
+
+        Returns:
+        --------
+        Dict as returned by block_layout()
+        """
+        blocks = self.separate_mixed_type_blocks(original_data)
+        with stage('sort_blocks'):
+            ordered_rows, ordered_cols = self._orderings(blocks)
+        del blocks
+        return self.block_layout(original_data, original_data.index.get_indexer(ordered_rows),
+                                 original_data.columns.get_indexer(ordered_cols))
+
+    @instrumented('sort_blocks')
     def sort_blocks_globally(self, blocks: Dict[tuple, pd.DataFrame]) -> Dict[tuple, pd.DataFrame]:
         """
         Sort blocks using global optimization across all clusters - optimized version
@@ -300,96 +843,17 @@ class MixedTypeBiclustering:
         Returns:
         --------
         Dict[tuple, pd.DataFrame]
-            Sorted blocks with globally optimal row and column ordering
+            Sorted blocks with globally optimal row and column ordering, the
+            order set by the ``ordering`` parameter
         """
-        # Create global indices
-        all_rows = list(set().union(*(block.index for block in blocks.values())))
-        all_cols = list(set().union(*(block.columns for block in blocks.values())))
-        
-        # Initialize distance matrices with zeros
-        n_rows = len(all_rows)
-        n_cols = len(all_cols)
-        row_dist_matrix = np.zeros((n_rows, n_rows))
-        col_dist_matrix = np.zeros((n_cols, n_cols))
-        
-        # Create row and column index mappings for faster lookup
-        row_to_idx = {row: idx for idx, row in enumerate(all_rows)}
-        col_to_idx = {col: idx for idx, col in enumerate(all_cols)}
-        
-        # Process blocks more efficiently
-        for (row_cluster, col_cluster, block_id, dtype), block in blocks.items():
-            if dtype == 'numerical':
-                # Process numerical blocks
-                block_values = block.values
-                
-                # Update row distances using vectorized operations
-                if block_values.shape[1] > 0:  # Only if block has columns
-                    block_row_dists = pdist(block_values)
-                    block_row_indices = [row_to_idx[idx] for idx in block.index]
-                    
-                    # Convert condensed distance matrix to square form
-                    block_row_dists_square = squareform(block_row_dists)
-                    
-                    # Update global distance matrix for these indices
-                    for i, row_i in enumerate(block_row_indices):
-                        for j, row_j in enumerate(block_row_indices):
-                            if i < j:
-                                row_dist_matrix[row_i, row_j] += block_row_dists_square[i, j]
-                                row_dist_matrix[row_j, row_i] += block_row_dists_square[i, j]
-                
-                # Update column distances using correlation
-                if block_values.shape[0] > 1:  # Need at least 2 rows for correlation
-                    corr = np.corrcoef(block_values.T)
-                    corr = np.nan_to_num(corr, 0)  # Handle NaN values
-                    block_col_indices = [col_to_idx[col] for col in block.columns]
-                    
-                    # Update global distance matrix for columns
-                    for i, col_i in enumerate(block_col_indices):
-                        for j, col_j in enumerate(block_col_indices):
-                            if i < j:
-                                dist = 1 - abs(corr[i, j])
-                                col_dist_matrix[col_i, col_j] += dist
-                                col_dist_matrix[col_j, col_i] += dist
-                    
-            else:  # categorical
-                # Process categorical blocks more efficiently
-                block_values = block.values
-                block_row_indices = [row_to_idx[idx] for idx in block.index]
-                block_col_indices = [col_to_idx[col] for col in block.columns]
-                
-                # Update row distances using vectorized operations
-                for i, row_i in enumerate(block_row_indices):
-                    mismatches = (block_values[i:i+1] != block_values).sum(axis=1)
-                    for j, row_j in enumerate(block_row_indices[i+1:], i+1):
-                        row_dist_matrix[row_i, row_j] += mismatches[j]
-                        row_dist_matrix[row_j, row_i] += mismatches[j]
-                
-                # Update column distances using vectorized operations
-                if block_values.shape[0] > 0:  # Only if block has rows
-                    for i, col_i in enumerate(block_col_indices):
-                        col1_values = block_values[:, i]
-                        for j, col_j in enumerate(block_col_indices[i+1:], i+1):
-                            col2_values = block_values[:, j]
-                            # Compare distributions using numpy operations
-                            unique_vals = np.unique(np.concatenate([col1_values, col2_values]))
-                            dist1 = np.array([(col1_values == val).sum() for val in unique_vals]) / len(col1_values)
-                            dist2 = np.array([(col2_values == val).sum() for val in unique_vals]) / len(col2_values)
-                            dist = np.sum(np.abs(dist1 - dist2))
-                            col_dist_matrix[col_i, col_j] += dist
-                            col_dist_matrix[col_j, col_i] += dist
-        
-        # Get optimal orderings using condensed distance matrices
-        row_order = leaves_list(linkage(squareform(row_dist_matrix), method='ward'))
-        col_order = leaves_list(linkage(squareform(col_dist_matrix), method='ward'))
-        
-        ordered_rows = [all_rows[i] for i in row_order]
-        ordered_cols = [all_cols[i] for i in col_order]
-        
-        # Efficiently reindex blocks
+        ordered_rows, ordered_cols = self._orderings(blocks)
+        ordered_rows, ordered_cols = pd.Index(ordered_rows), pd.Index(ordered_cols)
+
+        # Reindex blocks in the computed order (Index.intersection keeps the block's own order)
         sorted_blocks = {}
         for key, block in blocks.items():
-            block_rows = block.index.intersection(ordered_rows)
-            block_cols = block.columns.intersection(ordered_cols)
+            block_rows = ordered_rows[ordered_rows.isin(block.index)]
+            block_cols = ordered_cols[ordered_cols.isin(block.columns)]
             sorted_blocks[key] = block.reindex(index=block_rows, columns=block_cols)
         
         return sorted_blocks
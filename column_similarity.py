@@ -0,0 +1,250 @@
+import numpy as np
+from numba import njit, prange
+from typing import TYPE_CHECKING, List, Optional
+
+from instrumentation import instrumented
+from mixed_distance import ONE_HOT_MAX_CATEGORIES, condensed_from_square
+
+if TYPE_CHECKING:
+    from encoded_table import EncodedTable
+
+# How the clustering classes compare columns: 'association' uses the
+# statistics below, 'mixed_distance' the row distance applied to the
+# transposed matrix (one n_rows-long sample per column)
+COLUMN_METRICS = ('association', 'mixed_distance')
+
+DEFAULT_CHUNK_ROWS = 65536
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def _categorical_kernel(slots: np.ndarray, numeric: np.ndarray,
+                        contingency: np.ndarray, sums: np.ndarray, counts: np.ndarray):
+    """
+    Add a chunk to the contingency tables and the per-category numeric sums
+
+    ``slots`` hold category codes shifted by the offset of their column. Each
+    column writes only the rows of its own slots, so the columns are
+    processed in parallel without conflicts. Only the tables of column u
+    against the later columns v > u are filled.
+    """
+    n_rows, n_categorical = slots.shape
+    n_numeric = numeric.shape[1]
+    for column in prange(n_categorical):
+        # prange indices are unsigned, and mixing them with signed ints gives floats
+        u = np.int64(column)
+        for r in range(n_rows):
+            slot = slots[r, u]
+            for v in range(u + 1, n_categorical):
+                contingency[slot, slots[r, v]] += 1
+            for a in range(n_numeric):
+                value = numeric[r, a]
+                if not np.isnan(value):
+                    sums[slot, a] += value
+                    counts[slot, a] += 1
+
+
+class ColumnStatistics:
+    def __init__(self, n_numeric: int, n_categories: List[int], max_categories: int = ONE_HOT_MAX_CATEGORIES):
+        """
+        Sufficient statistics of the pairwise column associations, accumulated chunk by chunk
+
+        One pass over the rows fills, in memory independent of the number of rows:
+            - numeric x numeric: pairwise-complete counts, sums, sums of squares
+              and cross products (chunked Gram matrices), for Pearson correlation
+            - categorical x categorical: contingency tables (of each column
+              against the later ones), for Cramér's V
+            - numeric x categorical: per-category counts and sums, for the
+              correlation ratio
+
+        Columns with more than ``max_categories`` categories keep their
+        max_categories - 1 most frequent ones and pool the others, which
+        bounds the tables at (n_categorical * max_categories)^2 cells.
+
+        Parameters:
+        -----------
+        n_numeric : int
+            Number of numeric columns
+        n_categories : List[int]
+            Number of categories of every categorical column
+        max_categories : int, default ONE_HOT_MAX_CATEGORIES
+            Categories kept per column, the last one pooling the rare ones
+        """
+        self.n_numeric = n_numeric
+        self.max_categories = max_categories
+        self.widths = np.minimum(np.asarray(n_categories, dtype=np.int64), max_categories)
+        self.offsets = np.concatenate([[0], np.cumsum(self.widths)]).astype(np.int64)
+        # Code -> category slot of every categorical column, set by set_frequencies()
+        self._slots: List[Optional[np.ndarray]] = [None] * len(n_categories)
+
+        n_slots = int(self.offsets[-1])
+        self.n = np.zeros((n_numeric, n_numeric))
+        self.sums = np.zeros((n_numeric, n_numeric))
+        self.squares = np.zeros((n_numeric, n_numeric))
+        self.cross = np.zeros((n_numeric, n_numeric))
+        self.contingency = np.zeros((n_slots, n_slots))
+        self.category_sums = np.zeros((n_slots, n_numeric))
+        self.category_counts = np.zeros((n_slots, n_numeric))
+
+    def set_frequencies(self, column: int, frequencies: np.ndarray):
+        """Pool the rare categories of a categorical column given its category frequencies"""
+        if len(frequencies) <= self.max_categories:
+            self._slots[column] = None
+            return
+        kept = np.argsort(-frequencies, kind='stable')[:self.max_categories - 1]
+        slots = np.full(len(frequencies), self.max_categories - 1, dtype=np.int64)
+        slots[kept] = np.arange(self.max_categories - 1)
+        self._slots[column] = slots
+
+    def update(self, numeric: np.ndarray, codes: np.ndarray):
+        """
+        Add a chunk of rows
+
+        Parameters:
+        -----------
+        numeric : np.ndarray
+            (n_rows, n_numeric) values, NaN when missing
+        codes : np.ndarray
+            (n_rows, n_categorical) category codes
+        """
+        values = np.asarray(numeric, dtype=np.float64)
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0)
+        mask = present.astype(np.float64)
+        # Entry [a, b] sums over the rows where column b is present
+        self.n += mask.T @ mask
+        self.sums += filled.T @ mask
+        self.squares += (filled * filled).T @ mask
+        self.cross += filled.T @ filled
+
+        if codes.shape[1] == 0:
+            return
+        slots = np.empty(codes.shape, dtype=np.int64)
+        for k in range(codes.shape[1]):
+            column = codes[:, k] if self._slots[k] is None else self._slots[k][codes[:, k]]
+            slots[:, k] = column + self.offsets[k]
+        _categorical_kernel(slots, values, self.contingency, self.category_sums, self.category_counts)
+
+    def _correlations(self) -> np.ndarray:
+        """Absolute pairwise-complete Pearson correlation of the numeric columns"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = self.cross - self.sums * self.sums.T / self.n
+            variance = self.squares - self.sums ** 2 / self.n
+            correlation = covariance / np.sqrt(variance * variance.T)
+        return np.clip(np.abs(np.nan_to_num(correlation, nan=0.0, posinf=0.0, neginf=0.0)), 0, 1)
+
+    def _cramers_v(self, u: int, v: int) -> float:
+        table = self.contingency[self.offsets[u]:self.offsets[u + 1], self.offsets[v]:self.offsets[v + 1]]
+        rows = table.sum(axis=1)
+        cols = table.sum(axis=0)
+        total = rows.sum()
+        # Categories absent from the data do not count towards the degrees of freedom
+        dof = min(np.count_nonzero(rows), np.count_nonzero(cols)) - 1
+        if total == 0 or dof <= 0:
+            return 0.0
+        expected = np.outer(rows, cols) / total
+        observed = expected > 0
+        chi2 = np.sum((table[observed] - expected[observed]) ** 2 / expected[observed])
+        return float(min(np.sqrt(chi2 / (total * dof)), 1.0))
+
+    def _correlation_ratio(self, a: int, u: int) -> float:
+        sums = self.category_sums[self.offsets[u]:self.offsets[u + 1], a]
+        counts = self.category_counts[self.offsets[u]:self.offsets[u + 1], a]
+        n, total, squares = self.n[a, a], self.sums[a, a], self.squares[a, a]
+        if n == 0:
+            return 0.0
+        spread = squares - total ** 2 / n
+        if spread <= 0:
+            return 0.0
+        filled = counts > 0
+        between = np.sum(sums[filled] ** 2 / counts[filled]) - total ** 2 / n
+        return float(np.sqrt(np.clip(between / spread, 0, 1)))
+
+    def similarity(self, column_types: np.ndarray) -> np.ndarray:
+        """
+        Square association matrix in [0, 1], 1 on the diagonal
+
+        Parameters:
+        -----------
+        column_types : np.ndarray
+            Boolean mask over all columns, True for numeric ones; numeric and
+            categorical statistics are indexed in mask order
+
+        Returns:
+        --------
+        np.ndarray
+            (n_columns, n_columns) matrix in the original column order
+        """
+        numeric_cols = np.flatnonzero(column_types)
+        categorical_cols = np.flatnonzero(~column_types)
+        similarity = np.eye(len(column_types))
+        similarity[np.ix_(numeric_cols, numeric_cols)] = self._correlations()
+        for u, col_u in enumerate(categorical_cols):
+            for v in range(u + 1, len(categorical_cols)):
+                similarity[col_u, categorical_cols[v]] = similarity[categorical_cols[v], col_u] = \
+                    self._cramers_v(u, v)
+            for a, col_a in enumerate(numeric_cols):
+                similarity[col_u, col_a] = similarity[col_a, col_u] = self._correlation_ratio(a, u)
+        np.fill_diagonal(similarity, 1)
+        return similarity
+
+
+@instrumented('column_similarity')
+def column_association(table: 'EncodedTable', chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                       max_categories: int = ONE_HOT_MAX_CATEGORIES) -> np.ndarray:
+    """
+    Association of every pair of columns of an encoded table, in one pass over its rows
+
+    |Pearson r| for two numeric columns, Cramér's V for two categorical
+    ones and the correlation ratio (eta) for a numeric and a categorical
+    one, so every column pair is compared as its types allow rather than as
+    two n_rows-long vectors. See ColumnStatistics.
+
+    Parameters:
+    -----------
+    table : EncodedTable
+        Preprocessed data
+    chunk_rows : int, default DEFAULT_CHUNK_ROWS
+        Rows per update, bounds the temporaries of the Gram products
+    max_categories : int, default ONE_HOT_MAX_CATEGORIES
+        Categories kept per categorical column
+
+    Returns:
+    --------
+    np.ndarray
+        (n_columns, n_columns) similarity matrix in [0, 1]
+    """
+    categorical_cols = table.columns[~table.column_types]
+    n_categories = [len(table.encoders[col].classes_) for col in categorical_cols]
+    statistics = ColumnStatistics(table.numeric.shape[1], n_categories, max_categories)
+    for k, width in enumerate(n_categories):
+        if width > max_categories:
+            statistics.set_frequencies(k, np.bincount(table.codes[:, k], minlength=width))
+
+    for start in range(0, table.n_rows, chunk_rows):
+        statistics.update(table.numeric[start:start + chunk_rows], table.codes[start:start + chunk_rows])
+    return statistics.similarity(table.column_types)
+
+
+def condensed_column_distances(table: 'EncodedTable', dtype: type = np.float64, **kwargs) -> np.ndarray:
+    """
+    Condensed column distances sqrt(2 * (1 - association)) for linkage
+
+    For two standardized numeric columns with r >= 0 this is their Euclidean
+    distance per row, so Ward's linkage behaves as on the transposed matrix.
+
+    Parameters:
+    -----------
+    table : EncodedTable
+        Preprocessed data
+    dtype : type, default np.float64
+        Dtype of the result
+    **kwargs
+        Forwarded to column_association()
+
+    Returns:
+    --------
+    np.ndarray
+        Condensed distance vector
+    """
+    distances = np.sqrt(2 * (1 - column_association(table, **kwargs)))
+    return condensed_from_square(distances.astype(dtype))
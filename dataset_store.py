@@ -0,0 +1,187 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import BinaryIO, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from ingestion import read_csv_chunked
+from model_cache import stream_content_hash
+
+META_FILE = 'meta.json'
+
+
+class DatasetNotFoundError(KeyError):
+    """Raised for unknown or evicted dataset IDs"""
+
+
+class UnknownColumnError(ValueError):
+    """Raised when columns requested from a dataset are not in it"""
+
+
+class DatasetStore:
+    def __init__(self,
+                 root_dir: Optional[str] = None,
+                 ttl_seconds: float = 3600,
+                 max_bytes: int = 2 * 2**30):
+        """
+        On-disk columnar store of uploaded CSV files
+
+        Every dataset is parsed once, in chunks, and written as one ``.npy``
+        file per column: numeric columns in their parsed dtype, categorical
+        columns as integer codes plus a category list in the metadata. Later
+        requests load the columns back without re-parsing CSV.
+
+        Parameters:
+        -----------
+        root_dir : str, optional
+            Directory holding the datasets, a temporary directory by default
+        ttl_seconds : float, default 3600
+            Datasets not accessed for this long are deleted
+        max_bytes : int, default 2 GiB
+            Total size of the store; least recently used datasets are deleted
+            beyond it
+        """
+        self.root_dir = root_dir or os.path.join(tempfile.gettempdir(), 'csv-visualization-datasets')
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _path(self, dataset_id: str) -> str:
+        # IDs are hex digests; anything else could escape the root directory
+        if not dataset_id or not all(c in '0123456789abcdef' for c in dataset_id):
+            raise DatasetNotFoundError(dataset_id)
+        return os.path.join(self.root_dir, dataset_id)
+
+    def put(self, content: Union[bytes, BinaryIO]) -> str:
+        """
+        Parse an uploaded CSV file and store it
+
+        Uploading identical content again returns the existing dataset.
+
+        Parameters:
+        -----------
+        content : bytes or seekable file object
+            Raw CSV file; a file object (e.g. the spooled upload) is hashed
+            and parsed in chunks without being read into memory
+
+        Returns:
+        --------
+        str
+            Dataset ID
+        """
+        if isinstance(content, bytes):
+            content = io.BytesIO(content)
+        dataset_id = stream_content_hash(content)
+        path = self._path(dataset_id)
+
+        if not os.path.exists(path):
+            data = read_csv_chunked(content).data
+            staging = tempfile.mkdtemp(dir=self.root_dir, prefix='.staging-')
+            columns = []
+            for i, col in enumerate(data.columns):
+                series = data[col]
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    np.save(os.path.join(staging, f'{i}.npy'), series.cat.codes.to_numpy())
+                    columns.append({'name': str(col), 'kind': 'categorical',
+                                    'categories': [str(c) for c in series.cat.categories]})
+                else:
+                    np.save(os.path.join(staging, f'{i}.npy'), series.to_numpy())
+                    columns.append({'name': str(col), 'kind': 'native', 'dtype': series.dtype.str})
+
+            with open(os.path.join(staging, META_FILE), 'w') as f:
+                json.dump({'columns': columns, 'n_rows': len(data)}, f)
+            try:
+                os.rename(staging, path)
+            except OSError:
+                # Stored concurrently by another request
+                shutil.rmtree(staging, ignore_errors=True)
+
+        self._touch(path)
+        self.evict()
+        return dataset_id
+
+    def get(self, dataset_id: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Load a stored dataset
+
+        Parameters:
+        -----------
+        dataset_id : str
+            ID returned by put()
+        columns : List[str], optional
+            Only load these columns, in this order
+
+        Returns:
+        --------
+        pd.DataFrame
+
+        Raises:
+        -------
+        DatasetNotFoundError
+            If the dataset does not exist or has been evicted
+        UnknownColumnError
+            If some of ``columns`` are not in the dataset
+        """
+        path = self._path(dataset_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+                raise DatasetNotFoundError(dataset_id)
+            with open(os.path.join(path, META_FILE)) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise DatasetNotFoundError(dataset_id)
+        self._touch(path)
+
+        positions = {column['name']: i for i, column in enumerate(meta['columns'])}
+        names = list(positions) if columns is None else columns
+        unknown = [name for name in names if name not in positions]
+        if unknown:
+            raise UnknownColumnError(f"Unknown columns {unknown!r} in dataset {dataset_id}")
+        values = {}
+        for name in names:
+            i = positions[name]
+            column = meta['columns'][i]
+            array = np.load(os.path.join(path, f'{i}.npy'))
+            if column['kind'] == 'categorical':
+                array = pd.Categorical.from_codes(array, categories=column['categories'])
+            values[name] = array
+
+        return pd.DataFrame(values, columns=names)
+
+    def _touch(self, path: str):
+        """Record an access, the directory mtime drives TTL and LRU eviction"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Delete expired datasets, then least recently used ones beyond the size cap"""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for name in os.listdir(self.root_dir):
+                path = os.path.join(self.root_dir, name)
+                if name.startswith('.staging-') or not os.path.isdir(path):
+                    continue
+                last_access = os.path.getmtime(path)
+                if now - last_access > self.ttl_seconds:
+                    shutil.rmtree(path, ignore_errors=True)
+                    continue
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                entries.append((last_access, size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
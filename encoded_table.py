@@ -0,0 +1,160 @@
+from typing import TYPE_CHECKING, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+from model_cache import LRUCache, frame_hash
+
+if TYPE_CHECKING:
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+# Encoded tables of recently preprocessed frames, keyed by frame_hash()
+table_cache = LRUCache(max_bytes=256 * 2**20)
+
+
+def _label_codes(values: pd.Series):
+    """
+    Codes and classes as LabelEncoder().fit_transform(values.astype(str)) gives them
+
+    The column is factorized first, so that only its distinct values are cast
+    to text and sorted. Missing values form a class of their own ('nan').
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    labels = np.asarray(uniques, dtype=object).astype(str)
+    classes, rank = np.unique(labels, return_inverse=True)
+    return rank.astype(np.int32)[codes], classes
+
+
+class EncodedTable:
+    def __init__(self,
+                 columns: pd.Index,
+                 column_types: np.ndarray,
+                 numeric: np.ndarray,
+                 codes: np.ndarray,
+                 scaler: Optional['StandardScaler'],
+                 encoders: Dict[str, 'LabelEncoder']):
+        """
+        Preprocessed form of a mixed-type frame, shared by the clustering classes
+
+        Use EncodedTable.from_frame() or encode_table() to build one.
+
+        Parameters:
+        -----------
+        columns : pd.Index
+            Columns of the original frame
+        column_types : np.ndarray
+            Boolean mask over columns, True for numeric columns
+        numeric : np.ndarray
+            (n_rows, n_numeric) float32 block of standardized values, NaN when missing
+        codes : np.ndarray
+            (n_rows, n_categorical) int32 block of label codes
+        scaler : StandardScaler
+            Scaler of the numeric columns, None if there are none
+        encoders : Dict[str, LabelEncoder]
+            Fitted label encoder of every categorical column
+        """
+        self.columns = columns
+        self.column_types = column_types
+        self.numeric = numeric
+        self.codes = codes
+        self.scaler = scaler
+        self.encoders = encoders
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, scaler: Optional['StandardScaler'] = None) -> 'EncodedTable':
+        """
+        Standardize the numeric columns and label encode the others
+
+        Parameters:
+        -----------
+        data : pd.DataFrame
+            Input data
+        scaler : StandardScaler, optional
+            Scaler already fitted on the numeric columns, e.g. on another
+            sample of the same dataset; fitted on the data when omitted
+
+        Returns:
+        --------
+        EncodedTable
+        """
+        # Imported on first use, sklearn takes longer to import than the rest of the app
+        from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+        column_types = data.columns.isin(data.select_dtypes(include=[np.number]).columns)
+        numeric_cols = data.columns[column_types]
+        categorical_cols = data.columns[~column_types]
+
+        numeric = np.empty((len(data), 0), dtype=np.float32)
+        if len(numeric_cols) > 0:
+            values = data[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+            if scaler is None:
+                scaler = StandardScaler().fit(values)
+            # scaler.transform() in place, without its input validation copies
+            values -= scaler.mean_
+            values /= scaler.scale_
+            numeric = values.astype(np.float32)
+        else:
+            scaler = None
+
+        codes = np.empty((len(data), len(categorical_cols)), dtype=np.int32)
+        encoders = {}
+        for k, col in enumerate(categorical_cols):
+            codes[:, k], classes = _label_codes(data[col])
+            encoders[col] = LabelEncoder()
+            encoders[col].classes_ = classes
+
+        return cls(data.columns, column_types, numeric, codes, scaler, encoders)
+
+    @property
+    def n_rows(self) -> int:
+        return self.numeric.shape[0]
+
+    def matrix(self) -> np.ndarray:
+        """
+        (n_rows, n_columns) float32 matrix in the original column order
+
+        Codes are stored as numbers, as the column distances treat every
+        column as numeric. Built on every call, the table keeps only the
+        typed blocks.
+        """
+        matrix = np.empty((self.n_rows, len(self.columns)), dtype=np.float32)
+        matrix[:, self.column_types] = self.numeric
+        matrix[:, ~self.column_types] = self.codes
+        return matrix
+
+    def take(self, rows: np.ndarray) -> 'EncodedTable':
+        """Table restricted to some rows, sharing the encoders"""
+        return EncodedTable(self.columns, self.column_types, self.numeric[rows], self.codes[rows],
+                            self.scaler, self.encoders)
+
+
+@instrumented('preprocess')
+def encode_table(data: pd.DataFrame, scaler: Optional['StandardScaler'] = None) -> EncodedTable:
+    """
+    EncodedTable of a frame, memoized by its content hash
+
+    Frames with the same content, e.g. the same dataset preprocessed for the
+    biclustering and for the similarity matrix, share one table. Tables
+    standardized with a given scaler are not memoized, the key only covers
+    the frame.
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Input data
+    scaler : StandardScaler, optional
+        Forwarded to EncodedTable.from_frame()
+
+    Returns:
+    --------
+    EncodedTable
+    """
+    if scaler is not None:
+        return EncodedTable.from_frame(data, scaler)
+    key = frame_hash(data)
+    table = table_cache.get(key)
+    if table is None:
+        table = EncodedTable.from_frame(data, scaler)
+        table_cache.put(key, table)
+    return table
@@ -1,18 +1,20 @@
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Optional
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from typing import List, Dict, Optional, Union
 from scipy.spatial.distance import pdist, squareform
 from scipy.cluster.hierarchy import linkage, fcluster, leaves_list, dendrogram
-import matplotlib.pyplot as plt
-from collections import defaultdict
+from column_similarity import COLUMN_METRICS, condensed_column_distances
+from encoded_table import EncodedTable, encode_table
+from mixed_distance import condensed_mixed_distance, nan_euclidean_square
 
 class ComprehensiveMixedBiclustering:
     def __init__(self, 
                  n_row_clusters: int = 3, 
                  n_col_clusters: int = 3, 
                  distance_metric: str = 'mixed',
-                 consider_missing_patterns: bool = True):
+                 consider_missing_patterns: bool = True,
+                 dtype: type = np.float64,
+                 column_metric: str = 'association'):
         """
         Initialize the Comprehensive Mixed-Type Biclustering algorithm
         
@@ -26,10 +28,18 @@ class ComprehensiveMixedBiclustering:
             Distance metric to use for clustering
         consider_missing_patterns : bool, default True
             Whether to consider patterns of missing values in clustering
+        dtype : type, default np.float64
+            Dtype of the condensed distance vectors, np.float32 halves their size
+        column_metric : str, default 'association'
+            How columns are compared, see column_similarity.COLUMN_METRICS
         """
+        if column_metric not in COLUMN_METRICS:
+            raise ValueError(f"Unknown column_metric {column_metric!r}, expected one of {COLUMN_METRICS}")
         self.n_row_clusters = n_row_clusters
         self.n_col_clusters = n_col_clusters
         self.consider_missing_patterns = consider_missing_patterns
+        self.dtype = dtype
+        self.column_metric = column_metric
         self._row_clusters = None
         self._col_clusters = None
         self._row_cluster_labels = None
@@ -37,7 +47,7 @@ class ComprehensiveMixedBiclustering:
         self._column_clustering_result = None
         self._missing_patterns = None
         
-    def _identify_missing_patterns(self, data: pd.DataFrame) -> Dict[str, List[int]]:
+    def _identify_missing_patterns(self, data: pd.DataFrame) -> np.ndarray:
         """
         Identify patterns of missing values across columns
         
@@ -48,21 +58,18 @@ class ComprehensiveMixedBiclustering:
             
         Returns:
         --------
-        Dict[str, List[int]]
-            Dictionary mapping missing value patterns to row indices
+        np.ndarray
+            Integer pattern ID of every row (by position), rows with the same
+            missing columns share an ID
         """
-        # Create binary matrix of missing values
-        missing_matrix = data.isna().astype(int)
-        
-        # Convert each row's missing pattern to a string for grouping
-        patterns = {}
-        for idx, row in missing_matrix.iterrows():
-            pattern = ''.join(row.astype(str))
-            if pattern not in patterns:
-                patterns[pattern] = []
-            patterns[pattern].append(idx)
-            
-        return patterns
+        # Pack each row's missing mask into bits, 8 columns per byte
+        packed = np.packbits(data.isna().to_numpy(), axis=1)
+
+        # Group identical packed rows, each viewed as one opaque scalar
+        # (much faster than np.unique(axis=0), which sorts column by column)
+        rows = np.ascontiguousarray(packed).view(np.dtype((np.void, packed.shape[1]))).ravel()
+        _, pattern_ids = np.unique(rows, return_inverse=True)
+        return pattern_ids.ravel()
 
     # def _mixed_distance(self, X: np.ndarray, missing_patterns: Optional[Dict[str, List[int]]] = None) -> np.ndarray:
     #     """
@@ -124,79 +131,35 @@ class ComprehensiveMixedBiclustering:
 
     #     return distances
 
-    def _mixed_distance(self, X: np.ndarray, missing_patterns: Optional[Dict[str, List[int]]] = None) -> np.ndarray:
+    def _mixed_distance(self, X: Union[np.ndarray, EncodedTable], missing_patterns: Optional[np.ndarray] = None,
+                        column_types: Optional[np.ndarray] = None) -> np.ndarray:
         """
-        Compute a custom distance matrix for mixed-type data ensuring symmetry
+        Compute a custom condensed distance vector for mixed-type data
         
         Parameters:
         -----------
-        X : np.ndarray
-            Input data matrix
-        missing_patterns : Optional[Dict[str, List[int]]]
-            Dictionary of missing value patterns
+        X : np.ndarray or EncodedTable
+            Input data matrix, or an encoded table carrying its own column types
+        missing_patterns : Optional[np.ndarray]
+            Missing value pattern ID of every row, from _identify_missing_patterns()
+        column_types : Optional[np.ndarray]
+            Boolean mask, True for numeric columns. All columns are treated
+            as numeric when omitted.
         
         Returns:
         --------
         np.ndarray
-            Symmetric distance matrix
+            Condensed distance vector
         """
-        def mixed_metric(u: np.ndarray, v: np.ndarray) -> float:
-            """
-            Custom metric for pdist
-            """
-            distances = []
-            for i in range(len(u)):
-                # Handle missing values
-                if pd.isna(u[i]) or pd.isna(v[i]):
-                    distances.append(1.0)
-                # Numeric type handling
-                elif np.issubdtype(type(u[i]), np.number) and np.issubdtype(type(v[i]), np.number):
-                    distances.append((float(u[i]) - float(v[i]))**2)
-                # Categorical type handling
-                else:
-                    distances.append(0 if u[i] == v[i] else 1)
-            return np.sqrt(np.sum(distances))
-
-        if missing_patterns and self.consider_missing_patterns:
-            # Create reverse mapping of row indices to patterns
-            row_to_pattern = defaultdict(str)
-            for pattern, indices in missing_patterns.items():
-                for idx in indices:
-                    row_to_pattern[idx] = pattern
-
-            def pattern_adjusted_metric(u: np.ndarray, v: np.ndarray, idx1: int, idx2: int) -> float:
-                base_dist = mixed_metric(u, v)
-                pattern_match = row_to_pattern[idx1] == row_to_pattern[idx2]
-                pattern_factor = 0.5 if pattern_match else 2.0
-                return base_dist * pattern_factor
-
-            # Calculate pairwise distances
-            n = X.shape[0]
-            distances = np.zeros((n, n))
-            
-            # Use pdist with the custom metric
-            condensed_distances = pdist(np.arange(n), metric=lambda i, j: pattern_adjusted_metric(
-                X[int(i)], X[int(j)], int(i), int(j)
-            ))
-            
-            # Convert to square form
-            distances = squareform(condensed_distances)
-            
-        else:
-            # Use pdist directly with the mixed metric
-            distances = squareform(pdist(X, metric=mixed_metric))
+        # Rows are scaled by the pattern factor in the same pass as the distances
+        pattern_ids = missing_patterns if self.consider_missing_patterns else None
+        distances = condensed_mixed_distance(X, column_types, dtype=self.dtype, pattern_ids=pattern_ids)
 
-        # Ensure diagonal is zero
-        np.fill_diagonal(distances, 0)
-        
-        # Ensure perfect symmetry
-        distances = (distances + distances.T) / 2
-        
         return distances
     
-    def _preprocess_data(self, data: pd.DataFrame) -> Dict[str, Any]:
+    def _preprocess_data(self, data: pd.DataFrame) -> EncodedTable:
         """
-        Preprocess the input data by separating and encoding different types
+        Standardize the numeric columns and label encode the categorical ones
         
         Parameters:
         -----------
@@ -205,36 +168,10 @@ class ComprehensiveMixedBiclustering:
         
         Returns:
         --------
-        Dict containing processed data and type information
+        EncodedTable
+            Shared with other models preprocessing the same data (see encode_table)
         """
-        # Identify column types
-        numeric_cols = data.select_dtypes(include=[np.number]).columns
-        categorical_cols = data.select_dtypes(include=['object', 'category']).columns
-        
-        # Prepare processed data
-        processed_data = data.copy()
-        type_encodings = {}
-        
-        # Handle numeric columns - standardize
-        if len(numeric_cols) > 0:
-            scaler = StandardScaler()
-            processed_data[numeric_cols] = scaler.fit_transform(processed_data[numeric_cols])
-        
-        # Handle categorical columns - label encode
-        for col in categorical_cols:
-            le = LabelEncoder()
-            processed_data[col] = le.fit_transform(processed_data[col].astype(str))
-            type_encodings[col] = {
-                'encoder': le,
-                'original_categories': le.classes_
-            }
-        
-        return {
-            'processed_data': processed_data,
-            'type_encodings': type_encodings,
-            'numeric_cols': list(numeric_cols),
-            'categorical_cols': list(categorical_cols)
-        }
+        return encode_table(data)
     
     def fit(self, data: pd.DataFrame):
         """
@@ -250,19 +187,24 @@ class ComprehensiveMixedBiclustering:
             self._missing_patterns = self._identify_missing_patterns(data)
         
         # Preprocess the data
-        prep_data = self._preprocess_data(data)
-        processed_df = prep_data['processed_data']
+        table = self._preprocess_data(data)
         
-        # Compute distance matrices for rows and columns
-        row_dist_matrix = self._mixed_distance(processed_df.values, self._missing_patterns)
-        col_dist_matrix = self._mixed_distance(processed_df.values.T)
+        # Compute condensed distance vectors for rows and columns
+        row_distances = self._mixed_distance(table, self._missing_patterns)
+        if self.column_metric == 'association':
+            col_distances = condensed_column_distances(table, dtype=self.dtype)
+        else:
+            col_distances = self._mixed_distance(table.matrix().T)
         
-        # Perform hierarchical clustering on rows
-        row_linkage = linkage(row_dist_matrix, method='ward')
+        # Perform hierarchical clustering on rows. The plain mixed distance is
+        # Euclidean in a one-hot embedding (see MixedDistanceEngine.embedding), so
+        # Ward's update formula is exact; missing values and pattern factors make
+        # it an approximation
+        row_linkage = linkage(row_distances, method='ward')
         row_clusters = fcluster(row_linkage, t=self.n_row_clusters, criterion='maxclust')
         
         # Perform hierarchical clustering on columns
-        col_linkage = linkage(col_dist_matrix, method='ward')
+        col_linkage = linkage(col_distances, method='ward')
         col_clusters = fcluster(col_linkage, t=self.n_col_clusters, criterion='maxclust')
         
         # Store cluster information
@@ -318,6 +260,7 @@ class ComprehensiveMixedBiclustering:
         if self._column_clustering_result is None:
             raise ValueError("Must call fit() first")
         
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(10, 6))
         plt.title('Column Clustering Dendrogram')
         
@@ -457,9 +400,11 @@ class ComprehensiveMixedBiclustering:
                 
                 # Update row distances
                 if block_values.shape[1] > 0:
-                    block_row_dists = pdist(block_values)
                     block_row_indices = [row_to_idx[idx] for idx in block.index]
-                    block_row_dists_square = squareform(block_row_dists)
+                    if np.isnan(block_values).any():
+                        block_row_dists_square = nan_euclidean_square(block_values)
+                    else:
+                        block_row_dists_square = squareform(pdist(block_values))
                     
                     for i, row_i in enumerate(block_row_indices):
                         for j, row_j in enumerate(block_row_indices):
@@ -470,7 +415,7 @@ class ComprehensiveMixedBiclustering:
                 # Update column distances
                 if block_values.shape[0] > 1:
                     corr = np.corrcoef(block_values.T)
-                    corr = np.nan_to_num(corr, 0)
+                    corr = np.nan_to_num(corr, nan=0.0)
                     block_col_indices = [col_to_idx[col] for col in block.columns]
                     
                     for i, col_i in enumerate(block_col_indices):
@@ -498,7 +443,7 @@ class ComprehensiveMixedBiclustering:
                         col1_values = block_values[:, i]
                         for j, col_j in enumerate(block_col_indices[i+1:], i+1):
                             col2_values = block_values[:, j]
-                            unique_vals = np.unique(np.concatenate([col1_values, col2_values]))
+                            unique_vals = pd.unique(np.concatenate([col1_values, col2_values]))
                             dist1 = np.array([(col1_values == val).sum() for val in unique_vals]) / len(col1_values)
                             dist2 = np.array([(col2_values == val).sum() for val in unique_vals]) / len(col2_values)
                             dist = np.sum(np.abs(dist1 - dist2))
@@ -535,6 +480,7 @@ class ComprehensiveMixedBiclustering:
         if self._row_clusters is None or self._col_clusters is None:
             raise ValueError("Must call fit() first")
 
+        import matplotlib.pyplot as plt
         plt.figure(figsize=figsize)
         
         # Create a subplot grid
@@ -552,7 +498,7 @@ class ComprehensiveMixedBiclustering:
         plt.colorbar(im1, ax=ax1, label='Cluster ID')
         
         # Plot 2: Missing value patterns if enabled
-        if self.consider_missing_patterns and self._missing_patterns:
+        if self.consider_missing_patterns and self._missing_patterns is not None:
             missing_matrix = original_data.isna().astype(int)
             im2 = ax2.imshow(missing_matrix, aspect='auto', cmap='RdYlBu')
             ax2.set_title('Missing Value Patterns')
@@ -601,24 +547,25 @@ def compare_block_sorting(original_blocks, sorted_blocks):
 
 
 
-# Create the clusterer with missing pattern detection enabled
-clusterer = ComprehensiveMixedBiclustering(
-    n_row_clusters=3,
-    n_col_clusters=3,
-    consider_missing_patterns=True
-)
+if __name__ == "__main__":
+    # Create the clusterer with missing pattern detection enabled
+    clusterer = ComprehensiveMixedBiclustering(
+        n_row_clusters=3,
+        n_col_clusters=3,
+        consider_missing_patterns=True
+    )
 
-data = pd.read_csv('breast+cancer+wisconsin+diagnostic/wdbc_withHeaders_withEmptyCells.csv')
+    data = pd.read_csv('breast+cancer+wisconsin+diagnostic/wdbc_withHeaders_withEmptyCells.csv')
 
-# Fit the model
-clusterer.fit(data)
+    # Fit the model
+    clusterer.fit(data)
 
-# Get and analyze the blocks
-blocks = clusterer.separate_mixed_type_blocks(data)
-sorted_blocks = clusterer.sort_blocks_globally(blocks)
+    # Get and analyze the blocks
+    blocks = clusterer.separate_mixed_type_blocks(data)
+    sorted_blocks = clusterer.sort_blocks_globally(blocks)
 
-# Visualize the results
-clusterer.visualize_clusters(data)
+    # Visualize the results
+    clusterer.visualize_clusters(data)
 
-# Compare original and sorted blocks
-compare_block_sorting(blocks, sorted_blocks)
\ No newline at end of file
+    # Compare original and sorted blocks
+    compare_block_sorting(blocks, sorted_blocks)
@@ -0,0 +1,140 @@
+from typing import BinaryIO, Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+
+# Rows parsed per chunk, bounds the memory of the parsed (object) values
+DEFAULT_CHUNK_ROWS = 100000
+
+
+class _ColumnState:
+    """Values of one column while a CSV is streamed"""
+
+    def __init__(self, compact: bool = False):
+        self.kind = 'numeric'
+        self.compact = compact
+        self.chunks = []
+        # Category -> code, in order of first appearance
+        self.categories = {}
+
+    def add(self, values: pd.Series):
+        # The parser already inferred the dtype of the chunk: any non-numeric
+        # value leaves it object
+        parsed_numeric = pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype)
+        if self.kind == 'numeric':
+            if parsed_numeric:
+                numbers = _parsed_numbers(values)
+                self.chunks.append(numbers.astype(np.float32) if self.compact else numbers)
+                return
+            self._to_categorical()
+        if parsed_numeric:
+            values = _numbers_to_strings(_parsed_numbers(values))
+        self.chunks.append(self._encode(values))
+
+    def _encode(self, values: pd.Series) -> np.ndarray:
+        """Codes of a chunk in the column's category dictionary, -1 when missing"""
+        codes, uniques = pd.factorize(values)
+        # Categories are kept as text whatever the parser made of them (e.g. booleans).
+        # Code -1 (missing) picks the trailing -1
+        lookup = np.array([self.categories.setdefault(str(value), len(self.categories)) for value in uniques] + [-1],
+                          dtype=np.int32)
+        return lookup[codes]
+
+    def _to_categorical(self):
+        """A non-numeric value appeared: re-encode the chunks parsed as numbers so far"""
+        self.kind = 'categorical'
+        self.chunks = [self._encode(_numbers_to_strings(chunk)) for chunk in self.chunks]
+
+    def finish(self) -> Union[np.ndarray, pd.Categorical]:
+        # The chunks are released as soon as they are joined
+        chunks, self.chunks = self.chunks, []
+        if self.kind == 'numeric':
+            # Integer chunks followed by chunks with missing values join as float64
+            return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float32 if self.compact else np.float64)
+        codes = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32)
+        del chunks
+        # from_codes stores the codes in the smallest integer dtype (int8/int16/int32)
+        return pd.Categorical.from_codes(codes, categories=list(self.categories))
+
+
+def _parsed_numbers(values: pd.Series) -> np.ndarray:
+    """Values of a chunk parsed as numbers: integers in their parsed dtype, the others as float64"""
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.to_numpy()
+    return values.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _numbers_to_strings(numbers: np.ndarray) -> pd.Series:
+    """Render parsed numbers back as text, integral values without a decimal part"""
+    values = pd.Series(numbers)
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.astype(str).astype(object)
+    integral = values.notna() & (values == np.floor(values)) & (values.abs() < 2**53)
+    text = values.astype(str).astype(object)
+    text[integral] = values[integral].astype(np.int64).astype(str)
+    text[values.isna()] = np.nan
+    return text
+
+
+class IngestedCSV:
+    def __init__(self, data: pd.DataFrame, categories: Dict[str, List[str]]):
+        """
+        Result of read_csv_chunked()
+
+        Parameters:
+        -----------
+        data : pd.DataFrame
+            Parsed frame: numeric columns as int64 or float64 (float32 if
+            compact), the others as pandas categoricals
+        categories : Dict[str, List[str]]
+            Category dictionary of every categorical column, codes index into it
+        """
+        self.data = data
+        self.categories = categories
+
+
+@instrumented('parse_csv')
+def read_csv_chunked(source: BinaryIO, chunk_rows: int = DEFAULT_CHUNK_ROWS, compact: bool = False) -> IngestedCSV:
+    """
+    Parse a CSV file in chunks with incremental type inference
+
+    Every column starts out numeric and turns categorical as soon as a chunk
+    holds a value that does not parse as a number; the chunks read so far are
+    then re-encoded, their numbers rendered back as text. Categorical values
+    are kept as integer codes, so memory stays near the size of the encoded
+    matrix rather than of the text or of an object-dtype frame. Numeric values
+    keep the dtype the parser gave them, integers exactly.
+
+    Parameters:
+    -----------
+    source : file-like or path
+        CSV file
+    chunk_rows : int, default 100000
+        Number of rows parsed per chunk
+    compact : bool, default False
+        Store numeric columns as float32, halving their memory. Integers
+        above 2**24 and most decimals are then no longer exact, so this is
+        only for data that is neither displayed nor sent back
+
+    Returns:
+    --------
+    IngestedCSV
+    """
+    states = None
+    columns = None
+    for chunk in pd.read_csv(source, chunksize=chunk_rows):
+        if states is None:
+            columns = chunk.columns
+            states = [_ColumnState(compact) for _ in columns]
+        for state, col in zip(states, columns):
+            state.add(chunk[col])
+
+    if states is None:
+        return IngestedCSV(pd.DataFrame(), {})
+
+    data = pd.DataFrame({col: state.finish() for col, state in zip(columns, states)}, columns=columns, copy=False)
+
+    categories = {col: list(state.categories) for col, state in zip(columns, states) if state.kind == 'categorical'}
+    return IngestedCSV(data, categories)
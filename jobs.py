@@ -0,0 +1,303 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import pandas as pd
+
+from biclustering import MixedTypeBiclustering
+from ingestion import read_csv_chunked
+
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+
+
+class JobNotFoundError(KeyError):
+    """Raised when a job ID is unknown or its record has expired"""
+
+
+class Job:
+    def __init__(self, job_id: str, group: Optional[Hashable], meta: Dict[str, Any]):
+        """
+        State of one submitted job, updated by its JobManager
+
+        Parameters:
+        -----------
+        job_id : str
+            Random hex ID
+        group : Hashable, optional
+            Jobs of the same group replace each other, see JobManager.submit()
+        meta : Dict[str, Any]
+            Caller data returned with every snapshot, e.g. the dataset key
+        """
+        self.id = job_id
+        self.group = group
+        self.meta = meta
+        self.status = 'queued'
+        self.stage: Optional[str] = None
+        self.progress = 0.0
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.finished_at: Optional[float] = None
+        # Incremented on every change, so that watchers can wait for the next one
+        self.version = 0
+        self._process: Optional[multiprocessing.Process] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Serializable state of the job, without its result"""
+        return {'job_id': self.id, 'status': self.status, 'stage': self.stage, 'progress': self.progress,
+                'error': self.error, **self.meta}
+
+
+def _run_job(conn, func: Callable, args: tuple):
+    """Entry point of a worker process: run one job, sending progress and the outcome through ``conn``"""
+    def report(stage: str, progress: Optional[float] = None):
+        conn.send(('progress', stage, progress))
+
+    try:
+        conn.send(('done', func(*args, report=report)))
+    except Exception as e:
+        conn.send(('failed', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+
+class JobManager:
+    def __init__(self, max_workers: Optional[int] = None, ttl_seconds: float = 600,
+                 start_method: str = 'forkserver'):
+        """
+        Run jobs in worker processes, at most ``max_workers`` at a time
+
+        Every job gets a process of its own, so cancelling a running job
+        terminates it and frees its CPU right away. Jobs past the limit wait
+        in the 'queued' state. The default 'forkserver' start method forks
+        workers from a single-threaded server that has already imported this
+        module (and with it numpy, pandas, sklearn and the clustering code),
+        which is safe next to the threads of the web server and numba, and
+        starts workers faster than 'spawn'. The numba kernels are not run
+        there, as the workers would be forked from a process with a numba
+        thread pool; each worker loads them from numba's on-disk cache.
+
+        Parameters:
+        -----------
+        max_workers : int, optional
+            Concurrent worker processes, os.cpu_count() by default
+        ttl_seconds : float, default 600
+            How long finished jobs, with their results, can still be queried
+        start_method : str, default 'forkserver'
+            multiprocessing start method of the workers
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.ttl_seconds = ttl_seconds
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver':
+            # sklearn is otherwise only imported on first use, i.e. once per job
+            self._context.set_forkserver_preload([__name__, 'sklearn.preprocessing'])
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._jobs: Dict[str, Job] = {}
+        self._groups: Dict[Hashable, str] = {}
+        self._changed = threading.Condition()
+
+    def submit(self, func: Callable, *args, group: Optional[Hashable] = None, meta: Optional[Dict[str, Any]] = None,
+               on_done: Optional[Callable[[Job], None]] = None,
+               on_finish: Optional[Callable[[Job], None]] = None) -> Job:
+        """
+        Queue ``func(*args, report=...)`` for a worker process
+
+        ``func`` must be importable by the workers (a module-level function)
+        and its arguments and result picklable. It may call
+        ``report(stage, progress)`` to publish its current stage and a
+        completion fraction.
+
+        Parameters:
+        -----------
+        func : Callable
+            Job function
+        *args
+            Its positional arguments
+        group : Hashable, optional
+            A queued or running job of the same group, e.g. the same client
+            session, is cancelled: its result would be stale anyway
+        meta : Dict[str, Any], optional
+            Included in the job's snapshots
+        on_done : Callable[[Job], None], optional
+            Called in the manager's thread with the job once it succeeded,
+            before its state becomes 'done'
+        on_finish : Callable[[Job], None], optional
+            Called with the job once it finished, whatever the outcome, e.g.
+            to remove its temporary files
+
+        Returns:
+        --------
+        Job
+        """
+        job = Job(uuid.uuid4().hex, group, meta or {})
+        with self._changed:
+            self._expire()
+            previous = self._groups.get(group) if group is not None else None
+            self._jobs[job.id] = job
+            if group is not None:
+                self._groups[group] = job.id
+        if previous is not None:
+            self.cancel(previous)
+
+        threading.Thread(target=self._execute, args=(job, func, args, on_done, on_finish), daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._changed:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFoundError(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a queued or running job, terminating its worker; finished jobs are left as they are"""
+        job = self.get(job_id)
+        with self._changed:
+            if job.finished:
+                return job
+            self._update(job, status='cancelled')
+            process = job._process
+        if process is not None and process.is_alive():
+            process.terminate()
+        return job
+
+    def wait(self, job: Job, version: int, timeout: Optional[float] = None) -> bool:
+        """Wait until the job changed past ``version``; returns False on timeout"""
+        with self._changed:
+            return self._changed.wait_for(lambda: job.version > version, timeout)
+
+    def _update(self, job: Job, **changes):
+        """Apply changes to a job and wake its watchers; the caller holds self._changed"""
+        for name, value in changes.items():
+            setattr(job, name, value)
+        if job.finished and job.finished_at is None:
+            job.finished_at = time.monotonic()
+        job.version += 1
+        self._changed.notify_all()
+
+    def _expire(self):
+        """Forget finished jobs older than the TTL; the caller holds self._changed"""
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and now - job.finished_at > self.ttl_seconds]:
+            job = self._jobs.pop(job_id)
+            if self._groups.get(job.group) == job_id:
+                del self._groups[job.group]
+
+    def _execute(self, job: Job, func: Callable, args: tuple, on_done, on_finish):
+        try:
+            with self._slots:
+                self._run(job, func, args, on_done)
+        except Exception as e:
+            # E.g. unpicklable arguments or no worker could be started
+            with self._changed:
+                if not job.finished:
+                    self._update(job, status='failed', error=f'{type(e).__name__}: {e}')
+        finally:
+            if on_finish is not None:
+                on_finish(job)
+
+    def _run(self, job: Job, func: Callable, args: tuple, on_done):
+        receiver, sender = self._context.Pipe(duplex=False)
+        with self._changed:
+            if job.finished:
+                return
+            job._process = self._context.Process(target=_run_job, args=(sender, func, args), daemon=True)
+            self._update(job, status='running')
+        # Outside the lock, as the arguments are pickled to the worker here
+        job._process.start()
+        sender.close()
+        with self._changed:
+            if job.finished:
+                # Cancelled while starting
+                job._process.terminate()
+
+        outcome = None
+        while True:
+            try:
+                message = receiver.recv()
+            except EOFError:
+                # The worker exited, normally after its outcome or because it was terminated
+                break
+            if message[0] == 'progress':
+                with self._changed:
+                    if not job.finished:
+                        self._update(job, stage=message[1], progress=job.progress if message[2] is None else message[2])
+            else:
+                outcome = message
+        receiver.close()
+        job._process.join()
+
+        if outcome is not None and outcome[0] == 'done' and not job.finished:
+            job.result = outcome[1]
+            if on_done is not None:
+                try:
+                    on_done(job)
+                except Exception as e:
+                    outcome = ('failed', f'{type(e).__name__}: {e}')
+        with self._changed:
+            if job.finished or outcome is None or outcome[0] != 'done':
+                # Cancelled meanwhile, or failed: no result is kept
+                job.result = None
+            if job.finished:
+                pass
+            elif outcome is None:
+                self._update(job, status='failed', error=f'Worker exited with code {job._process.exitcode}')
+            elif outcome[0] == 'done':
+                self._update(job, status='done', progress=1.0)
+            else:
+                self._update(job, status='failed', error=outcome[1])
+            job._process = None
+
+
+def clustering_job(source: Any, model: Optional[MixedTypeBiclustering], model_params: Dict[str, Any],
+                   row_clusters: int, col_clusters: int, mode: str, report: Callable):
+    """
+    Fit (unless given a fitted model), cut and sort a biclustering in a worker process
+
+    Parameters:
+    -----------
+    source : pd.DataFrame or str
+        The data, or the path of a CSV file to parse
+    model : MixedTypeBiclustering, optional
+        Model already fitted on the data
+    model_params : Dict[str, Any]
+        MixedTypeBiclustering arguments when fitting
+    row_clusters, col_clusters : int
+        Cluster counts to cut at
+    mode : str
+        'indices' for the block layout, anything else for the sorted blocks
+    report : Callable
+        Progress callback of the job
+
+    Returns:
+    --------
+    Tuple of (the data if it was parsed here else None, the model, the layout or blocks)
+    """
+    data = source
+    if not isinstance(source, pd.DataFrame):
+        report('loading', 0.0)
+        data = read_csv_chunked(source).data
+    if model is None:
+        report('fitting', 0.1)
+        model = MixedTypeBiclustering(**model_params).fit(data)
+
+    report('cutting', 0.7)
+    model.recut(row_clusters, col_clusters)
+    if mode == 'indices':
+        report('layout', 0.8)
+        result = model.sorted_block_layout(data)
+    else:
+        report('separating', 0.8)
+        blocks = model.separate_mixed_type_blocks(data)
+        report('sorting', 0.9)
+        result = model.sort_blocks_globally(blocks)
+    return (data if data is not source else None), model, result
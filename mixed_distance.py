@@ -0,0 +1,567 @@
+import numba
+import numpy as np
+import pandas as pd
+from numba import njit, prange
+from typing import TYPE_CHECKING, Optional, Union
+
+if TYPE_CHECKING:
+    from encoded_table import EncodedTable
+
+# Categorical columns with at most this many categories are compared through a
+# one-hot matrix product; wider columns are compared code-by-code instead.
+ONE_HOT_MAX_CATEGORIES = 64
+
+BACKENDS = ('numpy', 'numba')
+
+# Rows per tile of the compiled kernel, small enough that a row tile and a
+# column tile stay resident in L1/L2
+KERNEL_TILE = 64
+
+# Distance multipliers for rows with the same / a different missing-value pattern
+PATTERN_MATCH_FACTOR = 0.5
+PATTERN_MISMATCH_FACTOR = 2.0
+
+
+@njit(cache=True)
+def _condensed_offset(n: int, i: int) -> int:
+    """Position of pair (i, 0) in a condensed vector, so pair (i, j > i) is at offset + j"""
+    return n * i - i * (i + 1) // 2 - i - 1
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def _mixed_distance_kernel(numeric: np.ndarray, categorical: np.ndarray, pattern_ids: np.ndarray,
+                           out: np.ndarray, tile: int):
+    """
+    Fill the condensed vector ``out`` with pairwise mixed distances, one pair
+    of row tiles per task
+
+    Tile ``t`` is processed together with tile ``n_tiles - 1 - t`` so every task
+    covers roughly the same share of the upper triangle. When ``pattern_ids``
+    is not empty, each distance is scaled by the pattern factor in the same pass.
+    """
+    n = numeric.shape[0]
+    use_patterns = pattern_ids.shape[0] > 0
+    n_numeric = numeric.shape[1]
+    n_categorical = categorical.shape[1]
+    n_tiles = (n + tile - 1) // tile
+
+    for task in prange((n_tiles + 1) // 2):
+        for side in range(2):
+            t = task if side == 0 else n_tiles - 1 - task
+            if side == 1 and t == task:
+                break
+            i0 = t * tile
+            i1 = min(i0 + tile, n)
+            # Walk the columns in tiles as well so the row tile stays in cache
+            for j0 in range(i0, n, tile):
+                j1 = min(j0 + tile, n)
+                for i in range(i0, i1):
+                    offset = _condensed_offset(n, i)
+                    for j in range(max(j0, i + 1), j1):
+                        dist = 0.0
+                        for k in range(n_numeric):
+                            a = numeric[i, k]
+                            b = numeric[j, k]
+                            if np.isnan(a) or np.isnan(b):
+                                dist += 1.0
+                            else:
+                                dist += (a - b) * (a - b)
+                        for k in range(n_categorical):
+                            code = categorical[i, k]
+                            if code < 0 or code != categorical[j, k]:
+                                dist += 1.0
+                        dist = np.sqrt(dist)
+                        if use_patterns:
+                            if pattern_ids[i] == pattern_ids[j]:
+                                dist *= PATTERN_MATCH_FACTOR
+                            else:
+                                dist *= PATTERN_MISMATCH_FACTOR
+                        out[offset + j] = dist
+
+
+class MixedDistanceEngine:
+    def __init__(self,
+                 numeric: Optional[np.ndarray] = None,
+                 categorical: Optional[np.ndarray] = None,
+                 block_size: int = 1024,
+                 backend: str = 'numpy',
+                 dtype: type = np.float64,
+                 pattern_ids: Optional[np.ndarray] = None):
+        """
+        Vectorized distance engine for mixed numeric/categorical data
+
+        The distance between two rows is
+        sqrt(sum of squared numeric differences + number of categorical mismatches),
+        where a missing value on either side (NaN for numerics, a negative code
+        for categoricals) contributes 1.0. With ``pattern_ids`` it is then
+        multiplied by PATTERN_MATCH_FACTOR for rows sharing a missing-value
+        pattern and by PATTERN_MISMATCH_FACTOR otherwise.
+
+        Parameters:
+        -----------
+        numeric : np.ndarray, optional
+            (n_samples, n_numeric) block of standardized numeric values
+        categorical : np.ndarray, optional
+            (n_samples, n_categorical) block of integer category codes
+        block_size : int, default 1024
+            Number of rows processed per tile, bounds temporary memory
+        backend : str, default 'numpy'
+            'numpy' for BLAS matrix products, 'numba' for the parallel
+            compiled kernel (uses NUMBA_NUM_THREADS threads)
+        dtype : type, default np.float64
+            Output dtype, np.float32 halves the size of the result
+        pattern_ids : np.ndarray, optional
+            Integer missing-value pattern ID of every row
+        """
+        if numeric is None and categorical is None:
+            raise ValueError("At least one of numeric or categorical must be given")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+        n_samples = (numeric if numeric is not None else categorical).shape[0]
+        if numeric is None:
+            numeric = np.empty((n_samples, 0))
+        if categorical is None:
+            categorical = np.empty((n_samples, 0), dtype=np.int64)
+
+        self.numeric = np.ascontiguousarray(numeric, dtype=np.float64)
+        self.categorical = np.ascontiguousarray(categorical, dtype=np.int64)
+        self.n_samples = n_samples
+        self.pattern_ids = None if pattern_ids is None else np.ascontiguousarray(pattern_ids, dtype=np.int64)
+        self.block_size = block_size
+        self.backend = backend
+        self.dtype = np.dtype(dtype)
+        if backend == 'numpy':
+            self._prepare()
+
+    @classmethod
+    def from_array(cls, X: np.ndarray, column_types: Optional[np.ndarray] = None,
+                   **kwargs) -> 'MixedDistanceEngine':
+        """
+        Build an engine from a preprocessed matrix and a numeric column mask
+
+        Parameters:
+        -----------
+        X : np.ndarray
+            Input data matrix, categorical columns already label encoded
+        column_types : np.ndarray, optional
+            Boolean mask, True for numeric columns. All columns are treated
+            as numeric when omitted.
+
+        Returns:
+        --------
+        MixedDistanceEngine
+        """
+        if column_types is None:
+            column_types = np.ones(X.shape[1], dtype=bool)
+        column_types = np.asarray(column_types, dtype=bool)
+
+        numeric = X[:, column_types].astype(np.float64)
+        categorical = X[:, ~column_types]
+        if not np.issubdtype(categorical.dtype, np.integer):
+            categorical = np.column_stack(
+                [pd.factorize(categorical[:, k])[0] for k in range(categorical.shape[1])]
+            ) if categorical.shape[1] > 0 else categorical.astype(np.int64)
+
+        return cls(numeric, categorical, **kwargs)
+
+    @classmethod
+    def from_table(cls, table: 'EncodedTable', **kwargs) -> 'MixedDistanceEngine':
+        """
+        Build an engine from the typed blocks of an encoded_table.EncodedTable
+
+        Parameters:
+        -----------
+        table : EncodedTable
+            Preprocessed data
+
+        Returns:
+        --------
+        MixedDistanceEngine
+        """
+        return cls(table.numeric, table.codes, **kwargs)
+
+    def _prepare(self):
+        """Precompute the per-row terms reused by every tile"""
+        # Numeric block: zero-filled values plus an observed mask, so that
+        # missing entries drop out of the matrix products
+        self._numeric_mask = ~np.isnan(self.numeric)
+        self._has_missing_numeric = not self._numeric_mask.all()
+        self._numeric_filled = np.where(self._numeric_mask, self.numeric, 0.0)
+        self._numeric_squared = self._numeric_filled ** 2
+        self._numeric_norms = self._numeric_squared.sum(axis=1)
+        self._numeric_observed = self._numeric_mask.astype(np.float64)
+
+        # Categorical block: low-cardinality columns go through a one-hot
+        # matrix product, the rest are compared directly
+        one_hot_parts = []
+        self._wide_columns = []
+        for k in range(self.categorical.shape[1]):
+            codes = self.categorical[:, k]
+            n_categories = int(codes.max()) + 1 if codes.size else 0
+            if n_categories <= ONE_HOT_MAX_CATEGORIES:
+                one_hot = np.zeros((self.n_samples, max(n_categories, 1)))
+                valid = codes >= 0
+                one_hot[np.flatnonzero(valid), codes[valid]] = 1.0
+                one_hot_parts.append(one_hot)
+            else:
+                self._wide_columns.append(k)
+
+        self._one_hot = np.hstack(one_hot_parts) if one_hot_parts else None
+
+    def _squared_tile(self, rows_a: slice, rows_b: slice) -> np.ndarray:
+        """
+        Squared mixed distances between two row ranges
+
+        Parameters:
+        -----------
+        rows_a : slice
+            First range of rows
+        rows_b : slice
+            Second range of rows
+
+        Returns:
+        --------
+        np.ndarray
+            (len(rows_a), len(rows_b)) matrix of squared distances
+        """
+        n_numeric = self.numeric.shape[1]
+        n_categorical = self.categorical.shape[1]
+
+        a = self._numeric_filled[rows_a]
+        b = self._numeric_filled[rows_b]
+        if self._has_missing_numeric:
+            # sum_k m_ik m_jk (x_ik - x_jk)^2 plus one per column missing on either side
+            mask_a = self._numeric_observed[rows_a]
+            mask_b = self._numeric_observed[rows_b]
+            tile = self._numeric_squared[rows_a] @ mask_b.T
+            tile += mask_a @ self._numeric_squared[rows_b].T
+            tile -= 2.0 * (a @ b.T)
+            tile += n_numeric - mask_a @ mask_b.T
+        else:
+            # ||a||^2 + ||b||^2 - 2ab
+            tile = -2.0 * (a @ b.T)
+            tile += self._numeric_norms[rows_a][:, None]
+            tile += self._numeric_norms[rows_b][None, :]
+        np.maximum(tile, 0.0, out=tile)
+
+        if n_categorical > 0:
+            matches = np.zeros_like(tile)
+            if self._one_hot is not None:
+                matches += self._one_hot[rows_a] @ self._one_hot[rows_b].T
+            for k in self._wide_columns:
+                codes_a = self.categorical[rows_a, k]
+                codes_b = self.categorical[rows_b, k]
+                matches += (codes_a[:, None] == codes_b[None, :]) & (codes_a >= 0)[:, None]
+            tile += n_categorical - matches
+
+        return tile
+
+    def tile(self, rows_a: slice, rows_b: slice) -> np.ndarray:
+        """
+        Mixed distances between two row ranges, pattern factors applied
+
+        Uses the matrix products of the numpy backend whatever ``backend`` is.
+
+        Parameters:
+        -----------
+        rows_a : slice
+            First range of rows
+        rows_b : slice
+            Second range of rows
+
+        Returns:
+        --------
+        np.ndarray
+            (len(rows_a), len(rows_b)) distance matrix
+        """
+        if not hasattr(self, '_numeric_mask'):
+            self._prepare()
+        tile = np.sqrt(self._squared_tile(rows_a, rows_b))
+        if self.pattern_ids is not None:
+            same_pattern = self.pattern_ids[rows_a, None] == self.pattern_ids[None, rows_b]
+            tile *= np.where(same_pattern, PATTERN_MATCH_FACTOR, PATTERN_MISMATCH_FACTOR)
+        return tile
+
+    def embedding(self) -> np.ndarray:
+        """
+        Euclidean embedding of the mixed metric
+
+        Concatenates the numeric block with a one-hot encoding of every
+        categorical column scaled by 1/sqrt(2): two one-hot rows that differ
+        in one column are sqrt(2) apart, so the Euclidean distance between
+        embedded rows equals the mixed distance. This is what makes Ward
+        linkage on the condensed mixed distances a true Ward clustering.
+
+        Only exact without missing values. A missing numeric value is NaN
+        here. A missing category (negative code) embeds as all zeros, so it
+        contributes 0.5 to the squared distance against a present category
+        and 0 against another missing one, where the metric counts 1 for
+        both. Ward linkage over data with missing values is therefore an
+        approximation.
+
+        Returns:
+        --------
+        np.ndarray
+            (n_samples, n_numeric + total categories) feature matrix
+        """
+        parts = [self.numeric]
+        for k in range(self.categorical.shape[1]):
+            codes = self.categorical[:, k]
+            valid = codes >= 0
+            one_hot = np.zeros((self.n_samples, int(codes.max()) + 1 if valid.any() else 1))
+            one_hot[np.flatnonzero(valid), codes[valid]] = 1 / np.sqrt(2)
+            parts.append(one_hot)
+        return np.hstack(parts)
+
+    def condensed(self, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Compute the pairwise distances in condensed form
+
+        Only the upper triangle is ever computed or stored, so peak memory is
+        n * (n - 1) / 2 values of ``dtype`` plus one tile of temporaries.
+
+        Parameters:
+        -----------
+        out : np.ndarray, optional
+            Preallocated vector of n * (n - 1) / 2 values of ``dtype`` to fill,
+            e.g. a memory map from scratch.scratch_array(); tiles are written
+            into it as they are computed
+
+        Returns:
+        --------
+        np.ndarray
+            Condensed distance vector, as returned by scipy's pdist
+        """
+        n = self.n_samples
+        if out is None:
+            distances = np.empty(n * (n - 1) // 2, dtype=self.dtype)
+        elif out.shape != (n * (n - 1) // 2,) or out.dtype != self.dtype:
+            raise ValueError(f"out must be a vector of {n * (n - 1) // 2} {self.dtype} values")
+        else:
+            distances = out
+
+        if self.backend == 'numba':
+            pattern_ids = self.pattern_ids if self.pattern_ids is not None else np.empty(0, dtype=np.int64)
+            _mixed_distance_kernel(self.numeric, self.categorical, pattern_ids, distances, KERNEL_TILE)
+            return distances
+
+        for start in range(0, n, self.block_size):
+            rows_a = slice(start, min(start + self.block_size, n))
+            # Only tiles on or above the diagonal are computed
+            for other in range(start, n, self.block_size):
+                stop = min(other + self.block_size, n)
+                tile = self.tile(rows_a, slice(other, stop))
+                for i in range(rows_a.start, rows_a.stop):
+                    first = max(other, i + 1)
+                    if first < stop:
+                        offset = _condensed_offset(n, i)
+                        distances[offset + first:offset + stop] = tile[i - start, first - other:]
+
+        return distances
+
+
+def condensed_mixed_distance(X: Union[np.ndarray, 'EncodedTable'], column_types: Optional[np.ndarray] = None,
+                             out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    """
+    Compute the condensed mixed-type distance vector of a preprocessed array
+
+    Parameters:
+    -----------
+    X : np.ndarray or EncodedTable
+        Input data matrix, categorical columns already label encoded, or an
+        encoded_table.EncodedTable whose typed blocks are used as they are
+    column_types : np.ndarray, optional
+        Boolean mask, True for numeric columns. All columns are treated as
+        numeric when omitted. Ignored for an EncodedTable.
+    out : np.ndarray, optional
+        Preallocated output vector, see MixedDistanceEngine.condensed()
+    **kwargs
+        Forwarded to MixedDistanceEngine (block_size, backend, dtype, pattern_ids)
+
+    Returns:
+    --------
+    np.ndarray
+        Condensed distance vector
+    """
+    if isinstance(X, np.ndarray):
+        return MixedDistanceEngine.from_array(X, column_types, **kwargs).condensed(out)
+    return MixedDistanceEngine.from_table(X, **kwargs).condensed(out)
+
+
+def concurrent_kernels_supported() -> bool:
+    """
+    Whether the parallel numba kernels may run on several threads at once
+
+    True with the 'tbb' and 'omp' threading layers. numba's fallback
+    'workqueue' layer aborts the process when two threads launch parallel
+    kernels concurrently, so callers then stay sequential.
+    """
+    try:
+        layer = numba.threading_layer()
+    except ValueError:
+        # The layer is chosen on the first parallel launch
+        condensed_mixed_distance(np.zeros((2, 1)), backend='numba')
+        layer = numba.threading_layer()
+    return layer != 'workqueue'
+
+
+def square_from_condensed(condensed: np.ndarray, order: Optional[np.ndarray] = None,
+                          diagonal: float = 0.0, block_size: int = 64,
+                          out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Materialize a square matrix from a condensed vector, optionally reordered
+
+    The result is built in row blocks straight from the condensed vector, so
+    no unordered square copy is created on the way.
+
+    Parameters:
+    -----------
+    condensed : np.ndarray
+        Condensed vector of n * (n - 1) / 2 values
+    order : np.ndarray, optional
+        Permutation applied to both rows and columns
+    diagonal : float, default 0.0
+        Value written on the diagonal (1.0 for similarities)
+    block_size : int, default 64
+        Number of output rows gathered per step, bounds the index temporaries
+    out : np.ndarray, optional
+        Preallocated (n, n) matrix to fill, e.g. a memory map from
+        scratch.scratch_array()
+
+    Returns:
+    --------
+    np.ndarray
+        (n, n) matrix with the dtype of ``condensed``
+    """
+    n = int(round((1 + np.sqrt(1 + 8 * len(condensed))) / 2))
+    if order is None:
+        order = np.arange(n)
+    order = np.asarray(order, dtype=np.int64)
+
+    square = np.empty((n, n), dtype=condensed.dtype) if out is None else out
+    if n < 2:
+        # Nothing to gather from an empty condensed vector
+        square.fill(diagonal)
+        return square
+    for start in range(0, n, block_size):
+        rows = order[start:start + block_size, None]
+        i = np.minimum(rows, order[None, :])
+        j = np.maximum(rows, order[None, :])
+        index = n * i - i * (i + 1) // 2 + j - i - 1
+        diagonal_mask = i == j
+        index[diagonal_mask] = 0
+        block = condensed[index]
+        block[diagonal_mask] = diagonal
+        square[start:start + block_size] = block
+
+    return square
+
+
+def condensed_from_square(square: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Upper triangle of a square matrix in condensed form, copied row by row
+
+    Unlike scipy's squareform, the input can be a memory map much larger than
+    RAM: only one row is read at a time, and the result can go to a
+    preallocated (memory-mapped) vector as well.
+
+    Parameters:
+    -----------
+    square : np.ndarray
+        (n, n) symmetric matrix
+    out : np.ndarray, optional
+        Preallocated vector of n * (n - 1) / 2 values
+
+    Returns:
+    --------
+    np.ndarray
+        Condensed vector with the dtype of ``square``
+    """
+    n = square.shape[0]
+    condensed = np.empty(n * (n - 1) // 2, dtype=square.dtype) if out is None else out
+    for i in range(n - 1):
+        offset = _condensed_offset(n, i)
+        condensed[offset + i + 1:offset + n] = square[i, i + 1:]
+    return condensed
+
+
+def nan_euclidean_square(values: np.ndarray) -> np.ndarray:
+    """
+    Square Euclidean distances between rows with missing values
+
+    As in sklearn's nan_euclidean_distances, a pair of rows sums over the
+    columns both have and is scaled up by n_columns / n_shared. Rows sharing
+    no column get the largest distance found.
+
+    Parameters:
+    -----------
+    values : np.ndarray
+        (n_rows, n_columns) numeric values, NaN when missing
+
+    Returns:
+    --------
+    np.ndarray
+        (n_rows, n_rows) float64 matrix
+    """
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0)
+    mask = present.astype(np.float64)
+    squares = filled * filled
+    # sum_k m_ik m_jk (x_ik - x_jk)^2 from three matrix products
+    sums = squares @ mask.T + mask @ squares.T - 2 * filled @ filled.T
+    shared = mask @ mask.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distances = np.sqrt(np.clip(sums, 0, None) * values.shape[1] / shared)
+    undefined = shared == 0
+    if undefined.any():
+        distances[undefined] = np.max(distances[~undefined], initial=0.0)
+    np.fill_diagonal(distances, 0)
+    return distances
+
+
+def nearest_prototypes(numeric: np.ndarray, categorical: np.ndarray,
+                       centers: np.ndarray, modes: np.ndarray,
+                       chunk_size: int = 65536) -> np.ndarray:
+    """
+    Assign rows to the closest prototype under the mixed metric
+
+    Prototypes are k-prototypes style: the mean of the numeric columns and the
+    mode of the categorical columns of each cluster. Rows are streamed in
+    chunks, so memory stays at O(chunk_size * n_prototypes).
+
+    Parameters:
+    -----------
+    numeric : np.ndarray
+        (n_samples, n_numeric) numeric block, may contain NaN
+    categorical : np.ndarray
+        (n_samples, n_categorical) integer code block, negative codes are missing
+    centers : np.ndarray
+        (n_prototypes, n_numeric) numeric means
+    modes : np.ndarray
+        (n_prototypes, n_categorical) categorical modes
+    chunk_size : int, default 65536
+        Number of rows assigned per step
+
+    Returns:
+    --------
+    np.ndarray
+        Index of the nearest prototype for every row
+    """
+    n_samples = numeric.shape[0]
+    labels = np.empty(n_samples, dtype=np.int64)
+
+    for start in range(0, n_samples, chunk_size):
+        rows = slice(start, min(start + chunk_size, n_samples))
+        chunk_numeric = np.asarray(numeric[rows], dtype=np.float64)
+        chunk_categorical = np.asarray(categorical[rows])
+
+        squared = np.empty((chunk_numeric.shape[0], len(centers)))
+        for c in range(len(centers)):
+            diff = (chunk_numeric - centers[c]) ** 2
+            squared[:, c] = np.where(np.isnan(diff), 1.0, diff).sum(axis=1)
+            squared[:, c] += ((chunk_categorical != modes[c]) | (chunk_categorical < 0)).sum(axis=1)
+        labels[rows] = np.argmin(squared, axis=1)
+
+    return labels
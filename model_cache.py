@@ -0,0 +1,198 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def content_hash(content: bytes) -> str:
+    """
+    Hash the raw bytes of an uploaded file
+
+    Parameters:
+    -----------
+    content : bytes
+        File content
+
+    Returns:
+    --------
+    str
+        Hex digest used as the cache key of the dataset
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def stream_content_hash(stream: BinaryIO, block_size: int = 2**20) -> str:
+    """
+    Hash a seekable file object block by block, without holding its content
+
+    Gives the same digest as content_hash() on the full content and leaves
+    the stream at its start.
+
+    Parameters:
+    -----------
+    stream : BinaryIO
+        Seekable file object, e.g. the spooled file of an upload
+    block_size : int, default 1 MiB
+        Bytes read at a time
+
+    Returns:
+    --------
+    str
+        Hex digest used as the cache key of the dataset
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(block_size), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def frame_hash(data: pd.DataFrame) -> str:
+    """
+    Hash the content of a DataFrame: column names, dtypes and values
+
+    Parameters:
+    -----------
+    data : pd.DataFrame
+        Frame to hash, the index is ignored
+
+    Returns:
+    --------
+    str
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in data.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def estimate_nbytes(value: Any, _seen: Optional[set] = None) -> int:
+    """
+    Estimate the memory held by a cached value
+
+    Counts numpy arrays and pandas objects reachable through dicts, lists,
+    tuples and object attributes; everything else is ignored.
+
+    Parameters:
+    -----------
+    value : Any
+        Object to measure
+
+    Returns:
+    --------
+    int
+        Approximate size in bytes
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if isinstance(value, np.memmap):
+        # File-backed (see scratch.scratch_array), pages are reclaimable
+        return 0
+    if isinstance(value, np.ndarray):
+        # Views share memory with their base, which is counted once
+        if isinstance(value.base, np.ndarray):
+            return estimate_nbytes(value.base, _seen)
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v, _seen) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(v, _seen) for v in value)
+    if hasattr(value, '__dict__'):
+        return estimate_nbytes(vars(value), _seen)
+    return 0
+
+
+class LRUCache:
+    def __init__(self, max_bytes: int, on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        """
+        Thread-safe least-recently-used cache bounded by a memory budget
+
+        Parameters:
+        -----------
+        max_bytes : int
+            Total size of the cached values, as estimated by estimate_nbytes
+        on_evict : Callable, optional
+            Called with (key, value) for every entry dropped from the cache
+        """
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value, or None, marking it as most recently used"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any, nbytes: Optional[int] = None):
+        """
+        Insert a value, evicting least recently used entries to stay in budget
+
+        A value larger than the whole budget is not cached, and the entry it
+        would have replaced is evicted, even if it is the same object.
+
+        Parameters:
+        -----------
+        key : Hashable
+            Cache key
+        value : Any
+            Value to store
+        nbytes : int, optional
+            Size of the value, estimated when omitted
+        """
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                previous = self._pop(key)
+                # Re-putting the same object keeps it, unless it no longer fits
+                if previous is not value or nbytes > self.max_bytes:
+                    evicted.append((key, previous))
+            if nbytes <= self.max_bytes:
+                self._entries[key] = value
+                self._sizes[key] = nbytes
+                self._total_bytes += nbytes
+                while self._total_bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    evicted.append((oldest, self._pop(oldest)))
+
+        # Callbacks run outside the lock, they may be slow (file cleanup)
+        if self.on_evict is not None:
+            for evicted_key, evicted_value in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def _pop(self, key: Hashable) -> Any:
+        self._total_bytes -= self._sizes.pop(key)
+        return self._entries.pop(key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
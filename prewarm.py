@@ -0,0 +1,95 @@
+import io
+import logging
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from biclustering import ROW_STRATEGIES, MixedTypeBiclustering
+from ingestion import read_csv_chunked
+from mixed_distance import concurrent_kernels_supported
+from scratch import release_scratch
+from seriation import SERIATION_METHODS
+from similarity_matrix_mixed_clustering import AXES, OptimizedDualSimilarityMatrix
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_ROWS = 64
+
+
+def _sample_csv(n_rows: int = WARM_UP_ROWS) -> bytes:
+    """A small mixed-type CSV with missing values in both kinds of columns"""
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        'x': rng.standard_normal(n_rows),
+        'y': rng.standard_normal(n_rows),
+        'a': rng.choice(['p', 'q', 'r'], n_rows),
+        'b': rng.choice(['s', 't'], n_rows),
+    })
+    data.loc[rng.random(n_rows) < 0.1, 'x'] = np.nan
+    data.loc[rng.random(n_rows) < 0.1, 'a'] = np.nan
+    return data.to_csv(index=False).encode()
+
+
+def warm_up(scratch_dir: Optional[str] = None) -> float:
+    """
+    Run the request paths once on a small generated CSV
+
+    numba compiles a kernel for the argument types of its first call, or
+    loads that compilation from its on-disk cache, and does so again in
+    every new process. Parsing the sample like an upload and clustering it
+    with every row strategy and seriation method, as /get_clusters and
+    /get_vsm do, gets all kernels ready for the first request. It also
+    imports sklearn, which the modules only import on first use.
+
+    Parameters:
+    -----------
+    scratch_dir : str, optional
+        The server's scratch directory, so that memory-mapped outputs are
+        covered as well
+
+    Returns:
+    --------
+    float
+        Seconds taken
+    """
+    start = time.perf_counter()
+    data = read_csv_chunked(io.BytesIO(_sample_csv())).data
+
+    for row_strategy in ROW_STRATEGIES:
+        model = MixedTypeBiclustering(row_strategy=row_strategy, sample_size=WARM_UP_ROWS // 2,
+                                      ordering='hierarchical', scratch_dir=scratch_dir).fit(data)
+        model.sorted_block_layout(data)
+        model.sort_blocks_globally(model.separate_mixed_type_blocks(data))
+        release_scratch(model)
+
+    for seriation in SERIATION_METHODS:
+        vsm = OptimizedDualSimilarityMatrix(data, scratch_dir=scratch_dir, seriation=seriation)
+        for axis in AXES:
+            vsm.coarsened_matrix(axis)
+        vsm.release()
+
+    elapsed = time.perf_counter() - start
+    logger.info('Warm-up took %.2f s', elapsed)
+    return elapsed
+
+
+def warm_up_in_background(scratch_dir: Optional[str] = None) -> Optional[threading.Thread]:
+    """
+    Start warm_up() on a daemon thread, e.g. at worker boot
+
+    numba's threading layer is started from the calling thread first: with
+    the tbb layer, a process whose first parallel kernel ran on a thread that
+    has exited since hangs on exit. With the 'workqueue' layer, two threads
+    launching parallel kernels at once abort the process, so the warm-up then
+    runs synchronously, before any request can be served, and None is
+    returned.
+    """
+    if not concurrent_kernels_supported():
+        warm_up(scratch_dir)
+        return None
+    thread = threading.Thread(target=warm_up, args=(scratch_dir,), name='warm-up', daemon=True)
+    thread.start()
+    return thread
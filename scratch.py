@@ -0,0 +1,82 @@
+import os
+import tempfile
+from typing import Any, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+def scratch_array(shape: Union[int, Tuple[int, ...]], dtype: type = np.float64,
+                  scratch_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Allocate a zero-filled array, backed by a file when a scratch directory is given
+
+    With ``scratch_dir`` the array is an np.memmap over a new file in that
+    directory: pages are written back to disk and dropped under memory
+    pressure, so matrices larger than RAM can be filled tile by tile. The file
+    is kept until release_scratch() is called on the array (or on an object
+    holding it).
+
+    Parameters:
+    -----------
+    shape : int or tuple
+        Shape of the array
+    dtype : type, default np.float64
+        Element type
+    scratch_dir : str, optional
+        Directory of the backing file, created if needed; an in-memory array
+        is returned when omitted
+
+    Returns:
+    --------
+    np.ndarray
+    """
+    if scratch_dir is None:
+        return np.zeros(shape, dtype=dtype)
+    os.makedirs(scratch_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=scratch_dir, prefix='matrix-', suffix='.mmap')
+    os.close(fd)
+    if np.prod(shape) == 0:
+        # mmap cannot map an empty file
+        os.remove(path)
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+
+
+def release_scratch(value: Any, _seen: Optional[set] = None):
+    """
+    Delete the backing files of the memory-mapped arrays reachable from a value
+
+    Walks dicts, lists, tuples and object attributes like
+    model_cache.estimate_nbytes(), so that an LRUCache on_evict callback can
+    call it on the evicted value. Mappings still referenced elsewhere stay
+    readable until they are garbage collected; only the directory entry is
+    removed.
+
+    Parameters:
+    -----------
+    value : Any
+        Array or object holding arrays
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return
+    _seen.add(id(value))
+
+    if isinstance(value, np.memmap):
+        if value.filename is not None:
+            try:
+                os.remove(value.filename)
+            except FileNotFoundError:
+                pass
+    elif isinstance(value, (np.ndarray, pd.DataFrame, pd.Series)):
+        return
+    elif isinstance(value, dict):
+        for v in value.values():
+            release_scratch(v, _seen)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            release_scratch(v, _seen)
+    elif hasattr(value, '__dict__') and not isinstance(value, type):
+        release_scratch(vars(value), _seen)
@@ -0,0 +1,281 @@
+import numpy as np
+from numba import njit, prange
+from scipy.cluster.hierarchy import leaves_list, linkage, optimal_leaf_ordering
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigsh
+from typing import Optional, Tuple
+
+from instrumentation import instrumented
+from mixed_distance import _condensed_offset
+
+# Orderings derived from an average linkage, and the one that needs none
+LINKAGE_METHODS = ('linkage', 'optimal', 'refined')
+SERIATION_METHODS = LINKAGE_METHODS + ('spectral',)
+
+# Components up to this size get a dense eigendecomposition instead of Lanczos
+DENSE_EIGEN_MAX = 512
+
+
+@njit(cache=True)
+def _pair_similarity(similarity: np.ndarray, n: int, a: int, b: int) -> float:
+    """Similarity of items a and b in a condensed vector, 1 on the diagonal"""
+    if a == b:
+        return 1.0
+    if a > b:
+        a, b = b, a
+    return similarity[_condensed_offset(n, a) + b]
+
+
+@njit(parallel=True, cache=True, nogil=True)
+def _nearest_neighbors_kernel(similarity: np.ndarray, n: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and similarities of the k most similar other items of every item"""
+    indices = np.zeros((n, k), dtype=np.int64)
+    weights = np.full((n, k), -np.inf)
+    for row in prange(n):
+        # prange indices are unsigned, and mixing them with signed ints gives floats
+        i = np.int64(row)
+        # Running top k: the weakest kept neighbor is replaced by a stronger candidate
+        weakest = 0
+        for j in range(n):
+            if j == i:
+                continue
+            s = _pair_similarity(similarity, n, i, j)
+            if s > weights[i, weakest]:
+                weights[i, weakest] = s
+                indices[i, weakest] = j
+                for m in range(k):
+                    if weights[i, m] < weights[i, weakest]:
+                        weakest = m
+    return indices, weights
+
+
+@njit(cache=True)
+def _refine_kernel(similarity: np.ndarray, order: np.ndarray, window: int, max_passes: int) -> np.ndarray:
+    """Reverse the segments of at most ``window`` items that raise the adjacent similarity, in place"""
+    n = len(order)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 2):
+            # Reversing order[i + 1:j + 1] only changes the adjacencies at both ends of the segment
+            current = _pair_similarity(similarity, n, order[i], order[i + 1])
+            best_gain = 1e-9
+            best_j = -1
+            for j in range(i + 2, min(i + window, n - 1) + 1):
+                gain = _pair_similarity(similarity, n, order[i], order[j]) - current
+                if j + 1 < n:
+                    gain += (_pair_similarity(similarity, n, order[i + 1], order[j + 1])
+                             - _pair_similarity(similarity, n, order[j], order[j + 1]))
+                if gain > best_gain:
+                    best_gain = gain
+                    best_j = j
+            if best_j >= 0:
+                order[i + 1:best_j + 1] = order[i + 1:best_j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+@njit(cache=True)
+def _anti_robinson_kernel(similarity: np.ndarray, order: np.ndarray, window: int) -> Tuple[int, int]:
+    """Anti-Robinson events and comparisons over the triples spanning at most ``window`` positions"""
+    n = len(order)
+    events = 0
+    comparisons = 0
+    for i in range(n):
+        for k in range(i + 2, min(i + window, n - 1) + 1):
+            outer = _pair_similarity(similarity, n, order[i], order[k])
+            for j in range(i + 1, k):
+                # Moving away from the diagonal, similarities should not increase
+                if outer > _pair_similarity(similarity, n, order[i], order[j]):
+                    events += 1
+                if outer > _pair_similarity(similarity, n, order[j], order[k]):
+                    events += 1
+                comparisons += 2
+    return events, comparisons
+
+
+def _n_items(similarity: np.ndarray) -> int:
+    return int(round((1 + np.sqrt(1 + 8 * len(similarity))) / 2))
+
+
+def _fiedler_order(graph: csr_matrix) -> np.ndarray:
+    """Positions of a connected graph's nodes sorted by the Fiedler vector of its normalized Laplacian"""
+    n = graph.shape[0]
+    if n <= 2:
+        return np.arange(n)
+    degrees = np.asarray(graph.sum(axis=1)).ravel()
+    scale = 1 / np.sqrt(degrees)
+    # The eigenvectors of D^-1/2 W D^-1/2 with the largest eigenvalues are those of
+    # the normalized Laplacian with the smallest, the second one being the Fiedler vector
+    adjacency = graph.multiply(scale[:, None]).multiply(scale[None, :]).tocsr()
+    if n <= DENSE_EIGEN_MAX:
+        _, vectors = np.linalg.eigh(adjacency.toarray())
+        fiedler = vectors[:, -2]
+    else:
+        start = np.random.default_rng(0).random(n)
+        _, vectors = eigsh(adjacency, k=2, which='LA', v0=start, tol=1e-6)
+        fiedler = vectors[:, 0]
+    return np.argsort(fiedler * scale, kind='stable')
+
+
+def spectral_order(similarity: np.ndarray, n_neighbors: int = 10) -> np.ndarray:
+    """
+    Order items by the Fiedler vector of their k-nearest-neighbor graph
+
+    The graph keeps, for every item, the edges to its ``n_neighbors`` most
+    similar items weighted by their similarity, so the eigensolver works on
+    O(n * k) non-zeros instead of the n x n matrix. Connected components are
+    ordered separately and placed one after the other.
+
+    Parameters:
+    -----------
+    similarity : np.ndarray
+        Condensed similarity vector, values in [0, 1]
+    n_neighbors : int, default 10
+        Neighbors per item in the graph
+
+    Returns:
+    --------
+    np.ndarray
+        Permutation of the items
+    """
+    n = _n_items(similarity)
+    k = min(n_neighbors, n - 1)
+    if k < 1:
+        return np.arange(n)
+
+    indices, weights = _nearest_neighbors_kernel(similarity, n, k)
+    graph = csr_matrix((np.clip(weights.ravel(), 0, None), (np.repeat(np.arange(n), k), indices.ravel())),
+                       shape=(n, n))
+    graph.eliminate_zeros()
+    graph = graph.maximum(graph.T).tocsr()
+
+    n_components, labels = connected_components(graph, directed=False)
+    order = []
+    for component in range(n_components):
+        members = np.flatnonzero(labels == component)
+        order.append(members[_fiedler_order(graph[members][:, members])])
+    return np.concatenate(order)
+
+
+def refine_order(similarity: np.ndarray, order: np.ndarray, window: int = 16, max_passes: int = 10) -> np.ndarray:
+    """
+    Improve an order by reversing short segments
+
+    Every pass moves along the order and, at each position, reverses the
+    following segment of at most ``window`` items that most increases the
+    sum of adjacent similarities. Each pass costs O(n * window) lookups, in
+    place of the O(n^3) optimal leaf ordering; starting from a linkage leaf
+    order, segments larger than a window keep their dendrogram layout.
+
+    Parameters:
+    -----------
+    similarity : np.ndarray
+        Condensed similarity vector
+    order : np.ndarray
+        Starting permutation, left unchanged
+    window : int, default 16
+        Longest reversed segment
+    max_passes : int, default 10
+        Passes at most, fewer if one makes no change
+
+    Returns:
+    --------
+    np.ndarray
+        Refined permutation
+    """
+    order = np.array(order, dtype=np.int64)
+    if window < 2 or len(order) < 3:
+        return order
+    return _refine_kernel(similarity, order, window, max_passes)
+
+
+@instrumented('seriation')
+def seriate(similarity: np.ndarray, method: str = 'linkage', linkage_matrix: Optional[np.ndarray] = None,
+            n_neighbors: int = 10, window: int = 16) -> np.ndarray:
+    """
+    Order items so that similar ones are adjacent
+
+    Methods, from fastest to slowest on large inputs:
+        'spectral': spectral_order() on the kNN graph, no linkage needed
+        'linkage': leaf order of the average linkage
+        'refined': linkage leaf order improved by refine_order()
+        'optimal': optimal leaf ordering of the average linkage (scipy),
+                   exact but roughly cubic in the number of items
+
+    Parameters:
+    -----------
+    similarity : np.ndarray
+        Condensed similarity vector, values in [0, 1]
+    method : str, default 'linkage'
+        One of SERIATION_METHODS
+    linkage_matrix : np.ndarray, optional
+        Average linkage over 1 - similarity, computed when a linkage method
+        needs it and none is given
+    n_neighbors : int, default 10
+        Neighbors per item for 'spectral'
+    window : int, default 16
+        Longest reversed segment for 'refined'
+
+    Returns:
+    --------
+    np.ndarray
+        Permutation of the items
+    """
+    if method not in SERIATION_METHODS:
+        raise ValueError(f"Unknown seriation method {method!r}, expected one of {SERIATION_METHODS}")
+    n = _n_items(similarity)
+    if n < 2:
+        return np.arange(n)
+    if method == 'spectral':
+        return spectral_order(similarity, n_neighbors)
+
+    if linkage_matrix is None:
+        linkage_matrix = linkage(1 - similarity, method='average')
+    if method == 'optimal':
+        linkage_matrix = optimal_leaf_ordering(linkage_matrix, 1 - similarity)
+    order = leaves_list(linkage_matrix)
+    if method == 'refined':
+        order = refine_order(similarity, order, window)
+    return order
+
+
+def adjacent_similarity(similarity: np.ndarray, order: np.ndarray) -> float:
+    """Mean similarity of the items next to each other in an order (higher is better)"""
+    order = np.asarray(order, dtype=np.int64)
+    if len(order) < 2:
+        return 1.0
+    n = len(order)
+    i = np.minimum(order[:-1], order[1:])
+    j = np.maximum(order[:-1], order[1:])
+    return float(np.mean(similarity[n * i - i * (i + 1) // 2 + j - i - 1]))
+
+
+def anti_robinson_score(similarity: np.ndarray, order: np.ndarray, window: int = 20) -> float:
+    """
+    Share of anti-Robinson events among the triples of nearby items (lower is better)
+
+    For positions i < j < k, a Robinson matrix has s(i, k) <= s(i, j) and
+    s(i, k) <= s(j, k): similarity never increases away from the diagonal.
+    Every violated inequality is an event. Only triples with k - i <=
+    ``window`` are checked, which keeps the count at O(n * window^2) and
+    focuses on the band near the diagonal that the heatmap shows as blocks.
+
+    Parameters:
+    -----------
+    similarity : np.ndarray
+        Condensed similarity vector
+    order : np.ndarray
+        Permutation to score
+    window : int, default 20
+        Widest triple, in positions
+
+    Returns:
+    --------
+    float
+        Events / comparisons, 0 for a Robinson ordering
+    """
+    events, comparisons = _anti_robinson_kernel(similarity, np.asarray(order, dtype=np.int64), window)
+    return events / comparisons if comparisons else 0.0
@@ -1,15 +1,16 @@
 import pandas as pd
 import gower
-import seaborn as sns
-import matplotlib.pyplot as plt
 from scipy.cluster.hierarchy import linkage, leaves_list
-import matplotlib
-
-matplotlib.use('Agg')
+from mixed_distance import condensed_from_square
+from seriation import seriate
 
 class SimilarityMatrix:
-    def __init__(self, data):
+    def __init__(self, data, seriation=None):
         self.data = data
+        # None clusters the rows of the similarity matrix as observations with
+        # optimal leaf ordering (O(n^3)); a seriation.SERIATION_METHODS name
+        # orders the condensed similarities instead
+        self.seriation = seriation
 
     def getGower(self):
         # data = self.data.to_numpy()
@@ -18,11 +19,14 @@ class SimilarityMatrix:
 
     def reorderMatrix(self):
         similarity_matrix = 1 - self.getGower()
-        # Perform hierarchical clustering
-        linkage_matrix = linkage(similarity_matrix, method='average', optimal_ordering=True)
+        if self.seriation is not None:
+            ordered_indices = seriate(condensed_from_square(similarity_matrix), self.seriation)
+        else:
+            # Perform hierarchical clustering
+            linkage_matrix = linkage(similarity_matrix, method='average', optimal_ordering=True)
 
-        # Get the order of the leaves
-        ordered_indices = leaves_list(linkage_matrix)
+            # Get the order of the leaves
+            ordered_indices = leaves_list(linkage_matrix)
 
         # Reorder the similarity matrix
         ordered_similarity_matrix = similarity_matrix[ordered_indices, :][:, ordered_indices]
@@ -30,6 +34,11 @@ class SimilarityMatrix:
         return ordered_similarity_matrix
     
     def plotMatrix(self):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
         ordered_similarity_matrix = self.reorderMatrix()
         plt.figure(figsize=(10, 8))
         sns_plot = sns.heatmap(ordered_similarity_matrix, cmap='binary')
@@ -1,99 +1,322 @@
 import numpy as np
 import pandas as pd
-from scipy.spatial.distance import pdist, squareform
-from scipy.cluster.hierarchy import linkage, leaves_list
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-import matplotlib.pyplot as plt
-import seaborn as sns
-from numba import jit
-from typing import Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from scipy.cluster.hierarchy import linkage
+from column_similarity import COLUMN_METRICS, column_association
+from encoded_table import EncodedTable, encode_table
+from instrumentation import instrumented, stage
+from mixed_distance import (MixedDistanceEngine, concurrent_kernels_supported, condensed_from_square,
+                            condensed_mixed_distance, square_from_condensed)
+from scratch import release_scratch, scratch_array
+from seriation import LINKAGE_METHODS, SERIATION_METHODS, adjacent_similarity, anti_robinson_score, seriate
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Tuple, Optional, Union
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+AXES = ('rows', 'columns')
+
+
+def _bin_edges(start: int, stop: int, resolution: int) -> np.ndarray:
+    """Edges of at most ``resolution`` near-equal bins covering [start, stop)"""
+    # Flooring keeps the edges strictly increasing when every bin spans at least one index
+    return np.linspace(start, stop, min(resolution, stop - start) + 1).astype(np.int64)
+
+
+def _bin_groups(edges: np.ndarray, block_size: int) -> Iterator[Tuple[int, int]]:
+    """Runs of consecutive bins spanning at most ``block_size`` indices (or a single wider bin)"""
+    first = 0
+    n_bins = len(edges) - 1
+    while first < n_bins:
+        last = max(first + 1, int(np.searchsorted(edges, edges[first] + block_size, side='right')) - 1)
+        last = min(last, n_bins)
+        yield first, last
+        first = last
+
 
 class OptimizedDualSimilarityMatrix:
-    def __init__(self, data: pd.DataFrame):
+    def __init__(self, data: pd.DataFrame, dtype: type = np.float64, scratch_dir: Optional[str] = None,
+                 seriation: str = 'linkage', column_metric: str = 'association', n_jobs: int = 1):
+        if seriation not in SERIATION_METHODS:
+            raise ValueError(f"Unknown seriation method {seriation!r}, expected one of {SERIATION_METHODS}")
+        if column_metric not in COLUMN_METRICS:
+            raise ValueError(f"Unknown column_metric {column_metric!r}, expected one of {COLUMN_METRICS}")
         self.data = data
-        self._processed_data = None
+        self.dtype = dtype
+        # How rows and columns are ordered, see seriation.seriate()
+        self.seriation = seriation
+        # How columns are compared, see column_similarity.COLUMN_METRICS
+        self.column_metric = column_metric
+        # Above 1, the row and the column halves are computed on two threads
+        self.n_jobs = n_jobs
+        # With a scratch directory, the condensed distances and similarities are memory-mapped
+        # files there, deleted by release()
+        self.scratch_dir = scratch_dir
+        self._scratch: List[np.ndarray] = []
+        self._table: Optional[EncodedTable] = None
+        # Similarities are kept in condensed form, squares are built on demand
         self._row_similarity: Optional[np.ndarray] = None
         self._col_similarity: Optional[np.ndarray] = None
+        # Largest distance of each axis, the similarities are normalized by it
+        self._max_distances: Dict[str, float] = {}
+        # Average linkage and order of each axis, computed once
+        self._linkages: Dict[str, np.ndarray] = {}
+        self._orders: Dict[str, np.ndarray] = {}
     
-    def _preprocess_data(self) -> np.ndarray:
-        numeric_cols = self.data.select_dtypes(include=[np.number]).columns
-        categorical_cols = self.data.select_dtypes(include=['object', 'category']).columns
-        
-        processed_data = self.data.copy()
-        
-        if len(numeric_cols) > 0:
-            scaler = StandardScaler()
-            processed_data[numeric_cols] = scaler.fit_transform(processed_data[numeric_cols])
-        
-        for col in categorical_cols:
-            le = LabelEncoder()
-            processed_data[col] = le.fit_transform(processed_data[col].astype(str))
-        
-        self._processed_data = processed_data.values
-        self._column_types = np.array([np.issubdtype(processed_data[col].dtype, np.number) 
-                                     for col in processed_data.columns])
-        return self._processed_data
+    def _preprocess_data(self) -> EncodedTable:
+        # Shared with the biclustering of the same data (see encode_table)
+        self._table = encode_table(self.data)
+        return self._table
+
+    def _allocate(self, shape, dtype) -> np.ndarray:
+        """Output array, memory-mapped in scratch_dir when one is set"""
+        if self.scratch_dir is None:
+            return np.empty(shape, dtype=dtype)
+        array = scratch_array(shape, dtype, self.scratch_dir)
+        self._scratch.append(array)
+        return array
+
+    def release(self):
+        """Delete the memory-mapped files of this instance"""
+        release_scratch(self._scratch)
+        self._scratch = []
+
+    @instrumented('mixed_distance')
+    def _mixed_distance(self, X: Union[np.ndarray, EncodedTable], column_types: Optional[np.ndarray] = None) -> np.ndarray:
+        n = X.n_rows if isinstance(X, EncodedTable) else X.shape[0]
+        out = self._allocate(n * (n - 1) // 2, self.dtype)
+        return condensed_mixed_distance(X, column_types, backend='numba', dtype=self.dtype, out=out)
+
+    def _square(self, condensed: np.ndarray, order: Optional[np.ndarray] = None) -> np.ndarray:
+        # A transient array owned by the caller: the instance may be cached across requests,
+        # and squares kept in its scratch would pile up with every call
+        return square_from_condensed(condensed, order, diagonal=1.0)
+
+    def _linkage(self, similarity: np.ndarray, block_size: int = 2**20) -> np.ndarray:
+        """Average linkage over 1 - similarity, converted block by block"""
+        distances = scratch_array(similarity.shape, similarity.dtype, self.scratch_dir) if self.scratch_dir \
+            else np.empty_like(similarity)
+        for start in range(0, len(similarity), block_size):
+            np.subtract(1, similarity[start:start + block_size], out=distances[start:start + block_size])
+        with stage('linkage'):
+            result = linkage(distances, method='average')
+        release_scratch(distances)
+        return result
 
     @staticmethod
-    @jit(nopython=True)
-    def _mixed_distance(X: np.ndarray, column_types: np.ndarray) -> np.ndarray:
-        n_samples = X.shape[0]
-        distances = np.zeros((n_samples, n_samples))
-        
-        for i in range(n_samples):
-            for j in range(i + 1, n_samples):
-                dist = 0.0
-                for k in range(X.shape[1]):
-                    if column_types[k]:
-                        dist += (X[i, k] - X[j, k]) ** 2
-                    else:
-                        dist += 0.0 if X[i, k] == X[j, k] else 1.0
-                distances[i, j] = distances[j, i] = np.sqrt(dist)
-        
+    def _to_similarity(distances: np.ndarray, max_distance: Optional[float] = None) -> np.ndarray:
+        """Turn a condensed distance vector into 1 - d / max(d), in place"""
+        if max_distance is None:
+            max_distance = np.max(distances) if len(distances) > 0 else 0
+        if max_distance == 0:
+            distances.fill(1)
+            return distances
+        distances /= max_distance
+        np.subtract(1, distances, out=distances)
         return distances
 
-    def get_similarity_matrices(self) -> Tuple[np.ndarray, np.ndarray]:
+    def _row_similarities(self) -> np.ndarray:
+        row_distances = self._mixed_distance(self._table)
+        self._max_distances['rows'] = float(np.max(row_distances)) if len(row_distances) > 0 else 0.0
+        return self._to_similarity(row_distances, self._max_distances['rows'])
+
+    def _column_similarities(self) -> np.ndarray:
+        if self.column_metric == 'association':
+            # Pairwise column statistics in one pass over the rows, already in [0, 1]
+            return condensed_from_square(column_association(self._table).astype(self.dtype))
+        col_distances = self._mixed_distance(self._table.matrix().T)
+        self._max_distances['columns'] = float(np.max(col_distances)) if len(col_distances) > 0 else 0.0
+        return self._to_similarity(col_distances, self._max_distances['columns'])
+
+    def _concurrently(self, rows: Callable, columns: Callable) -> Tuple:
+        """Results of the row and the column function, on two threads when n_jobs > 1"""
+        if self.n_jobs > 1 and concurrent_kernels_supported():
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                column_result = executor.submit(columns)
+                return rows(), column_result.result()
+        return rows(), columns()
+
+    def _condensed_similarities(self) -> Tuple[np.ndarray, np.ndarray]:
         if self._row_similarity is not None and self._col_similarity is not None:
             return self._row_similarity, self._col_similarity
             
-        if self._processed_data is None:
+        if self._table is None:
             self._preprocess_data()
         
-        row_distance_matrix = self._mixed_distance(self._processed_data, self._column_types)
-        row_max = np.max(row_distance_matrix)
-        self._row_similarity = 1 - (row_distance_matrix / row_max) if row_max != 0 else np.ones_like(row_distance_matrix)
-        
-        col_distance_matrix = self._mixed_distance(self._processed_data.T, ~self._column_types)
-        col_max = np.max(col_distance_matrix)
-        self._col_similarity = 1 - (col_distance_matrix / col_max) if col_max != 0 else np.ones_like(col_distance_matrix)
-        
+        self._row_similarity, self._col_similarity = self._concurrently(self._row_similarities,
+                                                                        self._column_similarities)
         return self._row_similarity, self._col_similarity
 
+    def get_similarity_matrices(self) -> Tuple[np.ndarray, np.ndarray]:
+        row_similarity, col_similarity = self._condensed_similarities()
+        return self._square(row_similarity), self._square(col_similarity)
+
     def get_reordered_matrices(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
         """Get similarity matrices with enhanced block-structure ordering"""
-        row_similarity, col_similarity = self.get_similarity_matrices()
-        
-        # Convert similarity to distance matrices in condensed form
-        row_distances = squareform(1 - row_similarity)
-        col_distances = squareform(1 - col_similarity)
-        
-        # Perform hierarchical clustering
-        row_linkage = linkage(row_distances, method='average')
-        col_linkage = linkage(col_distances, method='average')
-        
-        # Get ordering that maximizes similarity between adjacent elements
-        row_ordered_indices = leaves_list(row_linkage)
-        col_ordered_indices = leaves_list(col_linkage)
-        
-        # Reorder matrices to show block structure
-        ordered_row_similarity = row_similarity[np.ix_(row_ordered_indices, row_ordered_indices)]
-        ordered_col_similarity = col_similarity[np.ix_(col_ordered_indices, col_ordered_indices)]
-        
-        return (ordered_row_similarity, row_ordered_indices, row_linkage,
-                ordered_col_similarity, col_ordered_indices, col_linkage)
+        self._condensed_similarities()
+        self._concurrently(lambda: self.get_order('rows'), lambda: self.get_order('columns'))
+        return (self.get_ordered_matrix('rows'), self.get_order('rows'), self.get_linkage('rows'),
+                self.get_ordered_matrix('columns'), self.get_order('columns'), self.get_linkage('columns'))
+
+    def get_ordered_matrix(self, axis: str = 'rows') -> np.ndarray:
+        """
+        Square similarity matrix of the rows or columns in seriation order
+
+        Only this square is materialized; the linkage and the order behind it
+        are computed once per instance.
+        """
+        similarity = self._condensed_similarities()[AXES.index(axis)]
+        return self._square(similarity, self.get_order(axis))
+
+    def get_linkage(self, axis: str) -> Optional[np.ndarray]:
+        """
+        Average linkage of the rows or columns over 1 - similarity, computed once
+
+        None below 2 items, and with the 'spectral' seriation, which orders
+        without a linkage.
+        """
+        if axis not in self._linkages:
+            similarity = self._condensed_similarities()[AXES.index(axis)]
+            # Hierarchical clustering directly on the condensed distances
+            self._linkages[axis] = self._linkage(similarity) \
+                if len(similarity) > 0 and self.seriation in LINKAGE_METHODS else None
+        return self._linkages[axis]
+
+    def get_order(self, axis: str) -> np.ndarray:
+        """Seriation order of the rows or columns, adjacent items being the most similar"""
+        if axis not in self._orders:
+            similarity = self._condensed_similarities()[AXES.index(axis)]
+            self._orders[axis] = seriate(similarity, self.seriation, self.get_linkage(axis))
+        return self._orders[axis]
+
+    def seriation_quality(self, axis: str = 'rows', window: int = 20) -> Dict[str, float]:
+        """
+        Scores of the order of the rows or columns
+
+        Returns the mean similarity of adjacent items (higher is better) and
+        the anti-Robinson event rate within ``window`` positions (lower is
+        better), see seriation.adjacent_similarity() and
+        seriation.anti_robinson_score().
+        """
+        similarity = self._condensed_similarities()[AXES.index(axis)]
+        order = self.get_order(axis)
+        return {'adjacent_similarity': adjacent_similarity(similarity, order),
+                'anti_robinson': anti_robinson_score(similarity, order, window)}
+
+    def _ordered_engine(self, axis: str) -> MixedDistanceEngine:
+        """Distance engine over the rows or columns in seriation order"""
+        order = self.get_order(axis)
+        if axis == 'rows':
+            return MixedDistanceEngine.from_table(self._table.take(order), dtype=self.dtype)
+        return MixedDistanceEngine.from_array(self._table.matrix().T[order], dtype=self.dtype)
+
+    def _similarity_tiles(self, axis: str) -> Callable[[slice, slice], np.ndarray]:
+        """Function returning (float64) tiles of the ordered similarity matrix of an axis"""
+        if axis == 'columns' and self.column_metric == 'association':
+            # Associations are not distances of the encoded data; the square is small
+            ordered = self.get_ordered_matrix(axis)
+            return lambda rows, cols: ordered[rows, cols].astype(np.float64)
+
+        engine = self._ordered_engine(axis)
+        max_distance = self._max_distances[axis]
+
+        def tile(rows: slice, cols: slice) -> np.ndarray:
+            similarity = engine.tile(rows, cols)
+            if max_distance > 0:
+                similarity /= max_distance
+                np.subtract(1, similarity, out=similarity)
+            else:
+                similarity.fill(1)
+            return similarity
 
-    def plot_row_similarity(self, figsize: Tuple[int, int] = (8, 8)) -> plt.Figure:
-        ordered_row_similarity, _, _, _, _, _ = self.get_reordered_matrices()
+        return tile
+
+    @instrumented('coarsen_vsm')
+    def coarsened_matrix(self, axis: str = 'rows', resolution: int = 512,
+                         region: Optional[Tuple[int, int, int, int]] = None,
+                         block_size: int = 1024) -> Dict[str, np.ndarray]:
+        """
+        Ordered similarity matrix aggregated into a grid of at most resolution x resolution cells
+
+        Every cell summarizes a rectangle of the leaf-ordered matrix by its
+        mean, min and max similarity. Distances are recomputed tile by tile
+        from the encoded data, so the square matrix is never materialized and
+        a zoomed region costs only its own area. Column associations are read
+        from their ordered square, which has one row per column.
+
+        Parameters:
+        -----------
+        axis : str, default 'rows'
+            'rows' or 'columns'
+        resolution : int, default 512
+            Maximum number of cells along each side; a side spanning fewer
+            indices gets one cell per index, i.e. the exact values
+        region : Tuple[int, int, int, int], optional
+            (row_start, row_stop, col_start, col_stop) in leaf-order
+            positions, the whole matrix by default
+        block_size : int, default 1024
+            Number of rows and columns per distance tile, bounds temporary memory
+
+        Returns:
+        --------
+        Dict with
+            'mean', 'min', 'max': (n_row_bins, n_col_bins) float32 grids
+            'row_edges', 'col_edges': bin edges in leaf-order positions
+            'order': seriation order of the axis
+        """
+        if axis not in AXES:
+            raise ValueError(f"Unknown axis {axis!r}, expected one of {AXES}")
+        if self._table is None:
+            self._preprocess_data()
+        order = self.get_order(axis)
+        n = len(order)
+        row_start, row_stop, col_start, col_stop = region if region is not None else (0, n, 0, n)
+        if not (0 <= row_start < row_stop <= n and 0 <= col_start < col_stop <= n):
+            raise ValueError(f"Region {region} outside of the {n} x {n} matrix")
+
+        similarity_tile = self._similarity_tiles(axis)
+        row_edges = _bin_edges(row_start, row_stop, resolution)
+        col_edges = _bin_edges(col_start, col_stop, resolution)
+        shape = (len(row_edges) - 1, len(col_edges) - 1)
+        sums = np.zeros(shape)
+        minima = np.empty(shape)
+        maxima = np.empty(shape)
+
+        for first_row_bin, last_row_bin in _bin_groups(row_edges, block_size):
+            rows = slice(row_edges[first_row_bin], row_edges[last_row_bin])
+            row_starts = row_edges[first_row_bin:last_row_bin] - rows.start
+            for first_col_bin, last_col_bin in _bin_groups(col_edges, block_size):
+                cols = slice(col_edges[first_col_bin], col_edges[last_col_bin])
+                col_starts = col_edges[first_col_bin:last_col_bin] - cols.start
+
+                similarity = similarity_tile(rows, cols)
+                # Self-similarity is 1 even for rows with missing values
+                diagonal = np.arange(max(rows.start, cols.start), min(rows.stop, cols.stop))
+                similarity[diagonal - rows.start, diagonal - cols.start] = 1
+
+                cells = (slice(first_row_bin, last_row_bin), slice(first_col_bin, last_col_bin))
+                sums[cells] = np.add.reduceat(np.add.reduceat(similarity, row_starts, axis=0), col_starts, axis=1)
+                minima[cells] = np.minimum.reduceat(np.minimum.reduceat(similarity, row_starts, axis=0),
+                                                    col_starts, axis=1)
+                maxima[cells] = np.maximum.reduceat(np.maximum.reduceat(similarity, row_starts, axis=0),
+                                                    col_starts, axis=1)
+
+        counts = np.outer(np.diff(row_edges), np.diff(col_edges))
+        return {
+            'mean': (sums / counts).astype(np.float32),
+            'min': minima.astype(np.float32),
+            'max': maxima.astype(np.float32),
+            'row_edges': row_edges,
+            'col_edges': col_edges,
+            'order': order
+        }
+
+    def plot_row_similarity(self, figsize: Tuple[int, int] = (8, 8)) -> 'plt.Figure':
+        # The plotting libraries are only imported here, the request paths never plot
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        ordered_row_similarity = self.get_ordered_matrix('rows')
         
         fig = plt.figure(figsize=figsize)
         ax = plt.gca()
@@ -103,8 +326,11 @@ class OptimizedDualSimilarityMatrix:
         plt.tight_layout()
         return fig
 
-    def plot_column_similarity(self, figsize: Tuple[int, int] = (8, 8)) -> plt.Figure:
-        _, _, _, ordered_col_similarity, _, _ = self.get_reordered_matrices()
+    def plot_column_similarity(self, figsize: Tuple[int, int] = (8, 8)) -> 'plt.Figure':
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        ordered_col_similarity = self.get_ordered_matrix('columns')
         
         fig = plt.figure(figsize=figsize)
         ax = plt.gca()
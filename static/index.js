@@ -3,7 +3,11 @@ let file = null;
 let csvFileData = null;
 let globalColorScales = null;
 let gridSummaryData = null; 
+let gridSummaryDatasetKey = null; // Server-side key of the dataset shown in the grid summary
+let gridSummaryCSVData = null; // CSV text the grid summary layout indexes into
 let vsmData = null;
+// Dataset and columns of the current VSM, zoom requests refer to them
+let vsmRequest = null;
 let activeFilters = new Map();
 let activeNumericalFilters = {
   column: null,
@@ -15,6 +19,7 @@ let allColumns = []; // Store all column names
 let selectedEmptyCells = new Set();
 
 let originalCSVData = null;
+let datasetId = null; // Server-side ID of originalCSVData, see uploadDataset()
 
 // Add click event listener to the search tab
 document.querySelector('.search-tab').addEventListener('click', function() {
@@ -99,6 +104,13 @@ document.getElementById('csvFileInput').addEventListener('change', async functio
       reader.onload = async function(e) {
         originalCSVData = e.target.result; // Store original data
         csvFileData = originalCSVData;     // Set current data
+        datasetId = null;
+        try {
+          datasetId = await uploadDataset(originalCSVData);
+        } catch (error) {
+          // Requests fall back to sending the file itself
+          console.error('Error uploading dataset:', error);
+        }
         try {
           const data = d3.csvParse(csvFileData);
           createColumnSelector(data.columns);
@@ -115,16 +127,7 @@ document.getElementById('csvFileInput').addEventListener('change', async functio
           
           // Update grid summary if it's active
           if (document.getElementById('gridSummaryButton').classList.contains('active')) {
-            const formData = new FormData();
-            formData.append('file', file);
-            formData.append('rowClusters', document.getElementById('rowClusters').value);
-            formData.append('colClusters', document.getElementById('colClusters').value);
-
-            const response = await fetch('/get_clusters', {
-              method: 'POST',
-              body: formData
-            });
-            const clusterData = await response.json();
+            const clusterData = await fetchClusters(csvFileData);
             if (!clusterData.error) {
               visualizeGridSummary(clusterData);
             }
@@ -143,6 +146,206 @@ document.getElementById('csvFileInput').addEventListener('change', async functio
   }
 });
 
+// Store the original CSV on the server once; later requests reference it by ID
+async function uploadDataset(csvText) {
+  const formData = new FormData();
+  formData.append('file', new File([csvText], 'dataset.csv', { type: 'text/csv' }));
+
+  const response = await fetch('/datasets', {
+    method: 'POST',
+    body: formData
+  });
+  const data = await response.json();
+  if (data.error) {
+    throw new Error(data.error);
+  }
+  return data.dataset_id;
+}
+
+// POST csvText (optionally narrowed to some of its columns) together with the
+// given fields. The uploaded dataset ID is sent instead of the file whenever
+// csvText is the original upload; if the server evicted it (404) the dataset
+// is uploaded again and the request retried once.
+async function postDataset(url, csvText, fields = {}, columns = null, headers = {}) {
+  const buildFormData = () => {
+    const formData = new FormData();
+    if (datasetId && csvText === originalCSVData) {
+      formData.append('dataset_id', datasetId);
+      if (columns) {
+        formData.append('columns', JSON.stringify(columns));
+      }
+    } else {
+      const text = columns ? filterCSVByColumns(csvText) : csvText;
+      formData.append('file', new File([text], 'data.csv', { type: 'text/csv' }));
+    }
+    Object.entries(fields).forEach(([key, value]) => formData.append(key, value));
+    return formData;
+  };
+
+  const usesDatasetId = datasetId && csvText === originalCSVData;
+  let response = await fetch(url, { method: 'POST', headers, body: buildFormData() });
+  if (response.status === 404 && usesDatasetId) {
+    datasetId = await uploadDataset(originalCSVData);
+    response = await fetch(url, { method: 'POST', headers, body: buildFormData() });
+  }
+  return response;
+}
+
+// Media type of the binary block payload written by wire_format.encode_blocks()
+const BLOCKS_MIME = 'application/x-bicluster-blocks';
+const BLOCKS_ACCEPT = `${BLOCKS_MIME}, application/json;q=0.5`;
+const MISSING_CODE = 0xFFFFFFFF;
+
+// Decode a binary block payload into the structure of the JSON response,
+// { blocks: { key: { data, columns, rows } }, dataset_key }. Missing numerical
+// values become NaN, missing categorical values ''.
+function decodeBlocks(buffer) {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== 'BKS1') {
+    throw new Error('Not a block payload');
+  }
+  const headerLength = view.getUint32(4, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+  const bodyStart = 8 + headerLength;
+
+  const blocks = {};
+  header.blocks.forEach(block => {
+    const nCols = block.columns.length;
+    const rows = new Uint32Array(buffer, bodyStart + block.rows_offset, block.n_rows);
+    const isCategorical = block.key.split(',')[3] === 'categorical';
+    const values = isCategorical
+      ? new Uint32Array(buffer, bodyStart + block.values_offset, block.n_rows * nCols)
+      : new Float32Array(buffer, bodyStart + block.values_offset, block.n_rows * nCols);
+    const dictionaries = isCategorical ? block.columns.map(col => header.dictionaries[col]) : null;
+
+    const data = new Array(block.n_rows);
+    for (let i = 0; i < block.n_rows; i++) {
+      const row = new Array(nCols);
+      for (let j = 0; j < nCols; j++) {
+        const value = values[i * nCols + j];
+        row[j] = isCategorical ? (value === MISSING_CODE ? '' : dictionaries[j][value]) : value;
+      }
+      data[i] = row;
+    }
+    blocks[block.key] = { data, columns: block.columns, rows };
+  });
+
+  return { blocks, dataset_key: header.dataset_key };
+}
+
+// Cut the blocks of an index-only response out of the CSV it was computed on.
+// Rows are referenced by position, columns by name.
+function blocksFromLayout(csvText, layout) {
+  const rows = d3.csvParse(csvText);
+  const blocks = {};
+  layout.blocks.forEach(([key, rowSegment, colSegment]) => {
+    const rowIndices = layout.row_order.slice(layout.row_offsets[rowSegment], layout.row_offsets[rowSegment + 1]);
+    const columns = layout.col_order.slice(layout.col_offsets[colSegment], layout.col_offsets[colSegment + 1]);
+    blocks[key] = {
+      data: rowIndices.map(i => columns.map(col => rows[i][col])),
+      columns,
+      rows: rowIndices
+    };
+  });
+  return blocks;
+}
+
+// Parse a /get_clusters or /recut_clusters response: binary blocks, JSON
+// blocks, or a JSON layout applied to csvText
+async function readClusterResponse(response, csvText) {
+  const contentType = response.headers.get('Content-Type') || '';
+  if (contentType.startsWith(BLOCKS_MIME)) {
+    return decodeBlocks(await response.arrayBuffer());
+  }
+  const data = await response.json();
+  if (data.layout) {
+    data.blocks = blocksFromLayout(csvText, data.layout);
+  }
+  return data;
+}
+
+// Identifies this page to the server: a new clustering job cancels the
+// previous one of the same session, whose result would be stale
+const jobSession = Math.random().toString(36).slice(2);
+const FINISHED_JOB_STATES = ['done', 'failed', 'cancelled'];
+
+// Show the stage of the running clustering job next to the sliders
+function showJobStatus(job) {
+  const status = document.getElementById('clusterJobStatus');
+  if (status) {
+    status.textContent = FINISHED_JOB_STATES.includes(job.status) || !job.stage
+      ? ''
+      : `${job.stage} (${Math.round(job.progress * 100)}%)`;
+  }
+}
+
+// Resolve with the final state of a job, following its server-sent events
+// or, if the stream fails, polling its state
+function waitForJob(jobId) {
+  return new Promise(resolve => {
+    const finish = job => {
+      showJobStatus(job);
+      resolve(job);
+    };
+    const poll = () => fetch(`/jobs/${jobId}`)
+      .then(response => response.json())
+      .then(job => {
+        showJobStatus(job);
+        if (job.error || FINISHED_JOB_STATES.includes(job.status)) {
+          finish(job);
+        } else {
+          setTimeout(poll, 1000);
+        }
+      });
+
+    const events = new EventSource(`/jobs/${jobId}/events`);
+    events.onmessage = event => {
+      const job = JSON.parse(event.data);
+      showJobStatus(job);
+      if (FINISHED_JOB_STATES.includes(job.status)) {
+        events.close();
+        finish(job);
+      }
+    };
+    events.onerror = () => {
+      events.close();
+      poll();
+    };
+  });
+}
+
+// Cluster csvText (optionally narrowed to some columns) at the slider values.
+// The work runs as a server job; only the block layout is requested, the
+// blocks are cut out of csvText. A job superseded by a newer one resolves
+// with an error and is ignored by the callers.
+async function fetchClusters(csvText, columns = null) {
+  const response = await postDataset('/jobs/clusters', csvText,
+                                     { ...clusterFields(), mode: 'indices', session: jobSession }, columns);
+  const submitted = await response.json();
+  if (submitted.error) {
+    return submitted;
+  }
+  const job = await waitForJob(submitted.job_id);
+  if (job.status !== 'done') {
+    return { error: job.error || `Clustering job ${job.status}` };
+  }
+
+  const result = await fetch(`/jobs/${job.job_id}/result`, { headers: { Accept: BLOCKS_ACCEPT } });
+  const data = await readClusterResponse(result, csvText);
+  if (!data.error) {
+    gridSummaryCSVData = csvText;
+  }
+  return data;
+}
+
+function clusterFields() {
+  return {
+    rowClusters: document.getElementById('rowClusters').value,
+    colClusters: document.getElementById('colClusters').value
+  };
+}
+
 // Update slider values display
 document.getElementById('rowClusters').addEventListener('input', function() {
   document.getElementById('rowClustersValue').textContent = this.value;
@@ -152,6 +355,15 @@ document.getElementById('colClusters').addEventListener('input', function() {
   document.getElementById('colClustersValue').textContent = this.value;
 });
 
+// Re-cut the already fitted dataset when a slider is released
+['rowClusters', 'colClusters'].forEach(id => {
+  document.getElementById(id).addEventListener('change', function() {
+    if (document.getElementById('gridSummaryButton').classList.contains('active')) {
+      recutGridSummary();
+    }
+  });
+});
+
 
 // Update the Grid Summary button handler to use filtered data
 document.getElementById('gridSummaryButton').addEventListener('click', function() {
@@ -191,21 +403,13 @@ document.getElementById('gridSummaryButton').addEventListener('click', function(
       return newRow;
     });
 
-    // Convert to CSV
-    const filteredCSV = d3.csvFormat(finalFilteredData);
+    // Without row filters the stored dataset can be narrowed to the selected
+    // columns on the server; otherwise the filtered CSV is sent
+    const request = filteredData.length === data.length
+      ? fetchClusters(csvFileData, filteredColumns)
+      : fetchClusters(d3.csvFormat(finalFilteredData));
 
-    // Create form data with the filtered CSV
-    const formData = new FormData();
-    const filteredBlob = new Blob([filteredCSV], { type: 'text/csv' });
-    formData.append('file', new File([filteredBlob], 'filtered.csv', { type: 'text/csv' }));
-    formData.append('rowClusters', document.getElementById('rowClusters').value);
-    formData.append('colClusters', document.getElementById('colClusters').value);
-
-    fetch('/get_clusters', {
-      method: 'POST',
-      body: formData
-    })
-    .then(response => response.json())
+    request
     .then(data => {
       if (data.error) {
         console.error('Error:', data.error);
@@ -624,19 +828,44 @@ function visualizeCSVData(csvData) {
 
 // Helper function to update grid summary
 function updateGridSummary() {
-  const formData = new FormData();
-  const blob = new Blob([csvFileData], { type: 'text/csv' });
-  formData.append('file', new File([blob], 'updated.csv', { type: 'text/csv' }));
-  formData.append('rowClusters', document.getElementById('rowClusters').value);
-  formData.append('colClusters', document.getElementById('colClusters').value);
+  fetchClusters(csvFileData)
+  .then(data => {
+    if (!data.error) {
+      visualizeGridSummary(data);
+    }
+  })
+  .catch(error => console.error('Error:', error));
+}
 
-  fetch('/get_clusters', {
+// Re-cut the dataset shown in the grid summary at the current slider values.
+// The server keeps the fitted linkages, so nothing is uploaded; if they were
+// evicted it answers 404 and the full upload path is used instead.
+function recutGridSummary() {
+  if (!gridSummaryDatasetKey) {
+    updateGridSummary();
+    return;
+  }
+
+  fetch('/recut_clusters', {
     method: 'POST',
-    body: formData
+    headers: { 'Content-Type': 'application/json', Accept: BLOCKS_ACCEPT },
+    body: JSON.stringify({
+      datasetKey: gridSummaryDatasetKey,
+      rowClusters: document.getElementById('rowClusters').value,
+      colClusters: document.getElementById('colClusters').value,
+      mode: 'indices'
+    })
+  })
+  .then(response => {
+    if (response.status === 404) {
+      gridSummaryDatasetKey = null;
+      updateGridSummary();
+      return null;
+    }
+    return readClusterResponse(response, gridSummaryCSVData);
   })
-  .then(response => response.json())
   .then(data => {
-    if (!data.error) {
+    if (data && !data.error) {
       visualizeGridSummary(data);
     }
   })
@@ -677,7 +906,16 @@ function synchronizeGridViews(clusterData) {
 
   // Get unique row clusters
   const rowClusters = [...new Set(Object.keys(clusterData.blocks).map(key => key.split(',')[0]))];
-  
+
+  // Index-only responses carry the permutations, apply them directly
+  const layout = clusterData.layout;
+  if (layout && gridSummaryCSVData === csvFileData) {
+    const reorderedCsv = d3.csvFormat(layout.row_order.map(i => originalData[i]), layout.col_order);
+    visualizeCSVData(reorderedCsv);
+    addClusterBoundaries(rowClusters, layout.n_rows, layout.row_offsets);
+    return;
+  }
+
   // Build ordered rows based on block data
   let orderedRows = [];
   let processedRows = new Set();
@@ -743,7 +981,7 @@ function synchronizeGridViews(clusterData) {
   addClusterBoundaries(rowClusters, orderedRows.length);
 }
 
-function addClusterBoundaries(rowClusters, totalRows) {
+function addClusterBoundaries(rowClusters, totalRows, rowOffsets = null) {
   const container = document.querySelector('#visualizationContainer');
   const svg = d3.select(container).select('svg');
   if (!svg.empty()) {
@@ -758,8 +996,9 @@ function addClusterBoundaries(rowClusters, totalRows) {
     let currentRowCount = 0;
     rowClusters.forEach((_, index) => {
       if (index < rowClusters.length - 1) {
+        // Exact boundaries when known, otherwise evenly spaced
         const rowsInCluster = Math.floor(totalRows / rowClusters.length);
-        currentRowCount += rowsInCluster;
+        currentRowCount = rowOffsets ? rowOffsets[index + 1] : currentRowCount + rowsInCluster;
         
         svg.append('line')
           .attr('class', 'cluster-boundary')
@@ -822,6 +1061,7 @@ document.getElementById('gridSummaryButton').addEventListener('click', function(
 
 function visualizeGridSummary(data) {
   gridSummaryData = data;
+  gridSummaryDatasetKey = data.dataset_key || null;
   synchronizeGridViews(data);
   
   const container = d3.select('#gridSummaryButton').node().parentNode;
@@ -1043,6 +1283,7 @@ function deleteColumnClusterByType(colCluster, blockType) {
       }
     });
     gridSummaryData.blocks = newBlocks;
+    gridSummaryData.layout = null; // No longer describes the remaining blocks
     visualizeGridSummary(gridSummaryData);
   }
 }
@@ -1056,6 +1297,7 @@ function deleteRowCluster(rowCluster) {
       }
     });
     gridSummaryData.blocks = newBlocks;
+    gridSummaryData.layout = null; // No longer describes the remaining blocks
     visualizeGridSummary(gridSummaryData);
   }
 }
@@ -1653,18 +1895,9 @@ function updateVisualizationsWithColumnFilter() {
   visualizeCSVData(filteredCSV);
   
   // Update grid summary if active
+  const columns = Array.from(selectedColumns);
   if (document.getElementById('gridSummaryButton').classList.contains('active')) {
-    const formData = new FormData();
-    const filteredBlob = new Blob([filteredCSV], { type: 'text/csv' });
-    formData.append('file', filteredBlob, 'filtered.csv');
-    formData.append('rowClusters', document.getElementById('rowClusters').value);
-    formData.append('colClusters', document.getElementById('colClusters').value);
-
-    fetch('/get_clusters', {
-      method: 'POST',
-      body: formData
-    })
-    .then(response => response.json())
+    fetchClusters(csvFileData, columns)
     .then(data => {
       if (!data.error) {
         visualizeGridSummary(data);
@@ -1674,20 +1907,7 @@ function updateVisualizationsWithColumnFilter() {
   }
   
   // Update VSM
-  const formData = new FormData();
-  const filteredBlob = new Blob([filteredCSV], { type: 'text/csv' });
-  formData.append('file', filteredBlob);
-  
-  fetch('/get_vsm', {
-    method: 'POST',
-    body: formData
-  })
-  .then(response => response.json())
-  .then(data => {
-    vsmData = data;
-    updateVSMVisualization();
-  })
-  .catch(error => console.error('Error fetching VSM data:', error));
+  fetchVSMData(csvFileData, columns);
 }
 
 function updateNumericalLegendStyles() {
@@ -1808,17 +2028,7 @@ function updateVisualizationsWithFilters() {
 }
 
 function updateGridSummaryIfActive(csvData) {
-  const formData = new FormData();
-  const filteredBlob = new Blob([csvData], { type: 'text/csv' });
-  formData.append('file', new File([filteredBlob], 'filtered.csv', { type: 'text/csv' }));
-  formData.append('rowClusters', document.getElementById('rowClusters').value);
-  formData.append('colClusters', document.getElementById('colClusters').value);
-
-  fetch('/get_clusters', {
-    method: 'POST',
-    body: formData
-  })
-  .then(response => response.json())
+  fetchClusters(csvData)
   .then(data => {
     if (!data.error) {
       gridSummaryData = data;
@@ -1828,15 +2038,16 @@ function updateGridSummaryIfActive(csvData) {
   .catch(error => console.error('Error:', error));
 }
 
-async function fetchVSMData(csvData) {
-  const formData = new FormData();
-  formData.append('file', file);
-  
+// Number of cells per side of the VSM grids: one per pixel of the rows canvas
+function vsmResolution() {
+  const rect = document.getElementById('vsmRowsCanvas').getBoundingClientRect();
+  return Math.max(16, Math.floor(Math.min(rect.width, rect.height)));
+}
+
+async function fetchVSMData(csvData, columns = null) {
   try {
-    const response = await fetch('/get_vsm', {
-      method: 'POST',
-      body: formData
-    });
+    vsmRequest = { csvData, columns };
+    const response = await postDataset('/get_vsm', csvData, { resolution: vsmResolution() }, columns);
     
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
@@ -2208,17 +2419,7 @@ function updateSorting(column, direction) {
 
   // Update grid summary if it's active
   if (document.getElementById('gridSummaryButton').classList.contains('active')) {
-    const formData = new FormData();
-    const sortedBlob = new Blob([csvFileData], { type: 'text/csv' });
-    formData.append('file', new File([sortedBlob], 'sorted.csv', { type: 'text/csv' }));
-    formData.append('rowClusters', document.getElementById('rowClusters').value);
-    formData.append('colClusters', document.getElementById('colClusters').value);
-
-    fetch('/get_clusters', {
-      method: 'POST',
-      body: formData
-    })
-    .then(response => response.json())
+    fetchClusters(csvFileData)
     .then(data => {
       if (!data.error) {
         visualizeGridSummary(data);
@@ -2237,17 +2438,7 @@ function resetSorting() {
     
     // Update grid summary if active
     if (document.getElementById('gridSummaryButton').classList.contains('active')) {
-      const formData = new FormData();
-      const blob = new Blob([csvFileData], { type: 'text/csv' });
-      formData.append('file', new File([blob], 'reset.csv', { type: 'text/csv' }));
-      formData.append('rowClusters', document.getElementById('rowClusters').value);
-      formData.append('colClusters', document.getElementById('colClusters').value);
-
-      fetch('/get_clusters', {
-        method: 'POST',
-        body: formData
-      })
-      .then(response => response.json())
+      fetchClusters(csvFileData)
       .then(data => {
         if (!data.error) {
           visualizeGridSummary(data);
@@ -2322,44 +2513,97 @@ async function exportCurrentCSV() {
   }
 }
 
-// Update the VSM visualization function to show both matrices
+// Draw both VSM grids. Each is a coarsened level from /get_vsm: mean/min/max
+// similarity per cell plus the leaf-order positions (edges) the cells cover.
+// Dragging over a grid requests that region at full resolution, a double click
+// goes back to the whole matrix.
 function updateVSMVisualization() {
   if (!vsmData) return;
 
-  // Clear previous visualizations
-  d3.select('#vsmColumnsCanvas').selectAll('svg').remove();
-  d3.select('#vsmRowsCanvas').selectAll('svg').remove();
-
-  // Function to create a matrix visualization
-  function createMatrixVisualization(container, matrix) {
-    const margin = 5;
-    const containerRect = container.getBoundingClientRect();
-    const size = Math.min(containerRect.width, containerRect.height) - (margin * 2);
-
-    const svg = d3.select(container)
-      .append('svg')
-      .attr('width', size)
-      .attr('height', size);
-
-    const colorScale = d3.scaleLinear()
-      .domain([0, 1])
-      .range(['#fff', '#2c3e50']);
+  drawVSMLevel(document.getElementById('vsmColumnsCanvas'), 'columns', vsmData.column_similarity);
+  drawVSMLevel(document.getElementById('vsmRowsCanvas'), 'rows', vsmData.row_similarity);
+}
 
-    const cellSize = size / matrix.length;
-    
-    matrix.forEach((row, i) => {
-      row.forEach((value, j) => {
-        svg.append('rect')
-          .attr('x', j * cellSize)
-          .attr('y', i * cellSize)
-          .attr('width', cellSize)
-          .attr('height', cellSize)
-          .attr('fill', colorScale(value));
-      });
+function drawVSMLevel(container, axis, level) {
+  d3.select(container).selectAll('svg, canvas').remove();
+
+  const margin = 5;
+  const containerRect = container.getBoundingClientRect();
+  const size = Math.max(1, Math.floor(Math.min(containerRect.width, containerRect.height) - (margin * 2)));
+  const nRows = level.mean.length;
+  const nCols = nRows ? level.mean[0].length : 0;
+
+  // One image pixel per cell, scaled up without smoothing
+  const grid = document.createElement('canvas');
+  grid.width = Math.max(nCols, 1);
+  grid.height = Math.max(nRows, 1);
+  const gridContext = grid.getContext('2d');
+  const image = gridContext.createImageData(grid.width, grid.height);
+  const colorScale = d3.scaleLinear()
+    .domain([0, 1])
+    .range(['#fff', '#2c3e50']);
+  level.mean.forEach((row, i) => {
+    row.forEach((value, j) => {
+      const color = d3.rgb(colorScale(value));
+      const offset = (i * grid.width + j) * 4;
+      image.data[offset] = color.r;
+      image.data[offset + 1] = color.g;
+      image.data[offset + 2] = color.b;
+      image.data[offset + 3] = 255;
     });
-  }
+  });
+  gridContext.putImageData(image, 0, 0);
+
+  const canvas = document.createElement('canvas');
+  canvas.width = size;
+  canvas.height = size;
+  const context = canvas.getContext('2d');
+  context.imageSmoothingEnabled = false;
+  context.drawImage(grid, 0, 0, size, size);
+  container.appendChild(canvas);
+
+  // Grid cell under a pixel of the canvas
+  const cellAt = (x, y) => [
+    Math.min(nRows - 1, Math.max(0, Math.floor(y / size * nRows))),
+    Math.min(nCols - 1, Math.max(0, Math.floor(x / size * nCols)))
+  ];
+  canvas.title = `${level.size} ${axis}, showing ${level.row_edges[0]}-${level.row_edges[nRows]}`;
+
+  let dragStart = null;
+  canvas.addEventListener('mousedown', event => {
+    dragStart = cellAt(event.offsetX, event.offsetY);
+  });
+  canvas.addEventListener('mouseup', event => {
+    if (!dragStart) return;
+    const [rowA, colA] = dragStart;
+    const [rowB, colB] = cellAt(event.offsetX, event.offsetY);
+    dragStart = null;
+    if (rowA === rowB && colA === colB) return;
+    const region = [
+      level.row_edges[Math.min(rowA, rowB)], level.row_edges[Math.max(rowA, rowB) + 1],
+      level.col_edges[Math.min(colA, colB)], level.col_edges[Math.max(colA, colB) + 1]
+    ];
+    fetchVSMLevel(axis, region);
+  });
+  canvas.addEventListener('dblclick', () => fetchVSMLevel(axis, null));
+}
 
-  // Create both visualizations
-  createMatrixVisualization(document.getElementById('vsmColumnsCanvas'), vsmData.column_similarity);
-  createMatrixVisualization(document.getElementById('vsmRowsCanvas'), vsmData.row_similarity);
-}
\ No newline at end of file
+async function fetchVSMLevel(axis, region) {
+  if (!vsmRequest) return;
+  const fields = { resolution: vsmResolution(), axis };
+  if (region) {
+    fields.region = JSON.stringify(region);
+  }
+  try {
+    const response = await postDataset('/get_vsm', vsmRequest.csvData, fields, vsmRequest.columns);
+    const data = await response.json();
+    if (data.error) {
+      throw new Error(data.error);
+    }
+    const key = axis === 'rows' ? 'row_similarity' : 'column_similarity';
+    vsmData[key] = data[key];
+    drawVSMLevel(document.getElementById(axis === 'rows' ? 'vsmRowsCanvas' : 'vsmColumnsCanvas'), axis, data[key]);
+  } catch (error) {
+    console.error('Error fetching VSM level:', error);
+  }
+}
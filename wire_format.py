@@ -0,0 +1,138 @@
+import json
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Media type of the binary block payload, requested through the Accept header
+BLOCKS_MIME = 'application/x-bicluster-blocks'
+
+MAGIC = b'BKS1'
+# Categorical code of a missing value
+MISSING_CODE = 0xFFFFFFFF
+
+
+def block_key(key: tuple) -> str:
+    """Key of a block in the serialized payload, 'row_cluster,col_cluster,block_id,type'"""
+    return ','.join(str(part) for part in key)
+
+
+def encode_blocks(blocks: Dict[tuple, pd.DataFrame], dataset_key: Optional[str] = None) -> bytes:
+    """
+    Serialize biclustering blocks to a compact binary payload
+
+    Layout (little endian)::
+
+        b'BKS1' | uint32 header length | JSON header | body
+
+    The header lists the blocks in order with their key, columns, number of
+    rows and byte offsets into the body, plus one dictionary per categorical
+    column. The body holds the original row indices of the blocks as uint32,
+    stored once for blocks sharing them (all blocks of a row cluster), and
+    the values of every block row-major: float32 for numerical blocks (NaN
+    when missing), uint32 dictionary codes for categorical blocks
+    (0xFFFFFFFF when missing). The header is padded so that every array
+    starts on a 4 byte boundary.
+
+    Parameters:
+    -----------
+    blocks : Dict[tuple, pd.DataFrame]
+        Blocks from sort_blocks_globally()
+    dataset_key : str, optional
+        Key the client can re-cut the dataset by
+
+    Returns:
+    --------
+    bytes
+    """
+    # One dictionary per categorical column, shared by all blocks containing it
+    categorical_parts = {}
+    for key, block in blocks.items():
+        if key[3] == 'categorical':
+            for col in block.columns:
+                categorical_parts.setdefault(col, []).append(block[col])
+    dictionaries = {
+        col: pd.unique(pd.concat(parts, ignore_index=True).dropna())
+        for col, parts in categorical_parts.items()
+    }
+
+    arrays = []
+    header_blocks = []
+    rows_offsets = {}
+    offset = 0
+    for key, block in blocks.items():
+        rows = block.index.to_numpy().astype('<u4')
+        rows_bytes = rows.tobytes()
+        if rows_bytes not in rows_offsets:
+            rows_offsets[rows_bytes] = offset
+            arrays.append(rows)
+            offset += rows.nbytes
+
+        if key[3] == 'categorical':
+            values = np.empty(block.shape, dtype='<u4')
+            for i, col in enumerate(block.columns):
+                codes = pd.Categorical(block[col], categories=dictionaries[col]).codes
+                # Code -1 (missing) wraps to MISSING_CODE
+                values[:, i] = codes.astype(np.int32).view(np.uint32)
+        else:
+            values = np.ascontiguousarray(block.to_numpy(dtype='<f4', na_value=np.nan))
+
+        header_blocks.append({
+            'key': block_key(key),
+            'columns': [str(col) for col in block.columns],
+            'n_rows': len(block),
+            'rows_offset': rows_offsets[rows_bytes],
+            'values_offset': offset,
+        })
+        arrays.append(values)
+        offset += values.nbytes
+
+    header = json.dumps({
+        'dataset_key': dataset_key,
+        'dictionaries': {str(col): [str(value) for value in values] for col, values in dictionaries.items()},
+        'blocks': header_blocks,
+    }).encode()
+    header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 4)
+
+    return b''.join([MAGIC, struct.pack('<I', len(header)), header] + [array.tobytes() for array in arrays])
+
+
+def decode_blocks(payload: bytes) -> dict:
+    """
+    Decode a payload written by encode_blocks()
+
+    Mirrors the decoder in static/index.js and returns the same structure as
+    the JSON response: {'blocks': {key: {'data', 'columns', 'rows'}}, 'dataset_key'}.
+    Missing categorical values are returned as None.
+
+    Parameters:
+    -----------
+    payload : bytes
+        Binary payload
+
+    Returns:
+    --------
+    dict
+    """
+    if payload[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a block payload')
+    header_length, = struct.unpack_from('<I', payload, len(MAGIC))
+    body_start = len(MAGIC) + 4 + header_length
+    header = json.loads(payload[len(MAGIC) + 4:body_start])
+
+    blocks = {}
+    for block in header['blocks']:
+        n_rows, n_cols = block['n_rows'], len(block['columns'])
+        rows = np.frombuffer(payload, dtype='<u4', count=n_rows, offset=body_start + block['rows_offset'])
+        if block['key'].endswith(',categorical'):
+            codes = np.frombuffer(payload, dtype='<u4', count=n_rows * n_cols,
+                                  offset=body_start + block['values_offset']).reshape(n_rows, n_cols)
+            data = [[header['dictionaries'][col][code] if code != MISSING_CODE else None
+                     for col, code in zip(block['columns'], row)] for row in codes.tolist()]
+        else:
+            data = np.frombuffer(payload, dtype='<f4', count=n_rows * n_cols,
+                                 offset=body_start + block['values_offset']).reshape(n_rows, n_cols).tolist()
+        blocks[block['key']] = {'data': data, 'columns': block['columns'], 'rows': rows}
+
+    return {'blocks': blocks, 'dataset_key': header['dataset_key']}